@@ -0,0 +1,73 @@
+"""
+Channel Benchmark
+
+Shows how the capacity of an instrumented memory channel changes throughput and latency.
+A producer sends bursts of --burst events and pauses between bursts, a consumer spends --work
+microseconds of CPU on every event (like a service handler would). For every capacity the
+producer's blocked sends and send wait, the queueing delay of events and the throughput are
+reported: a rendezvous channel (capacity 0) makes the producer wait on every event of a burst,
+larger capacities absorb bursts at the cost of longer queues.
+
+Usage: python -m Benchmarks.ChannelBenchmark --events 100000 --burst 100 --work 5
+"""
+
+from argparse import ArgumentParser
+from time import perf_counter, perf_counter_ns
+
+import trio
+
+from CommonLib.InstrumentedChannel import open_instrumented_channel
+
+CAPACITIES = (0, 1, 16, 128, 1024)
+BURST_PAUSE = 0.0005    # Seconds between producer bursts
+
+
+async def producer(tx_channel, events: int, burst: int):
+    async with tx_channel:
+        for sent in range(0, events, burst):
+            for event in range(sent, min(sent + burst, events)):
+                await tx_channel.send(event)
+            await trio.sleep(BURST_PAUSE)
+
+
+async def consumer(rx_channel, work_ns: int):
+    async with rx_channel:
+        async for _ in rx_channel:
+            deadline = perf_counter_ns() + work_ns
+            while perf_counter_ns() < deadline:
+                pass
+            await trio.lowlevel.checkpoint()
+
+
+async def run_capacity(capacity: int, events: int, burst: int, work_ns: int) -> dict:
+    tx_channel, rx_channel = open_instrumented_channel(capacity)
+    start = perf_counter()
+    async with trio.open_nursery() as nursery:
+        nursery.start_soon(producer, tx_channel, events, burst)
+        nursery.start_soon(consumer, rx_channel, work_ns)
+    stats = tx_channel.stats.as_dict()
+    stats['events_per_second'] = events / (perf_counter() - start)
+    return stats
+
+
+async def run_benchmark(events: int, burst: int, work_ns: int):
+    print(f'{"capacity":>8} {"events/s":>10} {"high water":>10} {"blocked":>8} '
+          f'{"send wait (s)":>13} {"mean delay (ms)":>15} {"max delay (ms)":>14}')
+    for capacity in CAPACITIES:
+        stats = await run_capacity(capacity, events, burst, work_ns)
+        print(f'{capacity:>8} {stats["events_per_second"]:>10,.0f} {stats["high_water"]:>10} '
+              f'{stats["blocked_sends"]:>8} {stats["send_wait_seconds"]:>13.3f} '
+              f'{stats["mean_queueing_delay_ms"]:>15.3f} {stats["max_queueing_delay_ms"]:>14.3f}')
+
+
+def main():
+    parser = ArgumentParser(description='Instrumented channel capacity benchmark')
+    parser.add_argument('--events', type=int, default=100_000)
+    parser.add_argument('--burst', type=int, default=100)
+    parser.add_argument('--work', type=float, default=5, help='Consumer CPU per event in us')
+    args = parser.parse_args()
+    trio.run(run_benchmark, args.events, args.burst, int(args.work * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Connection Soak
+
+Runs connect/disconnect cycles through Server._handle_new_connection over in-memory streams. Every
+connection subscribes to the ChatRoomService before it disconnects, and traced Python memory,
+live connections and ChatRoomService subscribers are reported at every checkpoint. All three
+should stay flat no matter how many cycles ran.
+
+Usage: python -m Benchmarks.ConnectionSoak --cycles 1000000 --checkpoints 10
+"""
+
+import contextlib
+import os
+import sys
+import tracemalloc
+from argparse import ArgumentParser
+from time import perf_counter
+
+import trio
+import trio.testing
+
+from CommonLib.Framing import encode_frame
+from CommonLib.proto.AIOMessage_pb2 import AIOMessage
+from CommonLib.proto.ChatRoomMessage_pb2 import ChatRoomMessage
+from Server.Server import Server
+from Server.services.ChatRoomService import ChatRoomService
+
+CONCURRENT_CONNECTIONS = 100
+
+
+def build_start_frame() -> bytes:
+    """ Framed ChatRoomMessage subscribing a connection to the ChatRoomService """
+    aio_message = AIOMessage()
+    aio_message.message_name = ChatRoomMessage.DESCRIPTOR.name
+    aio_message.message = ChatRoomMessage(author='soak', message='---Start---').SerializeToString()
+    return encode_frame(aio_message.SerializeToString())
+
+
+async def connect_disconnect(server: Server, start_frame: bytes):
+    """ One connection: subscribe, then disconnect """
+    client_stream, server_stream = trio.testing.memory_stream_pair()
+    async with trio.open_nursery() as nursery:
+        nursery.start_soon(server._handle_new_connection, server_stream)
+        await client_stream.send_all(start_frame)
+        await client_stream.aclose()
+
+
+async def soak(cycles: int, checkpoints: int, report):
+    server = Server()
+    start_frame = build_start_frame()
+
+    async with trio.open_nursery() as nursery:
+        nursery.start_soon(server._dispatcher.run)
+        server._start_all_services()
+        chat_room_service = next(service for service in server.services
+                                 if isinstance(service, ChatRoomService))
+
+        tracemalloc.start()
+        print(f'{"cycles":>10} {"traced KiB":>12} {"live":>6} {"subscribers":>12} '
+              f'{"cycles/s":>10}', file=report)
+        cycles_per_checkpoint = cycles // checkpoints
+        completed = 0
+        for _ in range(checkpoints):
+            start = perf_counter()
+            for _ in range(cycles_per_checkpoint // CONCURRENT_CONNECTIONS):
+                async with trio.open_nursery() as cycle_nursery:
+                    for _ in range(CONCURRENT_CONNECTIONS):
+                        cycle_nursery.start_soon(connect_disconnect, server, start_frame)
+            # Let the dispatcher drain the ConnectionClosedEvents
+            await trio.testing.wait_all_tasks_blocked()
+            completed += cycles_per_checkpoint
+            traced_memory, _ = tracemalloc.get_traced_memory()
+            print(f'{completed:>10} {traced_memory / 1024:>12,.0f} '
+                  f'{server.stats["live_connections"]:>6} '
+                  f'{len(chat_room_service._callbacks):>12} '
+                  f'{cycles_per_checkpoint / (perf_counter() - start):>10,.0f}', file=report)
+        nursery.cancel_scope.cancel()
+
+
+def main():
+    parser = ArgumentParser(description='AIOServer connection lifecycle soak')
+    parser.add_argument('--cycles', type=int, default=1_000_000)
+    parser.add_argument('--checkpoints', type=int, default=10)
+    args = parser.parse_args()
+
+    # Server prints every message, keep only the soak report on stdout
+    report = sys.stdout
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        trio.run(soak, args.cycles, args.checkpoints, report)
+
+
+if __name__ == '__main__':
+    main()
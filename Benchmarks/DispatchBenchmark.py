@@ -0,0 +1,91 @@
+"""
+Dispatch Benchmark
+
+Measures the per-message latency of the direct dispatch fast path against queued dispatch through
+the EventDispatcher shard workers. An in-process Server gets two echo services, one registered
+directly and one with queued=True, and a client connected over an in-memory stream (so no network
+noise) sends TUIMessages to each and waits for every echo.
+
+Usage: python -m Benchmarks.DispatchBenchmark --round-trips 20000
+"""
+
+import contextlib
+import os
+import sys
+from argparse import ArgumentParser
+from statistics import median
+from time import perf_counter_ns
+
+import trio
+import trio.testing
+
+from CommonLib.Framing import FrameDecoder, encode_frame
+from CommonLib.proto.AIOMessage_pb2 import AIOMessage
+from CommonLib.proto.TUIMessage_pb2 import TUIMessage
+from Server.Server import Server
+from Server.util import ServiceMessageEvent
+
+ECHO_SERVICES = {'direct': 'DirectEcho', 'queued': 'QueuedEcho'}
+
+
+async def echo(event: ServiceMessageEvent):
+    """ Send a received TUIMessage back to its sender """
+    await event.response_callback(event.message)
+
+
+def build_frame(service_name: str) -> bytes:
+    """ Framed AIOMessage carrying a TUIMessage for service_name """
+    aio_message = AIOMessage()
+    aio_message.message_name = service_name
+    aio_message.message = TUIMessage(text='ping').SerializeToString()
+    return encode_frame(aio_message.SerializeToString())
+
+
+async def round_trips(client_stream, service_name: str, count: int) -> list:
+    """ Latency (ns) of count echo round trips through service_name """
+    frame_decoder = FrameDecoder()
+    frame = build_frame(service_name)
+    latencies = list()
+    for _ in range(count):
+        start = perf_counter_ns()
+        await client_stream.send_all(frame)
+        while not any(True for _ in frame_decoder.feed(await client_stream.receive_some())):
+            pass
+        latencies.append(perf_counter_ns() - start)
+    return latencies
+
+
+async def run_benchmark(count: int, report):
+    server = Server(idle_timeout=None)
+    server.register_service(ECHO_SERVICES['direct'], echo, message_class=TUIMessage)
+    server.register_service(ECHO_SERVICES['queued'], echo, queued=True, message_class=TUIMessage)
+    client_stream, server_stream = trio.testing.memory_stream_pair()
+
+    async with trio.open_nursery() as nursery:
+        nursery.start_soon(server._dispatcher.run)
+        nursery.start_soon(server._handle_new_connection, server_stream)
+
+        print(f'{"dispatch":<8} {"p50 (us)":>10} {"p99 (us)":>10} {"rt/s":>10}', file=report)
+        for dispatch, service_name in ECHO_SERVICES.items():
+            # Warm up, then measure
+            await round_trips(client_stream, service_name, count // 10)
+            latencies = sorted(await round_trips(client_stream, service_name, count))
+            print(f'{dispatch:<8} {median(latencies) / 1000:>10.1f} '
+                  f'{latencies[int(len(latencies) * 0.99)] / 1000:>10.1f} '
+                  f'{len(latencies) / (sum(latencies) / 1e9):>10,.0f}', file=report)
+        nursery.cancel_scope.cancel()
+
+
+def main():
+    parser = ArgumentParser(description='AIOServer direct vs queued dispatch benchmark')
+    parser.add_argument('--round-trips', type=int, default=20_000)
+    args = parser.parse_args()
+
+    # Server prints every message, keep only the benchmark report on stdout
+    report = sys.stdout
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        trio.run(run_benchmark, args.round_trips, report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Event Memory Benchmark
+
+Compares the ServiceMessageEvent the Server allocates for every received message against the
+plain __dict__ based event it replaced:
+- Memory per in-flight event: --in-flight events are held at once, as when handlers fall behind,
+  and the traced allocation (and RSS growth, where /proc is available) per event is reported
+- GC pressure: --messages events are created in bursts of --burst in-flight events, handled and
+  then dropped (or released to a ServiceMessageEventPool), reporting generation 0 collections per
+  50k messages, the rate the events were churned at and the time spent per event. Events freed
+  right away never trigger a collection, bursts that are in flight at once do unless the events
+  come from the pool
+
+Usage: python -m Benchmarks.EventMemoryBenchmark --in-flight 100000 --messages 500000 --burst 1000
+"""
+
+import gc
+import os
+import tracemalloc
+from argparse import ArgumentParser
+from time import perf_counter
+
+from CommonLib.proto.ChatRoomMessage_pb2 import ChatRoomMessage
+from Server.util import ServiceMessageEvent, ServiceMessageEventPool
+
+PAYLOAD = ChatRoomMessage(author='bench', message='hi').SerializeToString()
+REFERENCE_RATE = 50_000     # Messages per second GC collections are reported against
+
+
+class DictServiceMessageEvent:
+    """ ServiceMessageEvent without __slots__, as it was before pooling """
+    def __init__(self, requester_uuid, service_name, payload, response_callback, relayed=False,
+                 message_type=0, message_class=None):
+        self.requester_uuid = requester_uuid
+        self.service_name = service_name
+        self.payload = payload
+        self.response_callback = response_callback
+        self.relayed = relayed
+        self.message_type = message_type
+        self.message_class = message_class
+        self._message = None
+
+
+async def response_callback(message):
+    pass
+
+
+def rss_bytes() -> int:
+    """ Resident set size of this process, 0 where /proc is not available """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return 0
+
+
+def in_flight_memory(new_event, count: int) -> tuple:
+    """ Traced bytes and RSS growth per event while count events are held at once """
+    gc.collect()
+    rss_before = rss_bytes()
+    tracemalloc.start()
+    events = [new_event(index, 'ChatRoomMessage', memoryview(PAYLOAD), response_callback)
+              for index in range(count)]
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_growth = rss_bytes() - rss_before
+    del events
+    return traced / count, rss_growth / count
+
+
+def churn(new_event, release, count: int, burst: int) -> tuple:
+    """
+    Generation 0 collections and seconds spent creating, handling and dropping count events, burst
+    events at a time
+    """
+    gc.collect()
+    collections_before = gc.get_stats()[0]['collections']
+    start = perf_counter()
+    for burst_start in range(0, count, burst):
+        events = [new_event(index, 'ChatRoomMessage', memoryview(PAYLOAD), response_callback)
+                  for index in range(burst_start, min(burst_start + burst, count))]
+        for event in events:
+            event.message_type = 1
+            if release is not None:
+                release(event)
+    seconds = perf_counter() - start
+    return gc.get_stats()[0]['collections'] - collections_before, seconds
+
+
+def main():
+    parser = ArgumentParser(description='ServiceMessageEvent memory and GC benchmark')
+    parser.add_argument('--in-flight', type=int, default=100_000)
+    parser.add_argument('--messages', type=int, default=500_000)
+    parser.add_argument('--burst', type=int, default=1000, help='Events in flight at once')
+    args = parser.parse_args()
+
+    pool = ServiceMessageEventPool()
+    variants = (('dict', DictServiceMessageEvent, None),
+                ('slots', ServiceMessageEvent, None),
+                ('slots+pool', pool.acquire, pool.release))
+
+    print(f'{"event":<11} {"traced B/event":>14} {"RSS B/event":>12} '
+          f'{"gen0 GCs/50k":>12} {"msgs/s":>11} {"ns/event":>9}')
+    for label, new_event, release in variants:
+        traced, rss = in_flight_memory(new_event, args.in_flight)
+        collections, seconds = churn(new_event, release, args.messages, args.burst)
+        print(f'{label:<11} {traced:>14.0f} {rss:>12.0f} '
+              f'{collections / args.messages * REFERENCE_RATE:>12.1f} '
+              f'{args.messages / seconds:>11,.0f} {seconds / args.messages * 1e9:>9.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Framing Benchmark
+
+Measures FrameDecoder reassembly + AIOMessage parsing throughput for small and large frames,
+with the encoded stream delivered in the chunk sizes a trio SocketStream would hand over.
+
+Usage: python -m Benchmarks.FramingBenchmark
+"""
+
+from time import perf_counter
+
+from CommonLib.Framing import FrameDecoder, encode_frame
+from CommonLib.proto.AIOMessage_pb2 import AIOMessage
+
+STREAM_CHUNK_SIZE = 65536   # trio SocketStream default receive size
+CASES = [
+    # (description, payload size, number of frames)
+    ('small', 64, 200_000),
+    ('medium', 4096, 20_000),
+    ('large', 1024 * 1024, 100),
+]
+
+
+def build_stream(payload_size: int, frame_count: int) -> bytes:
+    """ Encode frame_count framed AIOMessages carrying payload_size bytes each """
+    aio_message = AIOMessage()
+    aio_message.message_name = 'ChatRoomMessage'
+    aio_message.message = b'x' * payload_size
+    return encode_frame(aio_message.SerializeToString()) * frame_count
+
+
+def run_case(payload_size: int, frame_count: int) -> tuple:
+    """ Returns (seconds, frames decoded, stream size) for decoding and parsing a whole stream """
+    stream = memoryview(build_stream(payload_size, frame_count))
+    decoder = FrameDecoder(max_frame_size=2 * payload_size + 64)
+    aio_message = AIOMessage()
+    decoded = 0
+    start = perf_counter()
+    for offset in range(0, len(stream), STREAM_CHUNK_SIZE):
+        for frame in decoder.feed(stream[offset:offset + STREAM_CHUNK_SIZE]):
+            aio_message.ParseFromString(frame)
+            decoded += 1
+    return perf_counter() - start, decoded, len(stream)
+
+
+def main():
+    print(f'{"case":<8} {"payload":>10} {"frames":>8} {"frames/s":>12} {"MiB/s":>10}')
+    for description, payload_size, frame_count in CASES:
+        seconds, decoded, stream_size = run_case(payload_size, frame_count)
+        assert decoded == frame_count, f'Decoded {decoded} of {frame_count} frames!'
+        print(f'{description:<8} {payload_size:>10} {decoded:>8} {decoded / seconds:>12,.0f} '
+              f'{stream_size / seconds / 2 ** 20:>10,.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Handshake Benchmark
+
+Tracks p99 handshake latency of new connections while existing connections flood a chat service.
+An in-process Server gets a Chat service broadcasting every message to all chat clients, and a
+Handshake service answering new connections. --chat-clients connections keep sending chat messages
+while a new connection every --handshake-interval seconds sends a ProtocolNegotiation and a
+Handshake message and waits for the Handshake response, all over in-memory streams (so no network
+noise). Services are registered:
+- direct: both direct (the default configuration), every connection handles its own messages, so
+  a handshake never waits behind chat events and dispatcher priorities do not apply
+- queued normal: both queued=True at NORMAL priority (one shard lane, first come first served)
+- queued high: both queued=True, Handshake at HIGH priority
+
+Usage: python -m Benchmarks.HandshakeBenchmark --chat-clients 20 --handshakes 200
+"""
+
+import contextlib
+import os
+import sys
+from argparse import ArgumentParser
+from statistics import median
+from time import perf_counter_ns
+
+import trio
+import trio.testing
+
+from CommonLib.Compression import PROTOCOL_NEGOTIATION, build_protocol_negotiation
+from CommonLib.Framing import FrameDecoder, encode_frame
+from CommonLib.proto.AIOMessage_pb2 import AIOMessage
+from CommonLib.proto.ChatRoomMessage_pb2 import ChatRoomMessage
+from CommonLib.proto.TUIMessage_pb2 import TUIMessage
+from Server.Priority import Priority
+from Server.Server import Server
+from Server.util import SerializedMessage, ServiceMessageEvent
+
+CHAT_SERVICE = 'Chat'
+HANDSHAKE_SERVICE = 'Handshake'
+DISPATCH_SHARDS = 4
+
+
+class ChatRoom:
+    """ Broadcasts every chat message to every connection that sent one """
+
+    def __init__(self):
+        self.subscribers: dict = dict()
+
+    async def handle_chat(self, event: ServiceMessageEvent):
+        self.subscribers.setdefault(event.requester_uuid, event.response_callback)
+        broadcast = SerializedMessage(CHAT_SERVICE, bytes(event.payload))
+        for callback in list(self.subscribers.values()):
+            with contextlib.suppress(trio.ClosedResourceError):
+                await callback(broadcast)
+
+
+async def handle_handshake(event: ServiceMessageEvent):
+    await event.response_callback(SerializedMessage(HANDSHAKE_SERVICE, bytes(event.payload)))
+
+
+def build_frame(service_name: str, message: bytes) -> bytes:
+    aio_message = AIOMessage()
+    aio_message.message_name = service_name
+    aio_message.message = message
+    return encode_frame(aio_message.SerializeToString())
+
+
+async def chat_client(client_stream):
+    """ Send chat messages as fast as the Server takes them, discarding every broadcast """
+    frame = build_frame(CHAT_SERVICE,
+                        ChatRoomMessage(author='bench', message='flood').SerializeToString())
+
+    async def drain():
+        async for _ in client_stream:
+            pass
+
+    async with trio.open_nursery() as nursery:
+        nursery.start_soon(drain)
+        while True:
+            await client_stream.send_all(frame)
+            await trio.sleep(0)
+
+
+async def handshake(server: Server) -> int:
+    """ Latency (ns) from connecting to receiving the Handshake response """
+    client_stream, server_stream = trio.testing.memory_stream_pair()
+    frame_decoder = FrameDecoder()
+    async with trio.open_nursery() as nursery:
+        start = perf_counter_ns()
+        nursery.start_soon(server._handle_new_connection, server_stream)
+        await client_stream.send_all(
+            build_frame(PROTOCOL_NEGOTIATION, build_protocol_negotiation()) +
+            build_frame(HANDSHAKE_SERVICE, TUIMessage(text='hello').SerializeToString()))
+        responded = False
+        while not responded:
+            for frame in frame_decoder.feed(await client_stream.receive_some()):
+                aio_message = AIOMessage()
+                aio_message.ParseFromString(frame)
+                responded = responded or aio_message.message_name == HANDSHAKE_SERVICE
+        latency = perf_counter_ns() - start
+        await client_stream.aclose()
+    return latency
+
+
+# Configurations measured: (name, queued, Handshake priority)
+CONFIGURATIONS = (('direct', False, Priority.NORMAL),
+                  ('queued normal', True, Priority.NORMAL),
+                  ('queued high', True, Priority.HIGH))
+
+
+async def run_configuration(queued: bool, priority: Priority, chat_clients: int, handshakes: int,
+                            interval: float) -> list:
+    server = Server(idle_timeout=None, dispatch_shards=DISPATCH_SHARDS)
+    chat_room = ChatRoom()
+    server.register_service(CHAT_SERVICE, chat_room.handle_chat, queued=queued)
+    server.register_service(HANDSHAKE_SERVICE, handle_handshake, queued=queued, priority=priority)
+
+    latencies = list()
+    async with trio.open_nursery() as nursery:
+        nursery.start_soon(server._dispatcher.run)
+        for _ in range(chat_clients):
+            client_stream, server_stream = trio.testing.memory_stream_pair()
+            nursery.start_soon(server._handle_new_connection, server_stream)
+            nursery.start_soon(chat_client, client_stream)
+        # Let the flood fill the dispatcher shards
+        await trio.sleep(0.5)
+        for _ in range(handshakes):
+            latencies.append(await handshake(server))
+            await trio.sleep(interval)
+        nursery.cancel_scope.cancel()
+    return sorted(latencies)
+
+
+async def run_benchmark(chat_clients: int, handshakes: int, interval: float, report):
+    print(f'{"services":<18} {"p50 (ms)":>9} {"p99 (ms)":>9} {"max (ms)":>9}', file=report)
+    for name, queued, priority in CONFIGURATIONS:
+        latencies = await run_configuration(queued, priority, chat_clients, handshakes, interval)
+        print(f'{name:<18} {median(latencies) / 1e6:>9.2f} '
+              f'{latencies[int(len(latencies) * 0.99)] / 1e6:>9.2f} '
+              f'{latencies[-1] / 1e6:>9.2f}', file=report)
+
+
+def main():
+    parser = ArgumentParser(description='AIOServer handshake latency under chat load benchmark')
+    parser.add_argument('--chat-clients', type=int, default=20)
+    parser.add_argument('--handshakes', type=int, default=200)
+    parser.add_argument('--handshake-interval', type=float, default=0.01,
+                        help='Seconds between handshakes')
+    args = parser.parse_args()
+
+    # Server prints every message, keep only the benchmark report on stdout
+    report = sys.stdout
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        trio.run(run_benchmark, args.chat_clients, args.handshakes, args.handshake_interval,
+                 report)
+
+
+if __name__ == '__main__':
+    main()
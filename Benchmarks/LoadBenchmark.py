@@ -0,0 +1,219 @@
+"""
+Load Benchmark
+
+Starts `python -m Server.Server --workers N` for every requested worker count and measures how many
+client messages per second the server processes.
+
+Every client connection sends a burst of TUIMessages followed by a ChatRoomMessage '---Start---'.
+Messages of a connection are processed in order, so receiving the resulting '<author> has connected!'
+broadcast means the whole burst went through the server.
+
+With --pipeline, every connection also sends EchoMessage requests to the EchoService keeping each
+given number of requests in flight, matching responses to requests by correlation ID, and the
+requests per second are reported for every worker count and pipelining depth.
+
+Usage: python -m Benchmarks.LoadBenchmark --workers 1 2 4 --connections 64 --messages 2000 \
+    --pipeline 1 16 256
+"""
+
+import os
+import socket
+import subprocess
+import sys
+from argparse import ArgumentParser
+from multiprocessing import Pool
+from time import perf_counter, sleep
+
+import trio
+
+from CommonLib.Framing import FrameDecoder, encode_frame
+from CommonLib.proto.AIOMessage_pb2 import AIOMessage
+from CommonLib.proto.Base_pb2 import EchoMessage
+from CommonLib.proto.ChatRoomMessage_pb2 import ChatRoomMessage
+from CommonLib.proto.TUIMessage_pb2 import TUIMessage
+from Server.Server import HOST as SERVER_HOST, PORT
+
+HOST = '127.0.0.1'
+BURST_SIZE = 100    # Messages written per send_all
+PORT_FREE_TIMEOUT = 30  # Seconds the previous case's server may take to release PORT
+
+
+def build_frame(message) -> bytes:
+    """ Framed AIOMessage wrapping message """
+    aio_message = AIOMessage()
+    aio_message.message_name = message.DESCRIPTOR.name
+    aio_message.message = message.SerializeToString()
+    return encode_frame(aio_message.SerializeToString())
+
+
+async def run_connection(author: str, message_count: int):
+    """ Send message_count TUIMessages, then wait until the server has processed all of them """
+    burst = build_frame(TUIMessage(text=f'load from {author}')) * BURST_SIZE
+    stream = await trio.open_tcp_stream(HOST, PORT)
+    async with stream:
+        for _ in range(message_count // BURST_SIZE):
+            await stream.send_all(burst)
+        await stream.send_all(build_frame(ChatRoomMessage(author=author, message='---Start---')))
+
+        # Wait for this connection's own '<author> has connected!' broadcast
+        frame_decoder = FrameDecoder()
+        expected_message = f'{author} has connected!'
+        async for data in stream:
+            for frame in frame_decoder.feed(data):
+                aio_message = AIOMessage()
+                aio_message.ParseFromString(frame)
+                chat_message = ChatRoomMessage()
+                chat_message.ParseFromString(aio_message.message)
+                if chat_message.message == expected_message:
+                    return
+
+
+def build_request_frame(correlation_id: int) -> bytes:
+    """ Framed AIOMessage wrapping an EchoMessage request with correlation_id """
+    aio_message = AIOMessage()
+    aio_message.message_name = EchoMessage.DESCRIPTOR.name
+    aio_message.message = EchoMessage(data=b'ping').SerializeToString()
+    aio_message.correlation_id = correlation_id
+    return encode_frame(aio_message.SerializeToString())
+
+
+async def run_pipelined_connection(message_count: int, depth: int):
+    """ Send message_count EchoMessage requests keeping depth of them in flight """
+    stream = await trio.open_tcp_stream(HOST, PORT)
+    async with stream:
+        outstanding = set(range(1, min(depth, message_count) + 1))
+        next_correlation_id = len(outstanding) + 1
+        await stream.send_all(b''.join(build_request_frame(correlation_id)
+                                       for correlation_id in outstanding))
+
+        # Send another request for every response, whichever request it answers
+        frame_decoder = FrameDecoder()
+        async for data in stream:
+            requests = bytearray()
+            for frame in frame_decoder.feed(data):
+                aio_message = AIOMessage()
+                aio_message.ParseFromString(frame)
+                outstanding.discard(aio_message.correlation_id)
+                if next_correlation_id <= message_count:
+                    requests += build_request_frame(next_correlation_id)
+                    outstanding.add(next_correlation_id)
+                    next_correlation_id += 1
+            if not outstanding:
+                return
+            if requests:
+                await stream.send_all(requests)
+
+
+def run_client_process(args: tuple) -> int:
+    """
+    Run connection_count connections from one process, returns the messages sent
+    - pipeline: Echo requests in flight per connection, 0 sends bursts of TUIMessages instead
+    """
+    process_number, connection_count, message_count, pipeline = args
+
+    async def run_all():
+        async with trio.open_nursery() as nursery:
+            for connection_number in range(connection_count):
+                if pipeline:
+                    nursery.start_soon(run_pipelined_connection, message_count, pipeline)
+                else:
+                    nursery.start_soon(run_connection,
+                                       f'load-{process_number}-{connection_number}',
+                                       message_count)
+
+    trio.run(run_all)
+    return connection_count * (message_count if pipeline
+                               else (message_count // BURST_SIZE) * BURST_SIZE)
+
+
+async def wait_for_server(server_process: subprocess.Popen, timeout: float = 10):
+    """ Wait until the server accepts connections, failing if it exited instead """
+    with trio.fail_after(timeout):
+        while True:
+            if server_process.poll() is not None:
+                raise RuntimeError(f'Server exited with code {server_process.returncode}')
+            try:
+                stream = await trio.open_tcp_stream(HOST, PORT)
+                await stream.aclose()
+                return
+            except OSError:
+                await trio.sleep(0.1)
+
+
+def port_is_free() -> bool:
+    """ PORT can be bound the way a single worker server binds it (no SO_REUSEPORT) """
+    probe = socket.socket()
+    try:
+        probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        probe.bind((SERVER_HOST, PORT))
+        return True
+    except OSError:
+        return False
+    finally:
+        probe.close()
+
+
+def wait_for_free_port(timeout: float = PORT_FREE_TIMEOUT):
+    """
+    Wait until no server (e.g. workers of the previous case still exiting) listens on PORT, so
+    the next case never benchmarks, or fails to start next to, an old server
+    """
+    deadline = perf_counter() + timeout
+    while not port_is_free():
+        if perf_counter() > deadline:
+            raise RuntimeError(f'Port {PORT} still in use after {timeout} seconds')
+        sleep(0.1)
+
+
+def run_case(worker_count: int, client_processes: int, connections: int, messages: int,
+             pipeline: int = 0) -> float:
+    """
+    Messages per second processed by a server with worker_count workers
+    :param pipeline: Echo requests in flight per connection (0 = bursts of TUIMessages)
+    """
+    wait_for_free_port()
+    server_process = subprocess.Popen(
+        [sys.executable, '-m', 'Server.Server', '--workers', str(worker_count)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        trio.run(wait_for_server, server_process)
+        with Pool(client_processes) as pool:
+            start = perf_counter()
+            total_messages = sum(pool.map(
+                run_client_process,
+                [(process_number, connections // client_processes, messages, pipeline)
+                 for process_number in range(client_processes)]))
+            return total_messages / (perf_counter() - start)
+    finally:
+        server_process.terminate()
+        server_process.wait()
+
+
+def main():
+    parser = ArgumentParser(description='AIOServer load benchmark')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count()])
+    parser.add_argument('--client-processes', type=int, default=max(1, os.cpu_count() // 2))
+    parser.add_argument('--connections', type=int, default=64)
+    parser.add_argument('--messages', type=int, default=2000, help='Messages per connection')
+    parser.add_argument('--pipeline', type=int, nargs='*', default=[],
+                        help='Echo requests kept in flight per connection, one run per depth')
+    args = parser.parse_args()
+
+    print(f'{"workers":>8} {"msgs/s":>12} {"speedup":>8}')
+    baseline = None
+    for worker_count in args.workers:
+        rate = run_case(worker_count, args.client_processes, args.connections, args.messages)
+        baseline = baseline or rate
+        print(f'{worker_count:>8} {rate:>12,.0f} {rate / baseline:>8.2f}')
+
+    if args.pipeline:
+        print(f'\n{"workers":>8} {"pipeline":>8} {"requests/s":>12}')
+        for worker_count in args.workers:
+            for depth in args.pipeline:
+                rate = run_case(worker_count, args.client_processes, args.connections,
+                                args.messages, depth)
+                print(f'{worker_count:>8} {depth:>8} {rate:>12,.0f}')
+
+
+if __name__ == '__main__':
+    main()
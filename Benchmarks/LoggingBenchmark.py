@@ -0,0 +1,96 @@
+"""
+Logging Benchmark
+
+Measures what logging costs the message hot path. The DispatchBenchmark echo round trips run with
+logging not configured (only warnings and errors, the embedded default), configured at INFO (the
+Server default: per-message logs disabled) and at DEBUG (every per-message log sampled), with the
+BatchingSink writing to /dev/null, and for reference with a sink writing every record on the event
+loop as it is logged (what print() did).
+
+Usage: python -m Benchmarks.LoggingBenchmark --round-trips 20000
+"""
+
+import logging
+import os
+from argparse import ArgumentParser
+from statistics import median
+
+import trio
+import trio.testing
+
+from Benchmarks.DispatchBenchmark import echo, round_trips
+from CommonLib.Log import LOG_FORMAT, ROOT_LOGGER, SampledLogger, configure_logging
+from CommonLib.proto.TUIMessage_pb2 import TUIMessage
+from Server import AIOConnection
+from Server.Server import Server
+
+ECHO_SERVICE = 'Echo'
+
+
+def reset_logging() -> None:
+    """ Back to logging not configured """
+    root_logger = logging.getLogger(ROOT_LOGGER)
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+        handler.close()
+    root_logger.setLevel(logging.NOTSET)
+
+
+def configure_unbatched(devnull) -> logging.Handler:
+    """ Every record at DEBUG, none sampled, formatted and written on the event loop """
+    root_logger = logging.getLogger(ROOT_LOGGER)
+    sink = logging.StreamHandler(devnull)
+    sink.setFormatter(logging.Formatter(LOG_FORMAT))
+    root_logger.addHandler(sink)
+    root_logger.setLevel(logging.DEBUG)
+    root_logger.propagate = False
+    return sink
+
+
+async def run_logging(setup: str, count: int, devnull) -> list:
+    reset_logging()
+    message_log = AIOConnection.message_log
+    if setup == 'unbatched':
+        configure_unbatched(devnull)
+        AIOConnection.message_log = SampledLogger(AIOConnection.log, sample_rate=1)
+    elif setup != 'off':
+        configure_logging(setup.upper(), devnull)
+
+    server = Server(idle_timeout=None)
+    server.register_service(ECHO_SERVICE, echo, message_class=TUIMessage)
+    client_stream, server_stream = trio.testing.memory_stream_pair()
+    try:
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(server._handle_new_connection, server_stream)
+            # Warm up, then measure
+            await round_trips(client_stream, ECHO_SERVICE, count // 10)
+            latencies = sorted(await round_trips(client_stream, ECHO_SERVICE, count))
+            nursery.cancel_scope.cancel()
+    finally:
+        AIOConnection.message_log = message_log
+    return latencies
+
+
+async def run_benchmark(count: int):
+    print(f'{"logging":<10} {"p50 (us)":>10} {"p99 (us)":>10} {"rt/s":>10} {"overhead":>9}')
+    baseline = None
+    with open(os.devnull, 'w') as devnull:
+        for setup in ('off', 'info', 'debug', 'unbatched'):
+            latencies = await run_logging(setup, count, devnull)
+            rate = len(latencies) / (sum(latencies) / 1e9)
+            baseline = baseline or rate
+            print(f'{setup:<10} {median(latencies) / 1000:>10.1f} '
+                  f'{latencies[int(len(latencies) * 0.99)] / 1000:>10.1f} {rate:>10,.0f} '
+                  f'{1 - rate / baseline:>9.1%}')
+    reset_logging()
+
+
+def main():
+    parser = ArgumentParser(description='AIOServer logging overhead benchmark')
+    parser.add_argument('--round-trips', type=int, default=20_000)
+    args = parser.parse_args()
+    trio.run(run_benchmark, args.round_trips)
+
+
+if __name__ == '__main__':
+    main()
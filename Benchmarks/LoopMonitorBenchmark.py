@@ -0,0 +1,64 @@
+"""
+Loop Monitor Benchmark
+
+Measures what the LoopMonitor instrument costs the message hot path: the DispatchBenchmark echo
+round trips run without and with the event loop monitored (every task step timed), and prints the
+step duration and scheduler lag percentiles the monitor recorded.
+
+Usage: python -m Benchmarks.LoopMonitorBenchmark --round-trips 20000
+"""
+
+from argparse import ArgumentParser
+from statistics import median
+
+import trio
+import trio.testing
+
+from Benchmarks.DispatchBenchmark import echo, round_trips
+from CommonLib.proto.TUIMessage_pb2 import TUIMessage
+from Server.Server import Server
+
+ECHO_SERVICE = 'Echo'
+
+
+async def run_monitored(long_step_threshold, count: int) -> tuple:
+    server = Server(idle_timeout=None, long_step_threshold=long_step_threshold)
+    server.register_service(ECHO_SERVICE, echo, message_class=TUIMessage)
+    client_stream, server_stream = trio.testing.memory_stream_pair()
+    async with trio.open_nursery() as nursery:
+        if long_step_threshold is not None:
+            nursery.start_soon(server._loop_monitor.run)
+        nursery.start_soon(server._handle_new_connection, server_stream)
+        # Warm up, then measure
+        await round_trips(client_stream, ECHO_SERVICE, count // 10)
+        latencies = sorted(await round_trips(client_stream, ECHO_SERVICE, count))
+        nursery.cancel_scope.cancel()
+    return latencies, server.metrics.snapshot()
+
+
+async def run_benchmark(count: int):
+    print(f'{"monitor":<10} {"p50 (us)":>10} {"p99 (us)":>10} {"rt/s":>10} {"overhead":>9}')
+    baseline = None
+    snapshot = None
+    for monitor in ('off', 'on'):
+        latencies, snapshot = await run_monitored(None if monitor == 'off' else 1.0, count)
+        rate = len(latencies) / (sum(latencies) / 1e9)
+        baseline = baseline or rate
+        print(f'{monitor:<10} {median(latencies) / 1000:>10.1f} '
+              f'{latencies[int(len(latencies) * 0.99)] / 1000:>10.1f} {rate:>10,.0f} '
+              f'{1 - rate / baseline:>9.1%}')
+
+    for name in ('loop_task_step_us', 'loop_scheduler_lag_us'):
+        print(f'\n{name}: ' + ', '.join(f'{key} {value:,.0f}'
+                                        for key, value in snapshot[name].items()))
+
+
+def main():
+    parser = ArgumentParser(description='AIOServer event loop monitor overhead benchmark')
+    parser.add_argument('--round-trips', type=int, default=20_000)
+    args = parser.parse_args()
+    trio.run(run_benchmark, args.round_trips)
+
+
+if __name__ == '__main__':
+    main()
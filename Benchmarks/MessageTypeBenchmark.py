@@ -0,0 +1,68 @@
+"""
+Message Type Benchmark
+
+Compares AIOMessages addressed by message name against message type IDs:
+- Frame size of a small ChatRoomMessage sent either way
+- Cost of parsing a frame and looking up its service handler, by name in a dict (the old
+  Server._service_map) or by ID in a list (the EventDispatcher routes)
+
+Usage: python -m Benchmarks.MessageTypeBenchmark --iterations 200000
+"""
+
+from argparse import ArgumentParser
+from timeit import timeit
+
+from CommonLib.Framing import encode_frame
+from CommonLib.MessageTypes import MessageTypeTable
+from CommonLib.proto.AIOMessage_pb2 import AIOMessage
+from CommonLib.proto.ChatRoomMessage_pb2 import ChatRoomMessage
+from CommonLib.proto.TUIMessage_pb2 import TUIMessage
+
+SERVICE_NAMES = [TUIMessage.DESCRIPTOR.name, ChatRoomMessage.DESCRIPTOR.name,
+                 'AuthenticatorMessage', 'ProtocolNegotiation', 'Heartbeat']
+
+
+def build_frame(message_types: MessageTypeTable, by_id: bool) -> bytes:
+    aio_message = AIOMessage()
+    if by_id:
+        aio_message.message_type = message_types.id_of(ChatRoomMessage.DESCRIPTOR.name)
+    else:
+        aio_message.message_name = ChatRoomMessage.DESCRIPTOR.name
+    aio_message.message = ChatRoomMessage(author='bench', message='hi').SerializeToString()
+    return encode_frame(aio_message.SerializeToString())
+
+
+def main():
+    parser = ArgumentParser(description='Message name vs message type ID benchmark')
+    parser.add_argument('--iterations', type=int, default=200_000)
+    args = parser.parse_args()
+
+    message_types = MessageTypeTable()
+    handlers_by_name = dict()
+    handlers_by_id = [None]
+    for service_name in SERVICE_NAMES:
+        message_types.register(service_name)
+        handlers_by_name[service_name] = service_name
+        handlers_by_id.append(service_name)
+
+    name_frame = build_frame(message_types, by_id=False)
+    id_frame = build_frame(message_types, by_id=True)
+
+    def route_by_name():
+        aio_message = AIOMessage()
+        aio_message.ParseFromString(name_frame[4:])
+        return handlers_by_name[aio_message.message_name]
+
+    def route_by_id():
+        aio_message = AIOMessage()
+        aio_message.ParseFromString(id_frame[4:])
+        return handlers_by_id[aio_message.message_type]
+
+    print(f'{"":<6} {"frame bytes":>12} {"parse + route (ns)":>19}')
+    for label, frame, route in (('name', name_frame, route_by_name), ('id', id_frame, route_by_id)):
+        seconds = timeit(route, number=args.iterations)
+        print(f'{label:<6} {len(frame):>12} {seconds / args.iterations * 1e9:>19.0f}')
+
+
+if __name__ == '__main__':
+    main()
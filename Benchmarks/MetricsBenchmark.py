@@ -0,0 +1,65 @@
+"""
+Metrics Benchmark
+
+Measures the cost of recording one value into every metric type, which must stay well under a
+microsecond for metrics to stay on in production, and of taking a Server-sized snapshot.
+
+Usage: python -m Benchmarks.MetricsBenchmark --records 1000000
+"""
+
+import random
+from argparse import ArgumentParser
+from time import perf_counter
+
+from CommonLib.Metrics import ConnectionMetrics, Counter, Gauge, Histogram, MetricsRegistry
+
+SNAPSHOT_SERVICES = 20      # Services with a latency histogram in the snapshot case
+SNAPSHOTS = 100
+
+
+def time_records(record, values: list) -> float:
+    """ Nanoseconds per record(value) call """
+    start = perf_counter()
+    for value in values:
+        record(value)
+    return (perf_counter() - start) / len(values) * 1e9
+
+
+def time_loop(values: list) -> float:
+    """ Nanoseconds per iteration of the timing loop itself """
+    return time_records(lambda value: None, values)
+
+
+def main():
+    parser = ArgumentParser(description='AIOServer metrics recording cost benchmark')
+    parser.add_argument('--records', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    # Latency-like values: mostly tens to hundreds of microseconds, a long tail up to seconds
+    values = [int(random.lognormvariate(5, 1.5)) for _ in range(args.records)]
+    seconds = [value / 1e6 for value in values]
+    loop_ns = time_loop(values)
+    cases = [('counter inc', Counter().inc, values),
+             ('gauge set', Gauge().set, values),
+             ('histogram record', Histogram().record, values),
+             ('histogram record_seconds', Histogram().record_seconds, seconds)]
+
+    print(f'{"metric":<26} {"ns/record":>10}')
+    for description, record, case_values in cases:
+        print(f'{description:<26} {time_records(record, case_values) - loop_ns:>10.0f}')
+
+    registry = MetricsRegistry()
+    ConnectionMetrics(registry)
+    for service_number in range(SNAPSHOT_SERVICES):
+        histogram = registry.histogram(f'service_{service_number}_latency_us')
+        for value in values[:10_000]:
+            histogram.record(value)
+    start = perf_counter()
+    for _ in range(SNAPSHOTS):
+        registry.render_text()
+    print(f'\n{SNAPSHOT_SERVICES} service snapshot: '
+          f'{(perf_counter() - start) / SNAPSHOTS * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
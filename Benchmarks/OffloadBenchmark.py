@@ -0,0 +1,148 @@
+"""
+Offload Benchmark
+
+Shows what a CPU-heavy service handler does to every other connection when it runs on the event
+loop, in a thread (Offload.THREAD) or in a process pool (Offload.PROCESS). For every mode an
+in-process Server gets the heavy service (PBKDF2 key derivation, hashlib releases the GIL) and a
+cheap Ping echo service. --clients connections keep sending heavy requests for --seconds while one
+more connection measures Ping round trips, all over in-memory streams (so no network noise).
+
+Usage: python -m Benchmarks.OffloadBenchmark --clients 4 --seconds 3 --iterations 20000
+"""
+
+import contextlib
+import hashlib
+import os
+import sys
+from argparse import ArgumentParser
+from functools import partial
+from statistics import median
+from time import perf_counter_ns
+
+import trio
+import trio.testing
+
+from CommonLib.Framing import FrameDecoder, encode_frame
+from CommonLib.proto.AIOMessage_pb2 import AIOMessage
+from CommonLib.proto.TUIMessage_pb2 import TUIMessage
+from Server.Offload import Offload
+from Server.Server import Server
+from Server.util import ServiceMessageEvent
+
+HEAVY_SERVICE = 'Heavy'
+PING_SERVICE = 'Ping'
+
+
+def derive_key(iterations: int, message: TUIMessage) -> TUIMessage:
+    """ CPU-heavy handler, module level so process pools can unpickle it """
+    key = hashlib.pbkdf2_hmac('sha256', message.text.encode(), b'AIOServer', iterations)
+    return TUIMessage(text=key.hex())
+
+
+async def ping(event: ServiceMessageEvent):
+    """ Send a received TUIMessage back to its sender """
+    await event.response_callback(event.message)
+
+
+def build_frame(service_name: str) -> bytes:
+    """ Framed AIOMessage carrying a TUIMessage for service_name """
+    aio_message = AIOMessage()
+    aio_message.message_name = service_name
+    aio_message.message = TUIMessage(text='secret').SerializeToString()
+    return encode_frame(aio_message.SerializeToString())
+
+
+async def round_trip(client_stream, frame_decoder: FrameDecoder, frame: bytes) -> int:
+    """ Latency (ns) of sending frame and receiving the response """
+    start = perf_counter_ns()
+    await client_stream.send_all(frame)
+    while not any(True for _ in frame_decoder.feed(await client_stream.receive_some())):
+        pass
+    return perf_counter_ns() - start
+
+
+async def heavy_client(client_stream, deadline: float, completed: list):
+    frame_decoder = FrameDecoder()
+    frame = build_frame(HEAVY_SERVICE)
+    while trio.current_time() < deadline:
+        await round_trip(client_stream, frame_decoder, frame)
+        completed[0] += 1
+
+
+async def ping_client(client_stream, deadline: float, latencies: list):
+    frame_decoder = FrameDecoder()
+    frame = build_frame(PING_SERVICE)
+    while trio.current_time() < deadline:
+        latencies.append(await round_trip(client_stream, frame_decoder, frame))
+        await trio.sleep(0.001)
+
+
+async def run_mode(offload: Offload, clients: int, seconds: float, iterations: int) -> dict:
+    server = Server(idle_timeout=None)
+    heavy = partial(derive_key, iterations)
+    if offload == Offload.NONE:
+        async def heavy_inline(event: ServiceMessageEvent):
+            await event.response_callback(heavy(event.message))
+        server.register_service(HEAVY_SERVICE, heavy_inline, message_class=TUIMessage)
+    else:
+        server.register_service(HEAVY_SERVICE, heavy, message_class=TUIMessage, offload=offload)
+    server.register_service(PING_SERVICE, ping, message_class=TUIMessage)
+
+    completed = [0]
+    latencies = list()
+    try:
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(server._dispatcher.run)
+            streams = list()
+            for _ in range(clients + 1):
+                client_stream, server_stream = trio.testing.memory_stream_pair()
+                nursery.start_soon(server._handle_new_connection, server_stream)
+                streams.append(client_stream)
+            if offload == Offload.PROCESS:
+                # Start the pool processes before measuring
+                await round_trip(streams[0], FrameDecoder(), build_frame(HEAVY_SERVICE))
+            deadline = trio.current_time() + seconds
+            async with trio.open_nursery() as clients_nursery:
+                for client_stream in streams[:clients]:
+                    clients_nursery.start_soon(heavy_client, client_stream, deadline, completed)
+                clients_nursery.start_soon(ping_client, streams[clients], deadline, latencies)
+            nursery.cancel_scope.cancel()
+    finally:
+        server.cleanup()
+
+    latencies.sort()
+    stats = server.stats
+    pool = 'process' if offload == Offload.PROCESS else 'thread'
+    return dict(heavy_per_second=completed[0] / seconds,
+                ping_p50_ms=median(latencies) / 1e6,
+                ping_p99_ms=latencies[int(len(latencies) * 0.99)] / 1e6,
+                mean_wait_ms=stats[f'offload_{pool}_mean_wait_ms'],
+                saturated=stats[f'offload_{pool}_saturated'])
+
+
+async def run_benchmark(clients: int, seconds: float, iterations: int, report):
+    print(f'{"offload":<8} {"heavy/s":>8} {"ping p50 (ms)":>13} {"ping p99 (ms)":>13} '
+          f'{"wait (ms)":>9} {"saturated":>9}', file=report)
+    for offload in Offload:
+        result = await run_mode(offload, clients, seconds, iterations)
+        print(f'{offload.name.lower():<8} {result["heavy_per_second"]:>8,.0f} '
+              f'{result["ping_p50_ms"]:>13.2f} {result["ping_p99_ms"]:>13.2f} '
+              f'{result["mean_wait_ms"]:>9.2f} {result["saturated"]:>9}', file=report)
+
+
+def main():
+    parser = ArgumentParser(description='AIOServer handler offload benchmark')
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--iterations', type=int, default=20_000,
+                        help='PBKDF2 iterations per heavy request')
+    args = parser.parse_args()
+
+    # Server prints every message, keep only the benchmark report on stdout
+    report = sys.stdout
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        trio.run(run_benchmark, args.clients, args.seconds, args.iterations, report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Socket Tuning Benchmark
+
+Measures loopback round-trip latency of small chat frames under different SocketTuning profiles.
+For every profile an in-process Server and a ChatRoomService subscriber are started with that
+profile, and the subscriber sends --pipeline small ChatRoomMessages as separate writes before
+waiting for all of their broadcasts. Pipelining is what exposes Nagle's algorithm: with TCP_NODELAY
+disabled every write after the first waits for the ACK of the previous one.
+
+Usage: python -m Benchmarks.SocketTuningBenchmark --round-trips 2000 --pipeline 2
+"""
+
+import contextlib
+import os
+import sys
+from argparse import ArgumentParser
+from statistics import median
+from time import perf_counter_ns
+
+import trio
+
+from CommonLib.Framing import FrameDecoder, encode_frame
+from CommonLib.SocketTuning import SocketTuning
+from CommonLib.proto.AIOMessage_pb2 import AIOMessage
+from CommonLib.proto.ChatRoomMessage_pb2 import ChatRoomMessage
+from Server.Server import PORT, Server
+
+HOST = '127.0.0.1'
+PROFILES = {
+    'default': SocketTuning(),
+    'no nodelay': SocketTuning(nodelay=False),
+    'small buffers': SocketTuning(send_buffer=4096, receive_buffer=4096),
+    'large buffers': SocketTuning(send_buffer=1024 * 1024, receive_buffer=1024 * 1024),
+    'keepalive': SocketTuning(keepalive=True, keepalive_idle=10, keepalive_interval=5,
+                              keepalive_count=3),
+}
+
+
+def build_frame(message: str) -> bytes:
+    """ Framed AIOMessage wrapping a ChatRoomMessage """
+    aio_message = AIOMessage()
+    aio_message.message_name = ChatRoomMessage.DESCRIPTOR.name
+    aio_message.message = ChatRoomMessage(author='bench', message=message).SerializeToString()
+    return encode_frame(aio_message.SerializeToString())
+
+
+async def round_trips(stream: trio.SocketStream, count: int, pipeline: int) -> list:
+    """ Latency (ns) of count rounds of pipeline chat messages """
+    frame_decoder = FrameDecoder()
+    frame = build_frame('ping')
+    latencies = list()
+
+    async def wait_for_frames(frame_count: int):
+        while frame_count:
+            data = await stream.receive_some()
+            if not data:
+                raise trio.BrokenResourceError('Server closed connection')
+            frame_count -= sum(1 for _ in frame_decoder.feed(data))
+
+    await stream.send_all(build_frame('---Start---'))
+    await wait_for_frames(1)
+    for _ in range(count):
+        start = perf_counter_ns()
+        for _ in range(pipeline):
+            await stream.send_all(frame)
+        await wait_for_frames(pipeline)
+        latencies.append(perf_counter_ns() - start)
+    return latencies
+
+
+async def run_profile(port: int, socket_tuning: SocketTuning, count: int, pipeline: int) -> list:
+    """ Round-trip latencies against a Server and client both using socket_tuning """
+    server = Server(host=HOST, port=port, socket_tuning=socket_tuning, idle_timeout=None)
+    async with trio.open_nursery() as nursery:
+        nursery.start_soon(server.run)
+        with trio.fail_after(10):
+            while True:
+                try:
+                    stream = await socket_tuning.open_stream(HOST, port)
+                    break
+                except OSError:
+                    await trio.sleep(0.05)
+        async with stream:
+            latencies = await round_trips(stream, count, pipeline)
+        nursery.cancel_scope.cancel()
+    return latencies
+
+
+async def run_benchmark(count: int, pipeline: int, report):
+    print(f'{"profile":<14} {"p50 (us)":>10} {"p99 (us)":>10} {"rounds/s":>10}', file=report)
+    for port_offset, (name, socket_tuning) in enumerate(PROFILES.items()):
+        latencies = await run_profile(PORT + 100 + port_offset, socket_tuning, count, pipeline)
+        latencies.sort()
+        print(f'{name:<14} {median(latencies) / 1000:>10.1f} '
+              f'{latencies[int(len(latencies) * 0.99)] / 1000:>10.1f} '
+              f'{len(latencies) / (sum(latencies) / 1e9):>10,.0f}', file=report)
+
+
+def main():
+    parser = ArgumentParser(description='AIOServer socket tuning loopback latency benchmark')
+    parser.add_argument('--round-trips', type=int, default=2000)
+    parser.add_argument('--pipeline', type=int, default=2,
+                        help='Messages written separately before waiting for their broadcasts')
+    args = parser.parse_args()
+
+    # Server prints every message, keep only the benchmark report on stdout
+    report = sys.stdout
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        trio.run(run_benchmark, args.round_trips, args.pipeline, report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Transport Benchmark
+
+Compares loopback TCP against the Server's Unix domain socket for a co-located client.
+A single ChatRoomService subscriber repeatedly sends a ChatRoomMessage and waits for its broadcast,
+reporting round-trip latency and the server CPU time spent per message (Linux only).
+
+Usage: python -m Benchmarks.TransportBenchmark --round-trips 5000
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+from argparse import ArgumentParser
+from statistics import median
+from time import perf_counter_ns
+
+import trio
+
+from CommonLib.Framing import FrameDecoder, encode_frame
+from CommonLib.proto.AIOMessage_pb2 import AIOMessage
+from CommonLib.proto.ChatRoomMessage_pb2 import ChatRoomMessage
+from Server.Server import PORT
+
+HOST = '127.0.0.1'
+
+
+def build_frame(message: str) -> bytes:
+    """ Framed AIOMessage wrapping a ChatRoomMessage """
+    aio_message = AIOMessage()
+    aio_message.message_name = ChatRoomMessage.DESCRIPTOR.name
+    aio_message.message = ChatRoomMessage(author='bench', message=message).SerializeToString()
+    return encode_frame(aio_message.SerializeToString())
+
+
+def server_cpu_seconds(pid: int) -> float:
+    """ User + system CPU time of a process, 0 if /proc is not available """
+    try:
+        with open(f'/proc/{pid}/stat') as stat_file:
+            fields = stat_file.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except OSError:
+        return 0.0
+
+
+async def round_trips(stream: trio.SocketStream, count: int) -> list:
+    """ Latency (ns) of count chat message round trips """
+    frame_decoder = FrameDecoder()
+    frame = build_frame('ping')
+    latencies = list()
+
+    async def wait_for_frame():
+        while True:
+            data = await stream.receive_some()
+            if not data:
+                raise trio.BrokenResourceError('Server closed connection')
+            if any(True for _ in frame_decoder.feed(data)):
+                return
+
+    await stream.send_all(build_frame('---Start---'))
+    await wait_for_frame()
+    for _ in range(count):
+        start = perf_counter_ns()
+        await stream.send_all(frame)
+        await wait_for_frame()
+        latencies.append(perf_counter_ns() - start)
+    return latencies
+
+
+def report(transport: str, latencies: list, cpu_seconds: float):
+    """ Print one result row """
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f'{transport:<6} {median(latencies) / 1000:>10.1f} {p99 / 1000:>10.1f} '
+          f'{len(latencies) / (sum(latencies) / 1e9):>10,.0f} '
+          f'{cpu_seconds / len(latencies) * 1e6:>14.1f}')
+
+
+async def run_benchmark(server_pid: int, unix_socket_path: str, count: int):
+    print(f'{"":<6} {"p50 (us)":>10} {"p99 (us)":>10} {"rt/s":>10} {"server cpu/msg":>14}')
+    for transport in ('tcp', 'unix'):
+        with trio.fail_after(10):
+            while True:
+                try:
+                    stream = await trio.open_tcp_stream(HOST, PORT) if transport == 'tcp' \
+                        else await trio.open_unix_socket(unix_socket_path)
+                    break
+                except OSError:
+                    await trio.sleep(0.1)
+        async with stream:
+            cpu_start = server_cpu_seconds(server_pid)
+            latencies = await round_trips(stream, count)
+            report(transport, latencies, server_cpu_seconds(server_pid) - cpu_start)
+
+
+def main():
+    parser = ArgumentParser(description='AIOServer TCP vs Unix domain socket benchmark')
+    parser.add_argument('--round-trips', type=int, default=5000)
+    args = parser.parse_args()
+
+    unix_socket_path = os.path.join(tempfile.mkdtemp(prefix='AIOServer-'), 'server.sock')
+    server_process = subprocess.Popen(
+        [sys.executable, '-m', 'Server.Server', '--unix-socket', unix_socket_path],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        trio.run(run_benchmark, server_process.pid, unix_socket_path, args.round_trips)
+    finally:
+        server_process.terminate()
+        server_process.wait()
+
+
+if __name__ == '__main__':
+    main()
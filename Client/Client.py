@@ -3,17 +3,38 @@
 Client Object
 """
 
+import math
+from argparse import ArgumentParser
+from typing import Optional, Sequence, Type, Union
+
 import trio
 
+from google.protobuf import symbol_database
 from google.protobuf.message import Message
 
+from CommonLib.Compression import SessionCompressor, PROTOCOL_NEGOTIATION, ZLIB, \
+    build_protocol_negotiation, parse_protocol_negotiation
+from CommonLib.Framing import FrameDecoder, DEFAULT_MAX_FRAME_SIZE, append_frame, encode_frame
+from CommonLib.Heartbeat import HEARTBEAT, HEARTBEAT_INTERVAL, build_heartbeat
+from CommonLib.InstrumentedChannel import DEFAULT_CHANNEL_CAPACITY, open_instrumented_channel
+from CommonLib.Log import SampledLogger, configure_logging, get_logger
+from CommonLib.LoopMonitor import LoopMonitor
+from CommonLib.MessageTypes import MessageTypeTable, parse_message_types
+from CommonLib.Metrics import MetricsRegistry
+from CommonLib.SocketTuning import SocketTuning
 from CommonLib.proto.AIOMessage_pb2 import AIOMessage
+from CommonLib.proto.Base_pb2 import Error, ErrorCode
 from CommonLib.proto.TUIMessage_pb2 import TUIMessage
 
 # HOST = '34.75.107.183'
 HOST = '127.0.0.1'
 PORT = 8888
 TUI_HISTORY_LENGTH = 10
+MAX_PENDING_REQUESTS = 1024     # Requests awaiting their response at once
+MAX_CORRELATION_ID = 2 ** 32 - 1
+
+log = get_logger(__name__)
+message_log = SampledLogger(log)     # Logs on every received message
 
 
 class ClientTerminationEvent(BaseException):
@@ -21,11 +42,39 @@ class ClientTerminationEvent(BaseException):
     pass
 
 
+class ServerError(Exception):
+    """ Error the Server answered a request with, e.g. because its handler failed """
+
+    def __init__(self, error: Error):
+        super().__init__(f'{ErrorCode.Name(error.error_code)}: {error.error_details}')
+        self.error_code: int = error.error_code
+        self.error_details: str = error.error_details
+
+
 class ClientEvent:
     """ Any event sent to the client event processor """
-    def __init__(self, service_name: str, data: bytes):
+    __slots__ = ('service_name', 'data', 'message_class', '_message')
+
+    def __init__(self, service_name: str, data: bytes,
+                 message_class: Optional[Type[Message]] = None):
+        """
+        :param service_name: Name of the service data is for
+        :param data: Serialized message
+        :param message_class: Message class data lazily decodes into (see message)
+        """
         self.service_name = service_name
         self.data = data
+        self.message_class = message_class
+        self._message: Optional[Message] = None
+
+    @property
+    def message(self) -> Union[Message, bytes]:
+        """ Message decoded from data on first access, data itself if there is no message class """
+        if self._message is None:
+            if self.message_class is None:
+                return self.data
+            self._message = self.message_class.FromString(self.data)
+        return self._message
 
     def __str__(self):
         return f'--- ClientEvent ---\n' \
@@ -33,121 +82,261 @@ class ClientEvent:
                f'Data: {self.data}'
 
 
+class PendingRequest:
+    """ Request sent to the Server, waiting for the response with its correlation ID """
+    __slots__ = ('done', 'response')
+
+    def __init__(self):
+        self.done: trio.Event = trio.Event()
+        self.response: Optional[AIOMessage] = None
+
+
 class Client:
     """
     Client connection to AIOServer
     """
     tx_event_channel: trio.abc.SendChannel[ClientEvent]
     rx_event_channel: trio.abc.ReceiveChannel[ClientEvent]
-    tx_send_server_channel: trio.abc.SendChannel[AIOMessage]
-    rx_send_server_channel: trio.abc.ReceiveChannel[AIOMessage]
-
-    def __init__(self, cli_mode: bool = False):
+    # A list of AIOMessages is sent to the Server in a single write
+    tx_send_server_channel: trio.abc.SendChannel[Union[AIOMessage, list[AIOMessage]]]
+    rx_send_server_channel: trio.abc.ReceiveChannel[Union[AIOMessage, list[AIOMessage]]]
+
+    def __init__(self, cli_mode: bool = False, max_frame_size: int = DEFAULT_MAX_FRAME_SIZE,
+                 compression: bool = False, unix_socket_path: Optional[str] = None,
+                 host: str = HOST, port: int = PORT,
+                 socket_tuning: Optional[SocketTuning] = None,
+                 channel_capacity: int = DEFAULT_CHANNEL_CAPACITY,
+                 max_pending_requests: int = MAX_PENDING_REQUESTS,
+                 username: Optional[str] = None,
+                 long_step_threshold: Optional[float] = None):
+        """
+        :param max_pending_requests: Requests (see call) awaiting their response at once
+        :param username: Name to chat as, asked for interactively if not given
+        :param long_step_threshold: Monitor the event loop, reporting task steps that run for this
+            many seconds or longer (None = off, see CommonLib.LoopMonitor)
+        """
         self._cli_mode = cli_mode
+        # Items the event and send-to-server channels buffer before producers wait
+        self._channel_capacity = channel_capacity
+        self._host = host
+        self._port = port
+        self._socket_tuning = socket_tuning if socket_tuning is not None else SocketTuning()
+        # Co-located clients may connect through the Server's Unix domain socket instead of TCP
+        self._unix_socket_path = unix_socket_path
         self._is_alive = True
-        self.username = input('Username: ')
+        self._frame_decoder = FrameDecoder(max_frame_size)
+        # Decompression is ready as soon as it is requested, compression only once Server agrees
+        self._compressor: Optional[SessionCompressor] = \
+            SessionCompressor(max_size=max_frame_size) if compression else None
+        self._compress_outbound: bool = False
+        # Message type IDs, only used once the Server sent its table
+        self._message_types: MessageTypeTable = MessageTypeTable()
+        self._use_message_types: bool = False
+        # Requests awaiting their response by correlation ID, responses may arrive in any order
+        self._pending_requests: dict[int, PendingRequest] = dict()
+        self._max_pending_requests: int = max_pending_requests
+        self._request_slots: trio.Semaphore = trio.Semaphore(max_pending_requests)
+        # Held while a burst acquires its slots, so concurrent bursts cannot each get only part
+        #   of theirs and then wait for each other forever
+        self._request_slots_lock: trio.Lock = trio.Lock()
+        self._next_correlation_id: int = 1
+        self.username = username if username is not None else input('Username: ')
         # self.__pwd = getpass('Password: ')    # TODO: implement with encryption
         self._service_map: dict[str, classmethod] = dict()
+        self._message_classes: dict[str, Type[Message]] = dict()
         self.services: list[object] = list()
+        # Event loop metrics, channel statistics are included in every snapshot
+        self._metrics: MetricsRegistry = MetricsRegistry()
+        self._metrics.add_collector(lambda: self.channel_stats)
+        self._loop_monitor: Optional[LoopMonitor] = \
+            LoopMonitor(long_step_threshold, self._metrics) if long_step_threshold is not None \
+            else None
 
     @property
     def is_alive(self):
         return self.is_alive
 
-    def register_service(self, service_name: str, service_callback: classmethod):
+    @property
+    def channel_stats(self) -> dict:
+        """ Usage statistics of every opened channel by channel name """
+        return {name: channel.stats.as_dict() for name, channel in vars(self).items()
+                if name.startswith('tx_') and hasattr(channel, 'stats')}
+
+    @property
+    def metrics(self) -> MetricsRegistry:
+        return self._metrics
+
+    def register_service(self, service_name: str, service_callback: classmethod,
+                         message_class: Optional[Type[Message]] = None):
         """
         Register a service in Client
         :param service_name:
         :param service_callback:
+        :param message_class: Message class ClientEvent.message is lazily decoded into
         """
         if service_name in self._service_map.keys():
             raise (NameError, f'Conflicting service "{service_name}" already registered!')
         else:
             self._service_map[service_name] = service_callback
-        print(f'Client service map:\n{self._service_map}')
-        input()
+            if message_class is not None:
+                self._message_classes[service_name] = message_class
+        log.debug('Client service map: %s', self._service_map)
 
     def _start_all_services(self):
         """ Start all Services in the services folder """
-        print(f'Starting all services...')
-        server_module = __import__('Server.services')
-        all_service_files = server_module.__dict__['services'].__dict__['__all__']
-        print(f'All service files: {all_service_files}')
+        log.info('Starting all services...')
+        client_module = __import__('Client.services')
+        all_service_files = client_module.__dict__['services'].__dict__['__all__']
+        log.debug('All service files: %s', all_service_files)
         for service_file in all_service_files:
-            service_module = __import__(f'Server.services.{service_file}')
+            service_module = __import__(f'Client.services.{service_file}')
             # All service objects must be named identically to the file that they are saved under
             service_module = service_module.__dict__['services'].__dict__[service_file]
             service_class = getattr(service_module, service_file)
             # All service classes must be initialize themselves with register callback
             # in order to map Message object names to Service object handlers
             self.services.append(service_class(self.register_service))
-        [print(f'Added {_} to server services list') for _ in self.services]
+        log.info('Started services: %s',
+                 ', '.join(type(service).__name__ for service in self.services))
 
-    def _parse_aio_message(self, data: bytes) -> AIOMessage:
+    def _parse_aio_message(self, data: Union[bytes, memoryview]) -> AIOMessage:
         """ Decode and decrypt AIOMessages sent by an AIOServer """
         message = AIOMessage()
         message.ParseFromString(data)
-        return self._decrypt(message)
+        return self._resolve_message_type(self._decompress(self._decrypt(message)))
 
     async def _sender(self, client_stream):
         """
         Sender monitors rx_send_server_channel for AIOMessages to serialize and send to Server
+        - A list of AIOMessages (see call_many) is framed into one buffer and sent in one write
         """
-        print("_sender: started!")
-        async for aio_msg in self.rx_send_server_channel:
-            # print(f"_sender: sending {aio_msg}")
-            await client_stream.send_all(aio_msg.SerializeToString())
+        log.debug("_sender: started")
+        await client_stream.send_all(encode_frame(self._build_protocol_negotiation()))
+        async for outbound in self.rx_send_server_channel:
+            if isinstance(outbound, AIOMessage):
+                await client_stream.send_all(encode_frame(self._prepare_outbound(outbound)))
+            else:
+                buffer = bytearray()
+                for aio_msg in outbound:
+                    append_frame(buffer, self._prepare_outbound(aio_msg))
+                await client_stream.send_all(buffer)
+
+    def _prepare_outbound(self, aio_msg: AIOMessage) -> bytes:
+        """ Serialized aio_msg, with a message type ID and compression if enabled """
+        if self._use_message_types:
+            message_type = self._message_types.id_of(aio_msg.message_name)
+            if message_type:
+                aio_msg.message_type = message_type
+                aio_msg.ClearField('message_name')
+        if self._compress_outbound:
+            compressed_message = self._compressor.compress(aio_msg.message)
+            if compressed_message is not None:
+                aio_msg.communication_protocol = ZLIB
+                aio_msg.message = compressed_message
+        return aio_msg.SerializeToString()
 
     async def _receiver(self, client_stream):
         """ Receiver """
         # TODO: Finalize this for generic Client use
-        print("_receiver: started!")
+        log.debug("_receiver: started")
         async for data in client_stream:
-            message = self._parse_aio_message(data)
-            print(f"_receiver: got message {message}")
-            await self.tx_event_channel.send(
-                ClientEvent(service_name=message.message_name, data=message.message))
-        print("_receiver: connection closed")
+            for frame in self._frame_decoder.feed(data):
+                message = self._parse_aio_message(frame)
+                if self._handle_connection_message(message):
+                    continue
+                message_log.debug("_receiver: got %s (%d bytes)", message.message_name,
+                                  len(message.message))
+                await self.tx_event_channel.send(
+                    ClientEvent(service_name=message.message_name, data=message.message,
+                                message_class=self._message_classes.get(message.message_name)))
+        log.info("_receiver: connection closed")
         raise ClientTerminationEvent
 
+    def _handle_connection_message(self, aio_msg: AIOMessage) -> bool:
+        """
+        Handle messages about the connection itself rather than any service
+        :return: True if aio_msg was handled and must not be passed on to services
+        :raises ServerError: The Server refused the connection (see Server.AdmissionControl)
+        """
+        if aio_msg.HasField('error') and not aio_msg.correlation_id and \
+                aio_msg.message_name == Error.DESCRIPTOR.name:
+            log.error('Server refused the connection: %s: %s',
+                      ErrorCode.Name(aio_msg.error.error_code), aio_msg.error.error_details)
+            raise ServerError(aio_msg.error)
+        if aio_msg.correlation_id:
+            pending_request = self._pending_requests.get(aio_msg.correlation_id)
+            if pending_request is not None:
+                pending_request.response = aio_msg
+                pending_request.done.set()
+                return True
+        if aio_msg.message_name == HEARTBEAT:
+            return True
+        elif aio_msg.message_name == PROTOCOL_NEGOTIATION:
+            self._handle_protocol_negotiation(aio_msg)
+            return True
+        return False
+
+    async def _heartbeat(self) -> None:
+        """ Periodically send a Heartbeat so the Server does not reap an idle connection """
+        while True:
+            await trio.sleep(HEARTBEAT_INTERVAL)
+            heartbeat = AIOMessage()
+            heartbeat.message_name = HEARTBEAT
+            heartbeat.message = build_heartbeat()
+            await self.tx_send_server_channel.send(heartbeat)
+
     async def _event_processor(self) -> None:
         """ Client event processor """
         async for event in self.rx_event_channel:
             if isinstance(event, ClientEvent):
-                print(f'Client got ClientEvent!\n{event}')
                 try:
                     await self._service_map[event.service_name](event)
                 except Exception as e:
-                    print(f'CRITICAL ERROR: {e}')
+                    log.error('%s handler failed: %r', event.service_name, e)
             else:
-                print(f'Client got unsupported event: {event}')
+                log.error('Client got unsupported event: %s', event)
 
-    async def run(self):
-        print(f"client: connecting to {HOST}:{PORT}")
+    async def _open_server_stream(self) -> trio.SocketStream:
+        """ Connect to the Server over its Unix domain socket if configured, otherwise TCP """
+        if self._unix_socket_path is not None:
+            log.info("client: connecting to %s", self._unix_socket_path)
+            return await trio.open_unix_socket(self._unix_socket_path)
+        log.info("client: connecting to %s:%d", self._host, self._port)
+        return await self._socket_tuning.open_stream(self._host, self._port)
 
+    async def run(self):
         # Create client stream to server
-        client_stream = await trio.open_tcp_stream(HOST, PORT)
+        client_stream = await self._open_server_stream()
 
         # Create event channels
-        self.tx_event_channel, self.rx_event_channel = trio.open_memory_channel(0)
-        self.tx_send_server_channel, self.rx_send_server_channel = trio.open_memory_channel(0)
+        self.tx_event_channel, self.rx_event_channel = \
+            open_instrumented_channel(self._channel_capacity)
+        self.tx_send_server_channel, self.rx_send_server_channel = \
+            open_instrumented_channel(self._channel_capacity)
 
         async with client_stream:
             async with trio.open_nursery() as nursery:
-                print("client: starting services...")
+                if self._loop_monitor is not None:
+                    log.debug("client: spawning loop monitor...")
+                    nursery.start_soon(self._loop_monitor.run)
+
+                log.debug("client: starting services...")
                 self._start_all_services()
 
-                print("client: spawning _event_processor...")
+                log.debug("client: spawning _event_processor...")
                 nursery.start_soon(self._event_processor)
 
-                print("client: spawning _sender...")
+                log.debug("client: spawning _sender...")
                 nursery.start_soon(self._sender, client_stream)
 
-                print("client: spawning _receiver...")
+                log.debug("client: spawning _receiver...")
                 nursery.start_soon(self._receiver, client_stream)
 
+                log.debug("client: spawning _heartbeat...")
+                nursery.start_soon(self._heartbeat)
+
                 if self._cli_mode:
-                    print("client: spawning _get_cli_input")
+                    log.debug("client: spawning _get_cli_input")
                     nursery.start_soon(self._get_cli_input)
 
     async def _get_cli_input(self):
@@ -164,6 +353,77 @@ class Client:
         # print(f'Built TUI message: {tui_msg}')
         return tui_msg
 
+    async def call(self, message: Message, timeout: Optional[float] = None,
+                   response_class: Optional[Type[Message]] = None) -> Message:
+        """
+        Send message to the Server and wait for the parsed response to it
+        - Up to max_pending_requests requests may be in flight at once (e.g. from many tasks),
+          responses are matched by correlation ID in whatever order they arrive
+        :param timeout: Seconds to wait for the response before raising trio.TooSlowError
+        :param response_class: Message class the response is decoded into, by default the class
+            registered for the response's message name, or else the generated class of that name
+        :raises ServerError: The Server answered with an Error (unless response_class is Error),
+            e.g. because the service's handler failed
+        """
+        return (await self.call_many((message,), timeout, response_class))[0]
+
+    async def call_many(self, messages: Sequence[Message], timeout: Optional[float] = None,
+                        response_class: Optional[Type[Message]] = None) -> list[Message]:
+        """
+        Send a burst of messages to the Server in a single write and wait for all responses
+        :param timeout: Seconds to wait for all responses before raising trio.TooSlowError
+        :param response_class: Message class every response is decoded into (see call)
+        :return: Parsed responses, in the order of messages
+        :raises ServerError: Any of the responses is an Error (see call)
+        """
+        if len(messages) > self._max_pending_requests:
+            raise ValueError(f'Cannot call {len(messages)} messages at once, at most '
+                             f'{self._max_pending_requests} requests may be pending')
+        correlation_ids = list()
+        try:
+            with trio.fail_after(timeout if timeout is not None else math.inf):
+                batch = list()
+                async with self._request_slots_lock:
+                    for message in messages:
+                        await self._request_slots.acquire()
+                        correlation_id = self._new_correlation_id()
+                        self._pending_requests[correlation_id] = PendingRequest()
+                        correlation_ids.append(correlation_id)
+                        aio_msg = self.build_aio_message(message)
+                        aio_msg.correlation_id = correlation_id
+                        batch.append(aio_msg)
+                await self.tx_send_server_channel.send(batch)
+                for correlation_id in correlation_ids:
+                    await self._pending_requests[correlation_id].done.wait()
+                responses = [self._pending_requests[correlation_id].response
+                             for correlation_id in correlation_ids]
+        finally:
+            # Responses arriving after a timeout are passed on to services like any other message
+            for correlation_id in correlation_ids:
+                del self._pending_requests[correlation_id]
+                self._request_slots.release()
+        return [self._parse_response(response, response_class) for response in responses]
+
+    def _parse_response(self, aio_msg: AIOMessage,
+                        response_class: Optional[Type[Message]] = None) -> Message:
+        """ Decode the message of a response AIOMessage (see call) """
+        if aio_msg.message_name == Error.DESCRIPTOR.name and response_class is not Error:
+            raise ServerError(Error.FromString(aio_msg.message))
+        if response_class is None:
+            response_class = self._message_classes.get(aio_msg.message_name)
+        if response_class is None:
+            # Generated messages are registered by name once their module is imported
+            response_class = symbol_database.Default().GetSymbol(aio_msg.message_name)
+        return response_class.FromString(aio_msg.message)
+
+    def _new_correlation_id(self) -> int:
+        """ Next correlation ID not used by a pending request """
+        while True:
+            correlation_id = self._next_correlation_id
+            self._next_correlation_id = correlation_id % MAX_CORRELATION_ID + 1
+            if correlation_id not in self._pending_requests:
+                return correlation_id
+
     def build_aio_message(self, base_message: Message) -> AIOMessage:
         aio_msg = AIOMessage()
         aio_msg.message_name = base_message.DESCRIPTOR.name
@@ -171,11 +431,43 @@ class Client:
         # print(f'Built AIO message: {aio_msg}')
         return self._encrypt(aio_msg)
 
-    def parse_aio_message(self, data: bytes) -> AIOMessage:
+    def parse_aio_message(self, data: Union[bytes, memoryview]) -> AIOMessage:
         """ Parse a received AIOMessage, _decrypt and return results """
         aio_message = AIOMessage()
         aio_message.ParseFromString(data)
-        return self._decrypt(aio_message)
+        return self._resolve_message_type(self._decompress(self._decrypt(aio_message)))
+
+    def _build_protocol_negotiation(self) -> bytes:
+        """ Serialized AIOMessage requesting every optional protocol the Client supports """
+        aio_msg = AIOMessage()
+        aio_msg.message_name = PROTOCOL_NEGOTIATION
+        aio_msg.message = build_protocol_negotiation(
+            *([ZLIB] if self._compressor is not None else []), message_types=dict())
+        return aio_msg.SerializeToString()
+
+    def _handle_protocol_negotiation(self, aio_msg: AIOMessage) -> None:
+        """ Enable the optional protocols the Server agreed to """
+        enabled_protocols = parse_protocol_negotiation(aio_msg.message)
+        self._compress_outbound = self._compressor is not None and ZLIB in enabled_protocols
+        log.debug('Server enabled communication protocols: %s', enabled_protocols)
+        message_types = parse_message_types(aio_msg.message)
+        if message_types is not None:
+            self._message_types.update(message_types)
+            self._use_message_types = True
+
+    def _resolve_message_type(self, aio_msg: AIOMessage) -> AIOMessage:
+        """ Fill in the message name of an AIOMessage sent with a message type ID """
+        if aio_msg.message_type:
+            aio_msg.message_name = self._message_types.name_of(aio_msg.message_type)
+            aio_msg.ClearField('message_type')
+        return aio_msg
+
+    def _decompress(self, aio_msg: AIOMessage) -> AIOMessage:
+        """ Decompress contents of AIOMessage if necessary """
+        if aio_msg.communication_protocol == ZLIB:
+            aio_msg.message = self._compressor.decompress(aio_msg.message)
+            aio_msg.ClearField('communication_protocol')
+        return aio_msg
 
     def _decrypt(self, aio_msg: AIOMessage) -> AIOMessage:
         """ Decrypt contents of AIOMessage if necessary """
@@ -194,8 +486,15 @@ class Client:
 
 
 if __name__ == '__main__':
+    parser = ArgumentParser(description='AIOServer CLI Client')
+    parser.add_argument('--long-step-ms', type=float, default=None,
+                        help='Monitor the event loop, reporting task steps that run this many '
+                             'milliseconds or longer (default: off)')
+    args = parser.parse_args()
     print('For a proper TUI, please use Client.TUI')
-    client = Client(cli_mode=True)
+    configure_logging()
+    client = Client(cli_mode=True, long_step_threshold=args.long_step_ms / 1000
+                    if args.long_step_ms is not None else None)
 
     try:
         trio.run(client.run)
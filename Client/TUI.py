@@ -11,6 +11,7 @@ from enum import IntEnum
 from queue import Queue, Empty
 from threading import Thread
 
+from CommonLib.InstrumentedChannel import DEFAULT_CHANNEL_CAPACITY, open_instrumented_channel
 from CommonLib.proto.ChatRoomMessage_pb2 import ChatRoomMessage
 
 from .Client import *
@@ -28,6 +29,8 @@ class TuiEventType(IntEnum):
 
 
 class TUIEvent:
+    __slots__ = ('event_type', 'data')
+
     def __init__(self, event_type: TuiEventType, data: str):
         self.event_type = event_type
         self.data = data
@@ -66,7 +69,8 @@ class TUI(Client):
     tx_tui_event: trio.abc.SendChannel
     rx_tui_event: trio.abc.ReceiveChannel
 
-    def __init__(self):
+    def __init__(self, channel_capacity: int = DEFAULT_CHANNEL_CAPACITY,
+                 long_step_threshold: Optional[float] = None):
         self._kbhit = KBHit()
         self._getch_queue = Queue()
         self._getch_thread = Thread(target=enqueue_getch, args=(self._getch_queue, self._kbhit,))
@@ -76,7 +80,8 @@ class TUI(Client):
         self._commands = {'help': self._get_help,
                           'set state tui': self._set_state_tui,
                           'set state chatroom': self._set_state_chatroom}
-        Client.__init__(self)
+        Client.__init__(self, channel_capacity=channel_capacity,
+                        long_step_threshold=long_step_threshold)
 
     async def _get_help(self) -> str:
         return f'Available TUI Commands: {list(self._commands.keys())}'
@@ -172,8 +177,12 @@ class TUI(Client):
         print("TUI _receiver: started!")
         async for data in client_stream:
             # print(f"TUI _receiver: got data {data!r}")
-            await self.tx_tui_event.send(
-                TUIEvent(TuiEventType.ServerMessage, data=self.parse_aio_message(data)))
+            for frame in self._frame_decoder.feed(data):
+                aio_message = self.parse_aio_message(frame)
+                if self._handle_connection_message(aio_message):
+                    continue
+                await self.tx_tui_event.send(
+                    TUIEvent(TuiEventType.ServerMessage, data=aio_message))
         print("TUI _receiver: connection closed")
         raise ClientTerminationEvent
 
@@ -181,19 +190,27 @@ class TUI(Client):
         print('Starting TUI...')
 
         # Create event channels
-        self.tx_tui_event, self.rx_tui_event = trio.open_memory_channel(0)
-        self.tx_send_server_channel, self.rx_send_server_channel = trio.open_memory_channel(0)
+        self.tx_tui_event, self.rx_tui_event = open_instrumented_channel(self._channel_capacity)
+        self.tx_send_server_channel, self.rx_send_server_channel = \
+            open_instrumented_channel(self._channel_capacity)
 
         # Create client stream to server
-        client_stream = await trio.open_tcp_stream(HOST, PORT)
+        client_stream = await self._open_server_stream()
 
         async with trio.open_nursery() as nursery:
+            if self._loop_monitor is not None:
+                print("tui: spawning loop monitor...")
+                nursery.start_soon(self._loop_monitor.run)
+
             print("tui: spawning _sender...")
             nursery.start_soon(self._sender, client_stream)
 
             print("tui: spawning _receiver...")
             nursery.start_soon(self._receiver, client_stream)
 
+            print("tui: spawning _heartbeat...")
+            nursery.start_soon(self._heartbeat)
+
             print("tui: spawning event processor...")
             nursery.start_soon(self._tui_event_processor)
 
@@ -209,7 +226,8 @@ class TUI(Client):
         await trio.sleep(0.2)   # don't be the first thing to start
         while True:
             try:
-                data = self._getch_queue.get(timeout=0.01)
+                # Never block the event loop waiting for input, sleep below instead
+                data = self._getch_queue.get_nowait()
                 if data in [_.decode('utf-8') for _ in [b'\x03', b'\x1a']]:
                     sys.exit()
                 await self.tx_tui_event.send(
@@ -274,7 +292,13 @@ class TUI(Client):
 
 
 if __name__ == '__main__':
-    tui = TUI()
+    parser = ArgumentParser(description='AIOServer TUI')
+    parser.add_argument('--long-step-ms', type=float, default=None,
+                        help='Monitor the event loop, reporting task steps that run this many '
+                             'milliseconds or longer (default: off)')
+    args = parser.parse_args()
+    tui = TUI(long_step_threshold=args.long_step_ms / 1000
+              if args.long_step_ms is not None else None)
 
     try:
         trio.run(tui.run)
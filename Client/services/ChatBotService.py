@@ -2,7 +2,7 @@
 Client Chat Bot Service
 """
 
-from CommonLib.proto.ChatRoomMessage_pb2 import ChatBotMessage
+from CommonLib.proto.ChatRoomMessage_pb2 import ChatRoomMessage
 
 
 class ChatBotService:
@@ -10,10 +10,11 @@ class ChatBotService:
         """
         Register all message -> handler relations to service registerer callback
         """
-        register_service('ChatBotMessage', self._handle_chat_bot_message)
+        register_service('ChatRoomMessage', self._handle_chat_bot_message,
+                         message_class=ChatRoomMessage)
 
     @staticmethod
-    def _handle_chat_bot_message(message: bytes):
-        chat_bot_message = ChatBotMessage()
-        chat_bot_message.ParseFromString(message)
-        return message
+    async def _handle_chat_bot_message(event):
+        """ Main entry-way for all ChatRoomMessages, event.message is decoded on first access """
+        chat_bot_message: ChatRoomMessage = event.message
+        return chat_bot_message
@@ -0,0 +1,133 @@
+"""
+Created: October 18, 2026
+Description: Per-session zlib compression of AIOMessage payloads
+
+Compression is optional and negotiated once per connection with a ProtocolNegotiation message:
+    1. Client -> Server: ProtocolNegotiation(communication_protocols=[ZLIB])
+    2. Server -> Client: ProtocolNegotiation(communication_protocols=[ZLIB]) if the server agrees
+Either side may then send AIOMessages with communication_protocol = ZLIB, whose message field
+holds the compressed payload. Only payloads above a size threshold are compressed.
+
+Every session keeps one streaming zlib context per direction, primed with SHARED_DICTIONARY, so
+the repetitive parts of chat and TUI payloads are referenced (not repeated) by later messages.
+Because of this, compressed payloads must be decompressed in the exact order they were compressed.
+A payload that would decompress to more than max_size bytes (the connection's max frame size) is
+not inflated but rejected with a FramingError, so compression cannot be used to get around it.
+"""
+
+import zlib
+from time import perf_counter_ns
+from typing import Optional, Union
+
+from CommonLib.Framing import DEFAULT_MAX_FRAME_SIZE, FramingError
+from CommonLib.proto.Base_pb2 import CommunicationProtocol, ProtocolNegotiation
+
+PROTOCOL_NEGOTIATION = ProtocolNegotiation.DESCRIPTOR.name
+ZLIB = CommunicationProtocol.ZLIB
+DEFAULT_COMPRESSION_THRESHOLD = 128     # Payloads (in bytes) smaller than this are sent as-is
+DEFAULT_COMPRESSION_LEVEL = 6
+
+# Raw deflate (no zlib header/checksum), every message ends on a sync flush marker that is
+# stripped before sending and restored before decompressing
+_WINDOW_BITS = -15
+_SYNC_FLUSH_MARKER = b'\x00\x00\xff\xff'
+
+# Strings that show up in most payloads, used to prime both ends of every compression session
+SHARED_DICTIONARY = \
+    b'ChatRoomMessageTUIMessageAuthenticatorMessageProtocolNegotiation' \
+    b' has connected!---Start------Stop---' \
+    b'Available TUI Commands: help set state tui set state chatroom ' \
+    b'the and you that was for are with his they this have from'
+
+
+class SessionCompressor:
+    """ Streaming zlib compressor/decompressor pair for a single connection """
+
+    def __init__(self, threshold: int = DEFAULT_COMPRESSION_THRESHOLD,
+                 level: int = DEFAULT_COMPRESSION_LEVEL, max_size: int = DEFAULT_MAX_FRAME_SIZE):
+        """
+        :param threshold: Smallest payload (in bytes) that will be compressed
+        :param level: zlib compression level (1 = fastest, 9 = smallest)
+        :param max_size: Largest payload (in bytes) a received payload may decompress to
+        """
+        self._threshold: int = threshold
+        self._max_size: int = max_size
+        self._compressor = zlib.compressobj(
+            level, zlib.DEFLATED, _WINDOW_BITS, zdict=SHARED_DICTIONARY)
+        self._decompressor = zlib.decompressobj(_WINDOW_BITS, zdict=SHARED_DICTIONARY)
+
+        # Statistics
+        self._compressed_messages: int = 0
+        self._uncompressed_bytes: int = 0
+        self._compressed_bytes: int = 0
+        self._compress_ns: int = 0
+        self._decompressed_messages: int = 0
+        self._decompress_ns: int = 0
+
+    @property
+    def stats(self) -> dict:
+        """ Compression ratio (uncompressed / compressed bytes) and CPU time spent """
+        return dict(
+            compressed_messages=self._compressed_messages,
+            uncompressed_bytes=self._uncompressed_bytes,
+            compressed_bytes=self._compressed_bytes,
+            compression_ratio=(self._uncompressed_bytes / self._compressed_bytes)
+            if self._compressed_bytes else 0.0,
+            compress_cpu_seconds=self._compress_ns / 1e9,
+            decompressed_messages=self._decompressed_messages,
+            decompress_cpu_seconds=self._decompress_ns / 1e9)
+
+    def compress(self, payload: Union[bytes, memoryview]) -> Optional[bytes]:
+        """
+        Compress payload if it is above the compression threshold
+        :return: Compressed payload, or None if payload should be sent uncompressed
+        """
+        if len(payload) < self._threshold:
+            return None
+        start = perf_counter_ns()
+        compressed = self._compressor.compress(payload) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        compressed = compressed[:-len(_SYNC_FLUSH_MARKER)]
+        self._compress_ns += perf_counter_ns() - start
+        self._compressed_messages += 1
+        self._uncompressed_bytes += len(payload)
+        self._compressed_bytes += len(compressed)
+        return compressed
+
+    def decompress(self, payload: Union[bytes, memoryview]) -> bytes:
+        """
+        Decompress a payload received with communication_protocol = ZLIB
+        :raises FramingError: payload decompresses to more than max_size bytes, the session can
+            not decompress any further payloads
+        """
+        start = perf_counter_ns()
+        # One byte over the limit tells an oversized payload from one of exactly max_size bytes
+        decompressed = self._decompressor.decompress(bytes(payload) + _SYNC_FLUSH_MARKER,
+                                                     self._max_size + 1)
+        self._decompress_ns += perf_counter_ns() - start
+        if len(decompressed) > self._max_size or self._decompressor.unconsumed_tail:
+            raise FramingError(f'Compressed payload of {len(payload)} bytes decompresses to more '
+                               f'than the maximum of {self._max_size} bytes')
+        self._decompressed_messages += 1
+        return decompressed
+
+
+def build_protocol_negotiation(*communication_protocols: CommunicationProtocol,
+                               message_types: Optional[dict] = None) -> bytes:
+    """
+    Serialized ProtocolNegotiation advertising communication_protocols
+    :param message_types: Use message type IDs (see CommonLib.MessageTypes), with this message
+        name -> ID table (a client sends an empty one), None to keep using message names
+    """
+    negotiation = ProtocolNegotiation()
+    negotiation.communication_protocols.extend(communication_protocols)
+    if message_types is not None:
+        negotiation.message_type_ids = True
+        negotiation.message_types.update(message_types)
+    return negotiation.SerializeToString()
+
+
+def parse_protocol_negotiation(message: Union[bytes, memoryview]) -> set:
+    """ Set of CommunicationProtocols advertised by a serialized ProtocolNegotiation """
+    negotiation = ProtocolNegotiation()
+    negotiation.ParseFromString(message)
+    return set(negotiation.communication_protocols)
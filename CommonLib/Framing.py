@@ -0,0 +1,83 @@
+"""
+Created: October 18, 2026
+Description: Length-prefixed framing for AIOMessages sent over a byte stream
+
+Every frame on the wire is a fixed-width, 4 byte, big-endian unsigned payload length followed
+by the payload itself (a serialized AIOMessage):
+
+    +----------------+---------------------------+
+    | length: uint32 | payload: <length> bytes   |
+    +----------------+---------------------------+
+
+TCP is free to merge and split writes, so the receiving side must reassemble frames from whatever
+chunks the stream hands over. FrameDecoder does so in a single reusable bytearray and yields
+memoryview slices of it, so no frame is copied before it reaches ParseFromString.
+"""
+
+from struct import Struct
+from typing import Iterator, Union
+
+FRAME_HEADER = Struct('!I')
+FRAME_HEADER_SIZE = FRAME_HEADER.size
+DEFAULT_MAX_FRAME_SIZE = 4 * 1024 * 1024    # 4 MiB
+
+
+class FramingError(Exception):
+    """ Stream can no longer be decoded into frames (e.g. a frame exceeds the maximum size) """
+    pass
+
+
+def encode_frame(payload: Union[bytes, bytearray, memoryview]) -> bytes:
+    """ Prefix payload with its length header """
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+def append_frame(buffer: bytearray, payload: Union[bytes, bytearray, memoryview]) -> None:
+    """ Append length header and payload to an existing (outbound) buffer """
+    buffer += FRAME_HEADER.pack(len(payload))
+    buffer += payload
+
+
+class FrameDecoder:
+    """ Reassembles length-prefixed frames from arbitrarily sized stream chunks """
+
+    def __init__(self, max_frame_size: int = DEFAULT_MAX_FRAME_SIZE):
+        """
+        :param max_frame_size: Largest payload (in bytes) accepted before raising FramingError
+        """
+        self._max_frame_size: int = max_frame_size
+        self._buffer: bytearray = bytearray()
+
+    @property
+    def buffered(self) -> int:
+        """ Number of bytes received that do not yet form a complete frame """
+        return len(self._buffer)
+
+    def feed(self, data: Union[bytes, bytearray, memoryview]) -> Iterator[memoryview]:
+        """
+        Add received data to the reassembly buffer and yield every complete frame payload
+
+        !!! Yielded memoryviews are only valid until the next frame is requested !!!
+        Parse (or copy) each frame before advancing the iterator.
+        :param data: Chunk of bytes received from a stream
+        """
+        buffer = self._buffer
+        buffer += data
+        offset = 0
+        try:
+            with memoryview(buffer) as view:
+                while len(buffer) - offset >= FRAME_HEADER_SIZE:
+                    (length,) = FRAME_HEADER.unpack_from(buffer, offset)
+                    if length > self._max_frame_size:
+                        raise FramingError(
+                            f'Frame of {length} bytes exceeds maximum frame size of '
+                            f'{self._max_frame_size} bytes')
+                    end = offset + FRAME_HEADER_SIZE + length
+                    if end > len(buffer):
+                        break
+                    with view[offset + FRAME_HEADER_SIZE:end] as frame:
+                        yield frame
+                    offset = end
+        finally:
+            # Drop consumed frames, keeping any partial frame for the next chunk
+            del buffer[:offset]
@@ -0,0 +1,24 @@
+"""
+Created: October 18, 2026
+Description: Application-level heartbeats
+
+Clients send a Heartbeat every HEARTBEAT_INTERVAL seconds and the server echoes it back. Any
+received frame counts as activity, so heartbeats only matter for otherwise idle connections.
+The server reaps connections that have been silent for longer than its idle timeout, which must
+therefore stay well above HEARTBEAT_INTERVAL.
+"""
+
+from time import time
+
+from CommonLib.proto.Base_pb2 import Heartbeat
+
+HEARTBEAT = Heartbeat.DESCRIPTOR.name
+HEARTBEAT_INTERVAL = 15.0       # Seconds between client heartbeats
+DEFAULT_IDLE_TIMEOUT = 60.0     # Seconds without any received frame before a server reaps a client
+
+
+def build_heartbeat() -> bytes:
+    """ Serialized Heartbeat stamped with the current time """
+    heartbeat = Heartbeat()
+    heartbeat.timestamp = time()
+    return heartbeat.SerializeToString()
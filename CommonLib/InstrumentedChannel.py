@@ -0,0 +1,146 @@
+"""
+Created: October 18, 2026
+Description: Bounded trio memory channels that record how they are used
+
+open_instrumented_channel() is a drop-in replacement for trio.open_memory_channel() that also
+records, in a ChannelStats shared by both ends (and their clones):
+- occupancy: items sent but not received yet (including those of senders still waiting for buffer
+  space), and its high-water mark
+- blocked sends: sends that had to wait for buffer space (or, at capacity 0, for a receiver) and
+  the total time spent waiting
+- queueing delay: time from send() to receive() of every item
+A ChannelStats may also be shared by several channels, e.g. all shards of a dispatcher, to get
+totals across them.
+"""
+
+from typing import Optional, Tuple, TypeVar
+
+import trio
+
+T = TypeVar('T')
+
+DEFAULT_CHANNEL_CAPACITY = 64   # Items a channel buffers before senders wait
+
+
+class ChannelStats:
+    """ Usage statistics of one or more instrumented channels """
+    __slots__ = ('sent', 'received', 'occupancy', 'high_water', 'blocked_sends',
+                 'send_wait_seconds', 'queueing_delay_seconds', 'max_queueing_delay_seconds')
+
+    def __init__(self):
+        self.sent: int = 0
+        self.received: int = 0
+        self.occupancy: int = 0
+        self.high_water: int = 0
+        self.blocked_sends: int = 0
+        self.send_wait_seconds: float = 0.0
+        self.queueing_delay_seconds: float = 0.0
+        self.max_queueing_delay_seconds: float = 0.0
+
+    def as_dict(self) -> dict:
+        return dict(sent=self.sent,
+                    received=self.received,
+                    occupancy=self.occupancy,
+                    high_water=self.high_water,
+                    blocked_sends=self.blocked_sends,
+                    send_wait_seconds=self.send_wait_seconds,
+                    mean_queueing_delay_ms=self.queueing_delay_seconds / self.received * 1000
+                    if self.received else 0.0,
+                    max_queueing_delay_ms=self.max_queueing_delay_seconds * 1000)
+
+
+class InstrumentedSendChannel(trio.abc.SendChannel[T]):
+    """ Sending end of an instrumented memory channel """
+
+    def __init__(self, send_channel: trio.MemorySendChannel, stats: ChannelStats):
+        self._send_channel: trio.MemorySendChannel = send_channel
+        self.stats: ChannelStats = stats
+
+    def _record_send(self) -> None:
+        stats = self.stats
+        stats.sent += 1
+        stats.occupancy += 1
+        if stats.occupancy > stats.high_water:
+            stats.high_water = stats.occupancy
+
+    def send_nowait(self, value: T) -> None:
+        self._send_channel.send_nowait((trio.current_time(), value))
+        self._record_send()
+
+    async def send(self, value: T) -> None:
+        await trio.lowlevel.checkpoint_if_cancelled()
+        sent_at = trio.current_time()
+        try:
+            self._send_channel.send_nowait((sent_at, value))
+        except trio.WouldBlock:
+            # Recorded before waiting, a receiver may take the item before this task resumes
+            self._record_send()
+            try:
+                await self._send_channel.send((sent_at, value))
+            except BaseException:
+                # Not sent (e.g. cancelled or closed)
+                self.stats.sent -= 1
+                self.stats.occupancy -= 1
+                raise
+            self.stats.blocked_sends += 1
+            self.stats.send_wait_seconds += trio.current_time() - sent_at
+        else:
+            self._record_send()
+            await trio.lowlevel.cancel_shielded_checkpoint()
+
+    def clone(self) -> 'InstrumentedSendChannel[T]':
+        return InstrumentedSendChannel(self._send_channel.clone(), self.stats)
+
+    def close(self) -> None:
+        self._send_channel.close()
+
+    async def aclose(self) -> None:
+        await self._send_channel.aclose()
+
+
+class InstrumentedReceiveChannel(trio.abc.ReceiveChannel[T]):
+    """ Receiving end of an instrumented memory channel """
+
+    def __init__(self, receive_channel: trio.MemoryReceiveChannel, stats: ChannelStats):
+        self._receive_channel: trio.MemoryReceiveChannel = receive_channel
+        self.stats: ChannelStats = stats
+
+    def _record_receive(self, item: Tuple[float, T]) -> T:
+        sent_at, value = item
+        stats = self.stats
+        stats.received += 1
+        stats.occupancy -= 1
+        queueing_delay = trio.current_time() - sent_at
+        stats.queueing_delay_seconds += queueing_delay
+        if queueing_delay > stats.max_queueing_delay_seconds:
+            stats.max_queueing_delay_seconds = queueing_delay
+        return value
+
+    def receive_nowait(self) -> T:
+        return self._record_receive(self._receive_channel.receive_nowait())
+
+    async def receive(self) -> T:
+        return self._record_receive(await self._receive_channel.receive())
+
+    def clone(self) -> 'InstrumentedReceiveChannel[T]':
+        return InstrumentedReceiveChannel(self._receive_channel.clone(), self.stats)
+
+    def close(self) -> None:
+        self._receive_channel.close()
+
+    async def aclose(self) -> None:
+        await self._receive_channel.aclose()
+
+
+def open_instrumented_channel(capacity: float = DEFAULT_CHANNEL_CAPACITY,
+                              stats: Optional[ChannelStats] = None) \
+        -> Tuple[InstrumentedSendChannel, InstrumentedReceiveChannel]:
+    """
+    Open an instrumented memory channel
+    :param capacity: Items buffered before senders wait (0 = rendezvous, math.inf = unbounded)
+    :param stats: ChannelStats to record into, shared with other channels (default: new one)
+    """
+    stats = stats if stats is not None else ChannelStats()
+    send_channel, receive_channel = trio.open_memory_channel(capacity)
+    return InstrumentedSendChannel(send_channel, stats), \
+        InstrumentedReceiveChannel(receive_channel, stats)
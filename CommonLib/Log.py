@@ -0,0 +1,153 @@
+"""
+Log
+
+Leveled logging for the Server and Client, built on the standard logging module:
+- Log calls take a %-style format string and separate arguments, which are only formatted once a
+  record is actually written, so a disabled level costs a single (cached) level check
+- configure_logging installs a BatchingSink: records are queued and then formatted and written by
+  a background thread, every record queued in the meantime in one write, so the event loop never
+  waits on stdout/stderr
+- Logs on every message go through a SampledLogger, writing only 1 in every sample_rate of them
+Records are formatted later on the sink thread, so log names and sizes rather than objects that are
+reused or changed afterwards (like pooled ServiceMessageEvents).
+"""
+
+import logging
+import os
+import queue
+import sys
+import threading
+from typing import Optional, TextIO, Union
+
+LOG_FORMAT = '%(asctime)s %(processName)s %(levelname)-8s %(name)s: %(message)s'
+DEFAULT_LOG_LEVEL = logging.INFO
+LOG_BATCH_SIZE = 1024           # Records written at once at most
+MESSAGE_SAMPLE_RATE = 1000      # Logs on every message write 1 in every MESSAGE_SAMPLE_RATE
+ROOT_LOGGER = 'AIOServer'       # Every logger of get_logger is a child of it
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+
+
+def get_logger(name: str) -> logging.Logger:
+    """ Logger of a Server or Client module, configured through configure_logging """
+    return logging.getLogger(f'{ROOT_LOGGER}.{name}')
+
+
+class SampledLogger:
+    """ Logs the first and then 1 in every sample_rate records of a logger """
+    __slots__ = ('_logger', '_sample_rate', '_skip')
+
+    def __init__(self, logger: logging.Logger, sample_rate: int = MESSAGE_SAMPLE_RATE):
+        self._logger: logging.Logger = logger
+        self._sample_rate: int = sample_rate
+        self._skip: int = 0
+
+    def log(self, level: int, msg: str, *args) -> None:
+        # Disabled levels neither count nor format anything
+        if not self._logger.isEnabledFor(level):
+            return
+        if self._skip:
+            self._skip -= 1
+            return
+        self._skip = self._sample_rate - 1
+        self._logger.log(level, msg, *args)
+
+    def debug(self, msg: str, *args) -> None:
+        self.log(logging.DEBUG, msg, *args)
+
+    def info(self, msg: str, *args) -> None:
+        self.log(logging.INFO, msg, *args)
+
+
+class BatchingSink(logging.Handler):
+    """ Handler formatting and writing records on a background thread, in batches """
+
+    def __init__(self, stream: Optional[TextIO] = None, batch_size: int = LOG_BATCH_SIZE):
+        """
+        :param stream: Stream records are written to, sys.stderr by default
+        :param batch_size: Records formatted and written at once at most
+        """
+        super().__init__()
+        self._stream: TextIO = stream if stream is not None else sys.stderr
+        self._batch_size: int = batch_size
+        self._records: Optional[queue.SimpleQueue] = None
+        self._writer: Optional[threading.Thread] = None
+        self._closed: bool = False
+        self.records_written: int = 0
+        self.batches_written: int = 0
+        self._start_writer()
+        # Threads are not forked along, forked workers (see Server.run_workers) need their own
+        os.register_at_fork(after_in_child=self._start_writer)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """ Queue record, called by the logging thread (e.g. the event loop) """
+        self._records.put(record)
+
+    def close(self) -> None:
+        """ Write every queued record and stop the writer thread """
+        if not self._closed:
+            self._closed = True
+            self._records.put(None)
+            self._writer.join()
+        super().close()
+
+    def _start_writer(self) -> None:
+        if self._closed:
+            return
+        # Records queued before a fork are written by the parent process, None stops the writer
+        self._records = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._write_records, name='BatchingSink',
+                                        daemon=True)
+        self._writer.start()
+
+    def _write_records(self) -> None:
+        """ Writer thread: wait for a record, then write it with every other queued record """
+        while True:
+            batch = [self._records.get()]
+            while batch[-1] is not None and len(batch) < self._batch_size:
+                try:
+                    batch.append(self._records.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            if stop:
+                batch.pop()
+            if batch:
+                self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch: list) -> None:
+        lines = list()
+        for record in batch:
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        try:
+            self._stream.write('\n'.join(lines) + '\n')
+            self._stream.flush()
+        except Exception:
+            self.handleError(batch[-1])
+        self.records_written += len(lines)
+        self.batches_written += 1
+
+
+def configure_logging(level: Union[int, str] = DEFAULT_LOG_LEVEL,
+                      stream: Optional[TextIO] = None,
+                      batch_size: int = LOG_BATCH_SIZE) -> BatchingSink:
+    """
+    Write every log of level and above through a new BatchingSink, replacing any previous one
+    - Without it, only warnings and errors are logged (by the logging module's last resort
+      handler, unbatched, to stderr)
+    :param stream: Stream records are written to, sys.stderr by default
+    """
+    root_logger = logging.getLogger(ROOT_LOGGER)
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+        handler.close()
+    sink = BatchingSink(stream, batch_size)
+    sink.setFormatter(logging.Formatter(LOG_FORMAT))
+    root_logger.addHandler(sink)
+    root_logger.setLevel(level)
+    root_logger.propagate = False
+    return sink
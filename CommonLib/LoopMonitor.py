@@ -0,0 +1,146 @@
+"""
+Loop Monitor
+
+trio Instrument timing every task step of the event loop it runs in, to find what stalls it (a
+blocking call, synchronous crypto, a long loop without a checkpoint):
+- Step duration: from the scheduler resuming a task until it yields back at its next checkpoint,
+  nothing else in the process runs on the event loop in the meantime
+- Scheduler lag: how late a probe task sleeping every LAG_PROBE_INTERVAL wakes up, i.e. how long a
+  task that became runnable waits behind the steps of other tasks
+Both are recorded in microseconds into histograms of a MetricsRegistry. A step taking threshold or
+longer is a long step: it is logged as a warning with the name of the task and a stack sample, and
+kept in LoopMonitor.long_steps. The stack sample is taken by a watchdog thread while the step still
+runs (so it shows the blocking call), or if the step finished before the watchdog looked, is where
+the task yielded.
+Only the two step hooks are implemented, an instrument still costs every task step two hook calls
+(see Benchmarks/LoopMonitorBenchmark.py), which is why a Server or Client only runs a LoopMonitor
+when given a long step threshold (--long-step-ms).
+"""
+
+import sys
+import threading
+import traceback
+from collections import deque
+from time import perf_counter
+from typing import Optional
+
+import trio
+
+from .Log import get_logger
+from .Metrics import Counter, Histogram, MetricsRegistry
+
+LONG_STEP_THRESHOLD = 0.05      # Seconds a task step may run before it is reported
+LAG_PROBE_INTERVAL = 0.1       # Seconds between scheduler lag probes
+LONG_STEPS_KEPT = 32            # Most recent long steps kept in LoopMonitor.long_steps
+STACK_SAMPLE_DEPTH = 16         # Innermost frames of a stack sample
+
+log = get_logger(__name__)
+
+
+class LongStep:
+    """ Task step that ran for threshold or longer """
+    __slots__ = ('task_name', 'seconds', 'stack', 'blocking')
+
+    def __init__(self, task_name: str, seconds: float, stack: str, blocking: bool):
+        """
+        :param stack: Formatted stack sample
+        :param blocking: stack was sampled while the step ran (else it is where the task yielded)
+        """
+        self.task_name: str = task_name
+        self.seconds: float = seconds
+        self.stack: str = stack
+        self.blocking: bool = blocking
+
+
+class LoopMonitor(trio.abc.Instrument):
+    """ Task step durations, scheduler lag and long step reports of one trio run """
+
+    def __init__(self, threshold: float = LONG_STEP_THRESHOLD,
+                 registry: Optional[MetricsRegistry] = None):
+        """
+        :param threshold: Seconds a task step may run before it is reported
+        :param registry: Registry the metrics are named in (None = unregistered metrics)
+        """
+        registry = registry if registry is not None else MetricsRegistry()
+        self.threshold: float = threshold
+        self.step_us: Histogram = registry.histogram('loop_task_step_us')
+        self.scheduler_lag_us: Histogram = registry.histogram('loop_scheduler_lag_us')
+        self.long_step_count: Counter = registry.counter('loop_long_steps')
+        self.long_steps: deque[LongStep] = deque(maxlen=LONG_STEPS_KEPT)
+        # Current step, also read by the watchdog thread, odd step numbers are steps in progress
+        self._step_start: float = 0.0
+        self._step_number: int = 0
+        # Watchdog stack sample of a long step: (step number, formatted frames)
+        self._stack_sample: Optional[tuple[int, list[str]]] = None
+        self._loop_thread_id: Optional[int] = None
+        self._stopped: threading.Event = threading.Event()
+
+    async def run(self) -> None:
+        """ Monitor the trio run this task runs in, until cancelled """
+        self._loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        watchdog = threading.Thread(target=self._watch, name='LoopMonitor', daemon=True)
+        # This step ends with the first after_task_step call, time it from here
+        self._step_start = perf_counter()
+        self._step_number |= 1
+        trio.lowlevel.add_instrument(self)
+        watchdog.start()
+        log.info('Monitoring event loop, reporting task steps over %.1f ms',
+                 self.threshold * 1000)
+        try:
+            # Scheduler lag probe
+            deadline = trio.current_time()
+            while True:
+                deadline += LAG_PROBE_INTERVAL
+                await trio.sleep_until(deadline)
+                now = trio.current_time()
+                self.scheduler_lag_us.record_seconds(now - deadline)
+                # Do not probe several times in a row to catch up after a stall
+                deadline = max(deadline, now - LAG_PROBE_INTERVAL)
+        finally:
+            trio.lowlevel.remove_instrument(self)
+            self._stopped.set()
+
+    def before_task_step(self, task: trio.lowlevel.Task) -> None:
+        # Start before number, so the watchdog never times a new step from the old start
+        self._step_start = perf_counter()
+        self._step_number += 1
+
+    def after_task_step(self, task: trio.lowlevel.Task) -> None:
+        seconds = perf_counter() - self._step_start
+        self._step_number += 1
+        self.step_us.record_seconds(seconds)
+        if seconds >= self.threshold:
+            self._report_long_step(task, seconds)
+
+    def _report_long_step(self, task: trio.lowlevel.Task, seconds: float) -> None:
+        stack_sample = self._stack_sample
+        # Sampled during this step: the step number before after_task_step incremented it
+        blocking = stack_sample is not None and stack_sample[0] == self._step_number - 1
+        if blocking:
+            frames = stack_sample[1]
+        else:
+            frames = traceback.StackSummary.extract(task.iter_await_frames()).format()
+        stack = ''.join(frames[-STACK_SAMPLE_DEPTH:])
+        self.long_step_count.inc()
+        self.long_steps.append(LongStep(task.name, seconds, stack, blocking))
+        log.warning('Task %s ran %.1f ms without yielding, %s:\n%s', task.name, seconds * 1000,
+                    'blocked in' if blocking else 'yielded at', stack.rstrip('\n'))
+
+    def _watch(self) -> None:
+        """ Watchdog thread: sample the event loop thread's stack once a step runs too long """
+        sampled_step = 0
+        while not self._stopped.wait(self.threshold / 2):
+            step_number = self._step_number
+            if not step_number & 1 or step_number == sampled_step or \
+                    perf_counter() - self._step_start < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            frames = traceback.format_stack(frame, limit=STACK_SAMPLE_DEPTH)
+            del frame
+            # Only keep the sample if it still is the same step
+            if self._step_number == step_number:
+                self._stack_sample = (step_number, frames)
+                sampled_step = step_number
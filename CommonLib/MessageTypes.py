@@ -0,0 +1,71 @@
+"""
+Created: October 18, 2026
+Description: Numeric message type IDs
+
+Every message name a Server routes gets a small integer ID when its service is registered. IDs
+are exchanged once per connection with the ProtocolNegotiation (see CommonLib.Compression):
+    1. Client -> Server: ProtocolNegotiation(message_type_ids=True)
+    2. Server -> Client: ProtocolNegotiation(message_type_ids=True, message_types={name: ID, ...})
+Both sides then send AIOMessage.message_type instead of the (much longer) message_name for every
+message in the table. Clients that never ask for IDs keep sending and receiving message names.
+
+ID 0 means "not set" (the proto3 default), so the IDs of a table are 1, 2, 3, ... and can index
+arrays directly.
+"""
+
+from typing import Optional, Union
+
+from CommonLib.proto.Base_pb2 import ProtocolNegotiation
+
+NO_MESSAGE_TYPE = 0
+
+
+class MessageTypeTable:
+    """ Two-way mapping of message names and their numeric IDs """
+
+    def __init__(self):
+        # Names by ID, index NO_MESSAGE_TYPE is reserved
+        self._names: list[str] = ['']
+        self._ids: dict[str, int] = dict()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def message_types(self) -> dict:
+        """ Message name -> ID of every message type in the table """
+        return dict(self._ids)
+
+    def register(self, message_name: str) -> int:
+        """ ID of message_name, assigning the next free one if it has none yet """
+        message_type = self._ids.get(message_name)
+        if message_type is None:
+            message_type = self._ids[message_name] = len(self._names)
+            self._names.append(message_name)
+        return message_type
+
+    def update(self, message_types: dict) -> None:
+        """ Replace the table with the message name -> ID table received from a Server """
+        self._names = [''] * (max(message_types.values(), default=0) + 1)
+        self._ids = dict(message_types)
+        for message_name, message_type in message_types.items():
+            self._names[message_type] = message_name
+
+    def id_of(self, message_name: str) -> int:
+        """ ID of message_name, NO_MESSAGE_TYPE if it has none """
+        return self._ids.get(message_name, NO_MESSAGE_TYPE)
+
+    def name_of(self, message_type: int) -> str:
+        """ Message name of ID message_type, '' if it is unknown """
+        return self._names[message_type] if message_type < len(self._names) else ''
+
+
+def parse_message_types(message: Union[bytes, memoryview]) -> Optional[dict]:
+    """
+    Message type IDs of a serialized ProtocolNegotiation
+    :return: None if the sender does not use IDs, otherwise its message name -> ID table (empty
+        when sent by a client)
+    """
+    negotiation = ProtocolNegotiation()
+    negotiation.ParseFromString(message)
+    return dict(negotiation.message_types) if negotiation.message_type_ids else None
@@ -0,0 +1,240 @@
+"""
+Metrics
+
+Counters, gauges and latency histograms that are cheap enough to stay on in production:
+- Counter and Gauge are a single slotted attribute, recording is one attribute update
+- Histogram is log-linear (like HdrHistogram): every power of two is split into 2^SUB_BUCKET_BITS
+  linear buckets, so recording is a few integer operations and a list increment, and percentiles
+  are within 1 / 2^SUB_BUCKET_BITS (6.25%) of the recorded values
+MetricsRegistry names every metric of a Server (service handler latency, connection bytes and
+frames, handshake durations, event loop step durations) and also collects the Server.stats dicts,
+its snapshot is served as text by serve_metrics (python -m Server.Server --metrics-port PORT, then
+curl localhost:PORT). A Client keeps a registry of its own event loop metrics.
+"""
+
+from typing import Callable, Optional, Union
+
+import trio
+
+from .Log import get_logger
+
+SUB_BUCKET_BITS = 4             # Linear buckets per power of two: 2^SUB_BUCKET_BITS
+HISTOGRAM_MAX_BITS = 40         # Largest value recorded exactly: 2^HISTOGRAM_MAX_BITS - 1
+PERCENTILES = (50, 90, 99, 99.9)
+METRICS_HOST = '127.0.0.1'      # Snapshots are only served locally
+METRICS_READ_TIMEOUT = 1.0      # Seconds a metrics endpoint client may take to send its request
+
+log = get_logger(__name__)
+
+_LINEAR_VALUES = 1 << (SUB_BUCKET_BITS + 1)
+_BUCKET_COUNT = (HISTOGRAM_MAX_BITS - SUB_BUCKET_BITS + 1) << SUB_BUCKET_BITS
+
+
+class Counter:
+    """ Monotonically increasing count """
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value: int = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+
+class Gauge:
+    """ Current level of something, e.g. open connections """
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value: Union[int, float] = 0
+
+    def set(self, value: Union[int, float]) -> None:
+        self.value = value
+
+    def inc(self, amount: Union[int, float] = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: Union[int, float] = 1) -> None:
+        self.value -= amount
+
+
+class Histogram:
+    """ Log-linear histogram of non-negative integer values (e.g. microseconds or bytes) """
+    __slots__ = ('_counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self._counts: list[int] = [0] * _BUCKET_COUNT
+        self.count: int = 0
+        self.total: int = 0
+        self.max: int = 0
+
+    def record(self, value: int) -> None:
+        if value < _LINEAR_VALUES:
+            # Values below two octaves of sub buckets get a bucket each
+            index = value if value > 0 else 0
+        else:
+            shift = value.bit_length() - SUB_BUCKET_BITS - 1
+            index = (shift << SUB_BUCKET_BITS) + (value >> shift)
+            if index >= _BUCKET_COUNT:
+                index = _BUCKET_COUNT - 1
+        self._counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def record_seconds(self, seconds: float) -> None:
+        """ Record a duration in microseconds (record inlined, this is on every handler call) """
+        value = int(seconds * 1_000_000)
+        if value < _LINEAR_VALUES:
+            index = value if value > 0 else 0
+        else:
+            shift = value.bit_length() - SUB_BUCKET_BITS - 1
+            index = (shift << SUB_BUCKET_BITS) + (value >> shift)
+            if index >= _BUCKET_COUNT:
+                index = _BUCKET_COUNT - 1
+        self._counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percentile: float) -> int:
+        """ Highest value of the bucket holding the percentile's value (0 if nothing recorded) """
+        if not self.count:
+            return 0
+        rank = self.count * percentile / 100
+        seen = 0
+        for index, bucket_count in enumerate(self._counts):
+            seen += bucket_count
+            if bucket_count and seen >= rank:
+                return min(_bucket_upper_bound(index) - 1, self.max)
+        return self.max
+
+    def as_dict(self) -> dict:
+        return dict(count=self.count,
+                    mean=self.total / self.count if self.count else 0.0,
+                    **{f'p{percentile:g}'.replace('.', '_'): self.percentile(percentile)
+                       for percentile in PERCENTILES},
+                    max=self.max)
+
+
+def _bucket_upper_bound(index: int) -> int:
+    """ Smallest value above the values of bucket index """
+    if index < _LINEAR_VALUES:
+        return index + 1
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    return (index - (shift << SUB_BUCKET_BITS) + 1) << shift
+
+
+class MetricsRegistry:
+    """ Named metrics and stats collectors of a Server or Client """
+
+    def __init__(self):
+        self._counters: dict[str, Counter] = dict()
+        self._gauges: dict[str, Gauge] = dict()
+        self._histograms: dict[str, Histogram] = dict()
+        # Callables returning flat dicts of stats kept elsewhere (e.g. Server.stats)
+        self._collectors: list[Callable[[], dict]] = list()
+
+    def counter(self, name: str) -> Counter:
+        """ Counter called name, created on first use """
+        counter = self._counters.get(name)
+        if counter is None:
+            counter = self._counters[name] = Counter()
+        return counter
+
+    def gauge(self, name: str) -> Gauge:
+        """ Gauge called name, created on first use """
+        gauge = self._gauges.get(name)
+        if gauge is None:
+            gauge = self._gauges[name] = Gauge()
+        return gauge
+
+    def histogram(self, name: str, histogram: Optional[Histogram] = None) -> Histogram:
+        """
+        Histogram called name, created on first use
+        :param histogram: Existing histogram to register as name, if not registered yet
+        """
+        if name not in self._histograms:
+            self._histograms[name] = histogram if histogram is not None else Histogram()
+        return self._histograms[name]
+
+    def add_collector(self, collector: Callable[[], dict]) -> None:
+        """ Include the flat dict collector returns in every snapshot """
+        self._collectors.append(collector)
+
+    def snapshot(self) -> dict:
+        """ Current value of every metric and collected stat by name, histograms as dicts """
+        snapshot = dict()
+        for collector in self._collectors:
+            snapshot.update(collector())
+        snapshot.update((name, counter.value) for name, counter in self._counters.items())
+        snapshot.update((name, gauge.value) for name, gauge in self._gauges.items())
+        snapshot.update((name, histogram.as_dict())
+                        for name, histogram in self._histograms.items())
+        return snapshot
+
+    def render_text(self) -> str:
+        """ Snapshot as one "name value" line per value, histogram values as name_p99 etc. """
+        lines = list()
+        for name, value in sorted(self.snapshot().items()):
+            if isinstance(value, dict):
+                lines.extend(f'{name}_{key} {_format_value(key_value)}'
+                             for key, key_value in value.items())
+            else:
+                lines.append(f'{name} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        return f'{value:.6g}'
+    return str(int(value)) if isinstance(value, bool) else str(value)
+
+
+class ConnectionMetrics:
+    """ Metrics every AIOConnection of a Server records into """
+    __slots__ = ('bytes_in', 'frames_in', 'bytes_out', 'frames_out', 'open', 'handshake_us')
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        """
+        :param registry: Registry the metrics are named in (None = unregistered metrics)
+        """
+        registry = registry if registry is not None else MetricsRegistry()
+        self.bytes_in: Counter = registry.counter('connection_bytes_in')
+        self.frames_in: Counter = registry.counter('connection_frames_in')
+        self.bytes_out: Counter = registry.counter('connection_bytes_out')
+        self.frames_out: Counter = registry.counter('connection_frames_out')
+        self.open: Gauge = registry.gauge('connections_open')
+        # Connection accepted until protocols negotiated
+        self.handshake_us: Histogram = registry.histogram('connection_handshake_us')
+
+
+async def serve_metrics(registry: MetricsRegistry, port: int, host: str = METRICS_HOST,
+                        task_status=trio.TASK_STATUS_IGNORED) -> None:
+    """
+    Answer every connection with a text snapshot of registry, as a plain HTTP response so both
+    curl and nc can read it
+    - Errors of one client (e.g. a reset connection) only end that client, serve_metrics runs in
+      the Server's nursery where any error would stop the Server
+    """
+    async def handle_client(client_stream: trio.SocketStream):
+        try:
+            async with client_stream:
+                # Any request gets the snapshot, wait (briefly) for it so the client reads it
+                with trio.move_on_after(METRICS_READ_TIMEOUT):
+                    await client_stream.receive_some()
+                body = registry.render_text().encode()
+                await client_stream.send_all(b'HTTP/1.0 200 OK\r\n'
+                                             b'Content-Type: text/plain; charset=utf-8\r\n'
+                                             b'Content-Length: %d\r\n\r\n' % len(body) + body)
+        except (trio.BrokenResourceError, trio.ClosedResourceError, OSError) as e:
+            log.debug('Metrics client connection broken: %s', e)
+        except Exception:
+            # E.g. a failing stats collector, log it but keep serving
+            log.exception('Metrics snapshot failed')
+
+    listeners = await trio.open_tcp_listeners(port, host=host)
+    task_status.started(listeners)
+    await trio.serve_listeners(handle_client, listeners)
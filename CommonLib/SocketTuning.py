@@ -0,0 +1,150 @@
+"""
+Created: October 18, 2026
+Description: TCP socket tuning profile shared by Server listeners and Client streams
+
+Every option left at None keeps the operating system default. Buffer sizes and keepalive settings
+applied to a listening socket are inherited by the sockets it accepts (on Linux), TCP_NODELAY is
+not: trio enables it on every stream it creates, so it is only reapplied when disabled.
+"""
+
+from typing import Optional
+
+import trio
+
+
+class SocketTuning:
+    """ TCP socket options of a Server or Client """
+
+    def __init__(self, nodelay: bool = True,
+                 send_buffer: Optional[int] = None,
+                 receive_buffer: Optional[int] = None,
+                 backlog: Optional[int] = None,
+                 keepalive: bool = False,
+                 keepalive_idle: Optional[int] = None,
+                 keepalive_interval: Optional[int] = None,
+                 keepalive_count: Optional[int] = None,
+                 listeners: int = 1):
+        """
+        :param nodelay: Disable Nagle's algorithm (TCP_NODELAY)
+        :param send_buffer: SO_SNDBUF size in bytes
+        :param receive_buffer: SO_RCVBUF size in bytes
+        :param backlog: Listen backlog (None = trio default, capped by the OS)
+        :param keepalive: Enable TCP keepalive probes (SO_KEEPALIVE)
+        :param keepalive_idle: Idle seconds before the first keepalive probe (TCP_KEEPIDLE)
+        :param keepalive_interval: Seconds between keepalive probes (TCP_KEEPINTVL)
+        :param keepalive_count: Unanswered probes before the connection is dropped (TCP_KEEPCNT)
+        :param listeners: Number of SO_REUSEPORT listeners a Server accepts connections on
+        """
+        self.nodelay: bool = nodelay
+        self.send_buffer: Optional[int] = send_buffer
+        self.receive_buffer: Optional[int] = receive_buffer
+        self.backlog: Optional[int] = backlog
+        self.keepalive: bool = keepalive
+        self.keepalive_idle: Optional[int] = keepalive_idle
+        self.keepalive_interval: Optional[int] = keepalive_interval
+        self.keepalive_count: Optional[int] = keepalive_count
+        self.listeners: int = listeners
+
+    def __str__(self):
+        return ', '.join(f'{name}={value}' for name, value in vars(self).items()
+                         if value is not None)
+
+    def tune_socket(self, sock: trio.socket.SocketType) -> None:
+        """ Apply every configured option to a TCP socket """
+        sock.setsockopt(trio.socket.IPPROTO_TCP, trio.socket.TCP_NODELAY, self.nodelay)
+        if self.send_buffer is not None:
+            sock.setsockopt(trio.socket.SOL_SOCKET, trio.socket.SO_SNDBUF, self.send_buffer)
+        if self.receive_buffer is not None:
+            sock.setsockopt(trio.socket.SOL_SOCKET, trio.socket.SO_RCVBUF, self.receive_buffer)
+        sock.setsockopt(trio.socket.SOL_SOCKET, trio.socket.SO_KEEPALIVE, self.keepalive)
+        if self.keepalive:
+            # Keepalive timing options are platform-specific, skip the ones that do not exist
+            for option_name, value in (('TCP_KEEPIDLE', self.keepalive_idle),
+                                       ('TCP_KEEPINTVL', self.keepalive_interval),
+                                       ('TCP_KEEPCNT', self.keepalive_count)):
+                if value is not None and hasattr(trio.socket, option_name):
+                    sock.setsockopt(trio.socket.IPPROTO_TCP,
+                                    getattr(trio.socket, option_name), value)
+
+    def tune_accepted_stream(self, stream: trio.SocketStream) -> None:
+        """ Apply the options a stream does not keep from its listener or socket (TCP_NODELAY) """
+        if not self.nodelay:
+            stream.setsockopt(trio.socket.IPPROTO_TCP, trio.socket.TCP_NODELAY, False)
+
+    async def open_listeners(self, host: str, port: int, reuse_port: bool = False) -> list:
+        """
+        Open the TCP listeners of a Server, one (or self.listeners) per address host resolves to
+        :param reuse_port: Bind with SO_REUSEPORT so other processes can share host:port, implied
+            by more than one listener
+        """
+        if reuse_port or self.listeners > 1:
+            if not hasattr(trio.socket, 'SO_REUSEPORT'):
+                raise OSError('SO_REUSEPORT is not supported on this platform')
+            addresses = await trio.socket.getaddrinfo(host, port, type=trio.socket.SOCK_STREAM,
+                                                      flags=trio.socket.AI_PASSIVE)
+            listeners = list()
+            try:
+                for family, socket_type, proto, _, address in addresses:
+                    for _ in range(self.listeners):
+                        listeners.append(await self._open_reuse_port_listener(
+                            family, socket_type, proto, address))
+            except BaseException:
+                for listener in listeners:
+                    listener.socket.close()
+                raise
+        else:
+            listeners = await trio.open_tcp_listeners(
+                port, host=host, **({'backlog': self.backlog} if self.backlog is not None else {}))
+            for listener in listeners:
+                self.tune_socket(listener.socket)
+        return listeners
+
+    async def _open_reuse_port_listener(self, family: int, socket_type: int, proto: int,
+                                        address: tuple) -> trio.SocketListener:
+        """ TCP listener that shares address with the listeners of all other workers """
+        listener_socket = trio.socket.socket(family, socket_type, proto)
+        try:
+            listener_socket.setsockopt(trio.socket.SOL_SOCKET, trio.socket.SO_REUSEADDR, 1)
+            listener_socket.setsockopt(trio.socket.SOL_SOCKET, trio.socket.SO_REUSEPORT, 1)
+            if family == trio.socket.AF_INET6:
+                # Like trio.open_tcp_listeners, IPv4 gets its own listener
+                listener_socket.setsockopt(trio.socket.IPPROTO_IPV6, trio.socket.IPV6_V6ONLY, 1)
+            self.tune_socket(listener_socket)
+            await listener_socket.bind(address)
+            if self.backlog is not None:
+                listener_socket.listen(self.backlog)
+            else:
+                listener_socket.listen()
+        except BaseException:
+            listener_socket.close()
+            raise
+        return trio.SocketListener(listener_socket)
+
+    async def open_stream(self, host: str, port: int) -> trio.SocketStream:
+        """
+        Connect a Client TCP stream to host:port, trying every address host resolves to in turn
+        - Buffer sizes are set before connecting, as the TCP window scale is only negotiated in
+          the handshake
+        """
+        addresses = await trio.socket.getaddrinfo(host, port, type=trio.socket.SOCK_STREAM)
+        if not addresses:
+            raise OSError(f'No addresses for {host}:{port}')
+        errors = list()
+        for family, socket_type, proto, _, address in addresses:
+            stream_socket = trio.socket.socket(family, socket_type, proto)
+            try:
+                self.tune_socket(stream_socket)
+                await stream_socket.connect(address)
+            except OSError as e:
+                stream_socket.close()
+                errors.append(e)
+                continue
+            except BaseException:
+                stream_socket.close()
+                raise
+            stream = trio.SocketStream(stream_socket)
+            # SocketStream enables TCP_NODELAY
+            self.tune_accepted_stream(stream)
+            return stream
+        raise OSError(f'Could not connect to {host}:{port}: '
+                      f'{", ".join(str(error) for error in errors)}')
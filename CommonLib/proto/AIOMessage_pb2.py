@@ -20,7 +20,7 @@ DESCRIPTOR = _descriptor.FileDescriptor(
   syntax='proto3',
   serialized_options=None,
   create_key=_descriptor._internal_create_key,
-  serialized_pb=b'\n\x10\x41IOMessage.proto\x1a\nBase.proto\"\xda\x01\n\nAIOMessage\x12\x36\n\x16\x63ommunication_protocol\x18\x01 \x01(\x0e\x32\x16.CommunicationProtocol\x12\x1c\n\x14\x65ncryption_timestamp\x18\x02 \x01(\x02\x12\x14\n\x0cmessage_name\x18\x03 \x01(\t\x12\x0f\n\x07message\x18\x04 \x01(\x0c\x12\x1a\n\x12\x65ncrypted_messages\x18\x05 \x03(\x0c\x12\x0c\n\x04tags\x18\x06 \x03(\x0c\x12\x0e\n\x06nonces\x18\x07 \x03(\x0c\x12\x15\n\x05\x65rror\x18\x08 \x01(\x0b\x32\x06.Errorb\x06proto3'
+  serialized_pb=b'\n\x10\x41IOMessage.proto\x1a\nBase.proto\"\x88\x02\n\nAIOMessage\x12\x36\n\x16\x63ommunication_protocol\x18\x01 \x01(\x0e\x32\x16.CommunicationProtocol\x12\x1c\n\x14\x65ncryption_timestamp\x18\x02 \x01(\x02\x12\x14\n\x0cmessage_name\x18\x03 \x01(\t\x12\x0f\n\x07message\x18\x04 \x01(\x0c\x12\x1a\n\x12\x65ncrypted_messages\x18\x05 \x03(\x0c\x12\x0c\n\x04tags\x18\x06 \x03(\x0c\x12\x0e\n\x06nonces\x18\x07 \x03(\x0c\x12\x15\n\x05\x65rror\x18\x08 \x01(\x0b\x32\x06.Error\x12\x14\n\x0cmessage_type\x18\t \x01(\r\x12\x16\n\x0e\x63orrelation_id\x18\n \x01(\rb\x06proto3'
   ,
   dependencies=[Base__pb2.DESCRIPTOR,])
 
@@ -91,6 +91,20 @@ _AIOMESSAGE = _descriptor.Descriptor(
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='message_type', full_name='AIOMessage.message_type', index=8,
+      number=9, type=13, cpp_type=3, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='correlation_id', full_name='AIOMessage.correlation_id', index=9,
+      number=10, type=13, cpp_type=3, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
   ],
   extensions=[
   ],
@@ -104,7 +118,7 @@ _AIOMESSAGE = _descriptor.Descriptor(
   oneofs=[
   ],
   serialized_start=33,
-  serialized_end=251,
+  serialized_end=297,
 )
 
 _AIOMESSAGE.fields_by_name['communication_protocol'].enum_type = Base__pb2._COMMUNICATIONPROTOCOL
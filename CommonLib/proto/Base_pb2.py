@@ -20,7 +20,7 @@ DESCRIPTOR = _descriptor.FileDescriptor(
   syntax='proto3',
   serialized_options=None,
   create_key=_descriptor._internal_create_key,
-  serialized_pb=b'\n\nBase.proto\">\n\x05\x45rror\x12\x1e\n\nerror_code\x18\x01 \x01(\x0e\x32\n.ErrorCode\x12\x15\n\rerror_details\x18\x02 \x01(\t*\xe8\x02\n\tErrorCode\x12\x11\n\rUNKNOWN_ERROR\x10\x00\x12\r\n\tCLI_ERROR\x10\x01\x12\r\n\tRSA_ERROR\x10\x02\x12\r\n\tAES_ERROR\x10\x03\x12\x16\n\x12KEY_EXCHANGE_ERROR\x10\x04\x12\x14\n\x10\x44\x45\x43RYPTION_ERROR\x10\x05\x12\x14\n\x10\x45NCRYPTION_ERR0R\x10\x06\x12\x11\n\rTIMEOUT_ERROR\x10\x07\x12\x19\n\x15INVALID_REQUEST_ERROR\x10\x08\x12\x1a\n\x16INVALID_RESPONSE_ERROR\x10\t\x12\x12\n\x0eSECURITY_ERROR\x10\n\x12\x10\n\x0cSERVER_ERROR\x10\x0b\x12\x11\n\rSERVICE_ERROR\x10\x0c\x12\x11\n\rPARSING_ERROR\x10\r\x12\x19\n\x15PASSWORD_CHANGE_ERROR\x10\x0e\x12\x12\n\x0e\x45NCODING_ERROR\x10\x0f\x12\x12\n\x0e\x44\x45\x43ODING_ERROR\x10\x10*X\n\x15\x43ommunicationProtocol\x12\x0e\n\nPLAIN_TEXT\x10\x00\x12\x07\n\x03RSA\x10\x01\x12\x07\n\x03\x41\x45S\x10\x02\x12\n\n\x06\x43HACHA\x10\x03\x12\x07\n\x03\x43\x41N\x10\x04\x12\x08\n\x04MQTT\x10\x05\x62\x06proto3'
+  serialized_pb=b'\n\nBase.proto\">\n\x05\x45rror\x12\x1e\n\nerror_code\x18\x01 \x01(\x0e\x32\n.ErrorCode\x12\x15\n\rerror_details\x18\x02 \x01(\t\"\xdc\x01\n\x13ProtocolNegotiation\x12\x37\n\x17\x63ommunication_protocols\x18\x01 \x03(\x0e\x32\x16.CommunicationProtocol\x12\x18\n\x10message_type_ids\x18\x02 \x01(\x08\x12=\n\rmessage_types\x18\x03 \x03(\x0b\x32&.ProtocolNegotiation.MessageTypesEntry\x1a\x33\n\x11MessageTypesEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\r:\x02\x38\x01\"\x1e\n\tHeartbeat\x12\x11\n\ttimestamp\x18\x01 \x01(\x02\"\x1b\n\x0b\x45\x63hoMessage\x12\x0c\n\x04\x64\x61ta\x18\x01 \x01(\x0c*\xe8\x02\n\tErrorCode\x12\x11\n\rUNKNOWN_ERROR\x10\x00\x12\r\n\tCLI_ERROR\x10\x01\x12\r\n\tRSA_ERROR\x10\x02\x12\r\n\tAES_ERROR\x10\x03\x12\x16\n\x12KEY_EXCHANGE_ERROR\x10\x04\x12\x14\n\x10\x44\x45\x43RYPTION_ERROR\x10\x05\x12\x14\n\x10\x45NCRYPTION_ERR0R\x10\x06\x12\x11\n\rTIMEOUT_ERROR\x10\x07\x12\x19\n\x15INVALID_REQUEST_ERROR\x10\x08\x12\x1a\n\x16INVALID_RESPONSE_ERROR\x10\t\x12\x12\n\x0eSECURITY_ERROR\x10\n\x12\x10\n\x0cSERVER_ERROR\x10\x0b\x12\x11\n\rSERVICE_ERROR\x10\x0c\x12\x11\n\rPARSING_ERROR\x10\r\x12\x19\n\x15PASSWORD_CHANGE_ERROR\x10\x0e\x12\x12\n\x0e\x45NCODING_ERROR\x10\x0f\x12\x12\n\x0e\x44\x45\x43ODING_ERROR\x10\x10*b\n\x15\x43ommunicationProtocol\x12\x0e\n\nPLAIN_TEXT\x10\x00\x12\x07\n\x03RSA\x10\x01\x12\x07\n\x03\x41\x45S\x10\x02\x12\n\n\x06\x43HACHA\x10\x03\x12\x07\n\x03\x43\x41N\x10\x04\x12\x08\n\x04MQTT\x10\x05\x12\x08\n\x04ZLIB\x10\x06\x62\x06proto3'
 )
 
 _ERRORCODE = _descriptor.EnumDescriptor(
@@ -118,8 +118,8 @@ _ERRORCODE = _descriptor.EnumDescriptor(
   ],
   containing_type=None,
   serialized_options=None,
-  serialized_start=79,
-  serialized_end=439,
+  serialized_start=363,
+  serialized_end=723,
 )
 _sym_db.RegisterEnumDescriptor(_ERRORCODE)
 
@@ -161,11 +161,16 @@ _COMMUNICATIONPROTOCOL = _descriptor.EnumDescriptor(
       serialized_options=None,
       type=None,
       create_key=_descriptor._internal_create_key),
+    _descriptor.EnumValueDescriptor(
+      name='ZLIB', index=6, number=6,
+      serialized_options=None,
+      type=None,
+      create_key=_descriptor._internal_create_key),
   ],
   containing_type=None,
   serialized_options=None,
-  serialized_start=441,
-  serialized_end=529,
+  serialized_start=725,
+  serialized_end=823,
 )
 _sym_db.RegisterEnumDescriptor(_COMMUNICATIONPROTOCOL)
 
@@ -193,6 +198,7 @@ AES = 2
 CHACHA = 3
 CAN = 4
 MQTT = 5
+ZLIB = 6
 
 
 
@@ -234,8 +240,162 @@ _ERROR = _descriptor.Descriptor(
   serialized_end=76,
 )
 
+
+_PROTOCOLNEGOTIATION_MESSAGETYPESENTRY = _descriptor.Descriptor(
+  name='MessageTypesEntry',
+  full_name='ProtocolNegotiation.MessageTypesEntry',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='key', full_name='ProtocolNegotiation.MessageTypesEntry.key', index=0,
+      number=1, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=b"".decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='value', full_name='ProtocolNegotiation.MessageTypesEntry.value', index=1,
+      number=2, type=13, cpp_type=3, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=b'8\001',
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=248,
+  serialized_end=299,
+)
+
+_PROTOCOLNEGOTIATION = _descriptor.Descriptor(
+  name='ProtocolNegotiation',
+  full_name='ProtocolNegotiation',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='communication_protocols', full_name='ProtocolNegotiation.communication_protocols', index=0,
+      number=1, type=14, cpp_type=8, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='message_type_ids', full_name='ProtocolNegotiation.message_type_ids', index=1,
+      number=2, type=8, cpp_type=7, label=1,
+      has_default_value=False, default_value=False,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='message_types', full_name='ProtocolNegotiation.message_types', index=2,
+      number=3, type=11, cpp_type=10, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[_PROTOCOLNEGOTIATION_MESSAGETYPESENTRY, ],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=79,
+  serialized_end=299,
+)
+
+
+_HEARTBEAT = _descriptor.Descriptor(
+  name='Heartbeat',
+  full_name='Heartbeat',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='timestamp', full_name='Heartbeat.timestamp', index=0,
+      number=1, type=2, cpp_type=6, label=1,
+      has_default_value=False, default_value=float(0),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=301,
+  serialized_end=331,
+)
+
+
+_ECHOMESSAGE = _descriptor.Descriptor(
+  name='EchoMessage',
+  full_name='EchoMessage',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='data', full_name='EchoMessage.data', index=0,
+      number=1, type=12, cpp_type=9, label=1,
+      has_default_value=False, default_value=b"",
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=333,
+  serialized_end=360,
+)
+
 _ERROR.fields_by_name['error_code'].enum_type = _ERRORCODE
+_PROTOCOLNEGOTIATION_MESSAGETYPESENTRY.containing_type = _PROTOCOLNEGOTIATION
+_PROTOCOLNEGOTIATION.fields_by_name['communication_protocols'].enum_type = _COMMUNICATIONPROTOCOL
+_PROTOCOLNEGOTIATION.fields_by_name['message_types'].message_type = _PROTOCOLNEGOTIATION_MESSAGETYPESENTRY
 DESCRIPTOR.message_types_by_name['Error'] = _ERROR
+DESCRIPTOR.message_types_by_name['ProtocolNegotiation'] = _PROTOCOLNEGOTIATION
+DESCRIPTOR.message_types_by_name['Heartbeat'] = _HEARTBEAT
+DESCRIPTOR.message_types_by_name['EchoMessage'] = _ECHOMESSAGE
 DESCRIPTOR.enum_types_by_name['ErrorCode'] = _ERRORCODE
 DESCRIPTOR.enum_types_by_name['CommunicationProtocol'] = _COMMUNICATIONPROTOCOL
 _sym_db.RegisterFileDescriptor(DESCRIPTOR)
@@ -247,5 +407,35 @@ Error = _reflection.GeneratedProtocolMessageType('Error', (_message.Message,), {
   })
 _sym_db.RegisterMessage(Error)
 
+ProtocolNegotiation = _reflection.GeneratedProtocolMessageType('ProtocolNegotiation', (_message.Message,), {
+
+  'MessageTypesEntry' : _reflection.GeneratedProtocolMessageType('MessageTypesEntry', (_message.Message,), {
+    'DESCRIPTOR' : _PROTOCOLNEGOTIATION_MESSAGETYPESENTRY,
+    '__module__' : 'Base_pb2'
+    # @@protoc_insertion_point(class_scope:ProtocolNegotiation.MessageTypesEntry)
+    })
+  ,
+  'DESCRIPTOR' : _PROTOCOLNEGOTIATION,
+  '__module__' : 'Base_pb2'
+  # @@protoc_insertion_point(class_scope:ProtocolNegotiation)
+  })
+_sym_db.RegisterMessage(ProtocolNegotiation)
+_sym_db.RegisterMessage(ProtocolNegotiation.MessageTypesEntry)
+
+Heartbeat = _reflection.GeneratedProtocolMessageType('Heartbeat', (_message.Message,), {
+  'DESCRIPTOR' : _HEARTBEAT,
+  '__module__' : 'Base_pb2'
+  # @@protoc_insertion_point(class_scope:Heartbeat)
+  })
+_sym_db.RegisterMessage(Heartbeat)
+
+EchoMessage = _reflection.GeneratedProtocolMessageType('EchoMessage', (_message.Message,), {
+  'DESCRIPTOR' : _ECHOMESSAGE,
+  '__module__' : 'Base_pb2'
+  # @@protoc_insertion_point(class_scope:EchoMessage)
+  })
+_sym_db.RegisterMessage(EchoMessage)
+
 
+_PROTOCOLNEGOTIATION_MESSAGETYPESENTRY._options = None
 # @@protoc_insertion_point(module_scope)
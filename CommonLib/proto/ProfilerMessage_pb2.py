@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: ProfilerMessage.proto
+"""Generated protocol buffer code."""
+from google.protobuf.internal import enum_type_wrapper
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import message as _message
+from google.protobuf import reflection as _reflection
+from google.protobuf import symbol_database as _symbol_database
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+import Base_pb2 as Base__pb2
+
+
+DESCRIPTOR = _descriptor.FileDescriptor(
+  name='ProfilerMessage.proto',
+  package='',
+  syntax='proto3',
+  serialized_options=None,
+  create_key=_descriptor._internal_create_key,
+  serialized_pb=b'\n\x15ProfilerMessage.proto\x1a\nBase.proto\"\xa2\x01\n\x0fProfilerMessage\x12!\n\x07\x63ommand\x18\x01 \x01(\x0e\x32\x10.ProfilerCommand\x12\x13\n\x0bsample_rate\x18\x02 \x01(\r\x12\x10\n\x08\x64uration\x18\x03 \x01(\r\x12\x0f\n\x07running\x18\x04 \x01(\x08\x12\x0f\n\x07samples\x18\x05 \x01(\x04\x12\x0c\n\x04path\x18\x06 \x01(\t\x12\x15\n\x05\x65rror\x18\x07 \x01(\x0b\x32\x06.Error*M\n\x0fProfilerCommand\x12\x13\n\x0fPROFILER_STATUS\x10\x00\x12\x12\n\x0ePROFILER_START\x10\x01\x12\x11\n\rPROFILER_STOP\x10\x02\x62\x06proto3'
+  ,
+  dependencies=[Base__pb2.DESCRIPTOR,])
+
+_PROFILERCOMMAND = _descriptor.EnumDescriptor(
+  name='ProfilerCommand',
+  full_name='ProfilerCommand',
+  filename=None,
+  file=DESCRIPTOR,
+  create_key=_descriptor._internal_create_key,
+  values=[
+    _descriptor.EnumValueDescriptor(
+      name='PROFILER_STATUS', index=0, number=0,
+      serialized_options=None,
+      type=None,
+      create_key=_descriptor._internal_create_key),
+    _descriptor.EnumValueDescriptor(
+      name='PROFILER_START', index=1, number=1,
+      serialized_options=None,
+      type=None,
+      create_key=_descriptor._internal_create_key),
+    _descriptor.EnumValueDescriptor(
+      name='PROFILER_STOP', index=2, number=2,
+      serialized_options=None,
+      type=None,
+      create_key=_descriptor._internal_create_key),
+  ],
+  containing_type=None,
+  serialized_options=None,
+  serialized_start=202,
+  serialized_end=279,
+)
+_sym_db.RegisterEnumDescriptor(_PROFILERCOMMAND)
+
+ProfilerCommand = enum_type_wrapper.EnumTypeWrapper(_PROFILERCOMMAND)
+PROFILER_STATUS = 0
+PROFILER_START = 1
+PROFILER_STOP = 2
+
+
+
+_PROFILERMESSAGE = _descriptor.Descriptor(
+  name='ProfilerMessage',
+  full_name='ProfilerMessage',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='command', full_name='ProfilerMessage.command', index=0,
+      number=1, type=14, cpp_type=8, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='sample_rate', full_name='ProfilerMessage.sample_rate', index=1,
+      number=2, type=13, cpp_type=3, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='duration', full_name='ProfilerMessage.duration', index=2,
+      number=3, type=13, cpp_type=3, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='running', full_name='ProfilerMessage.running', index=3,
+      number=4, type=8, cpp_type=7, label=1,
+      has_default_value=False, default_value=False,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='samples', full_name='ProfilerMessage.samples', index=4,
+      number=5, type=4, cpp_type=4, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='path', full_name='ProfilerMessage.path', index=5,
+      number=6, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=b"".decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='error', full_name='ProfilerMessage.error', index=6,
+      number=7, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=38,
+  serialized_end=200,
+)
+
+_PROFILERMESSAGE.fields_by_name['command'].enum_type = _PROFILERCOMMAND
+_PROFILERMESSAGE.fields_by_name['error'].message_type = Base__pb2._ERROR
+DESCRIPTOR.message_types_by_name['ProfilerMessage'] = _PROFILERMESSAGE
+DESCRIPTOR.enum_types_by_name['ProfilerCommand'] = _PROFILERCOMMAND
+_sym_db.RegisterFileDescriptor(DESCRIPTOR)
+
+ProfilerMessage = _reflection.GeneratedProtocolMessageType('ProfilerMessage', (_message.Message,), {
+  'DESCRIPTOR' : _PROFILERMESSAGE,
+  '__module__' : 'ProfilerMessage_pb2'
+  # @@protoc_insertion_point(class_scope:ProfilerMessage)
+  })
+_sym_db.RegisterMessage(ProfilerMessage)
+
+
+# @@protoc_insertion_point(module_scope)
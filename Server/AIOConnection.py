@@ -2,21 +2,70 @@
 AIO Connection Object
 """
 
+from time import monotonic_ns
+from typing import Callable, Optional, Union
+
 import trio
 
 from uuid import UUID
-from .util import ServiceMessageEvent
+from .Priority import Priority, PriorityDeque
+from .Tracing import RESPONSE_CLOSED, RESPONSE_DROPPED, Trace, Tracer
+from .util import BackpressurePolicy, ResponseCallback, SerializedMessage, ServiceMessageEvent, \
+    ServiceMessageEventPool
 from google.protobuf.message import Message
+from CommonLib.Compression import SessionCompressor, DEFAULT_COMPRESSION_THRESHOLD, \
+    PROTOCOL_NEGOTIATION, ZLIB, build_protocol_negotiation, parse_protocol_negotiation
+from CommonLib.Framing import FrameDecoder, FramingError, DEFAULT_MAX_FRAME_SIZE, append_frame
+from CommonLib.Heartbeat import HEARTBEAT
+from CommonLib.Log import SampledLogger, get_logger
+from CommonLib.MessageTypes import NO_MESSAGE_TYPE, MessageTypeTable, parse_message_types
+from CommonLib.Metrics import ConnectionMetrics
 from CommonLib.proto.AIOMessage_pb2 import AIOMessage
 
+# Outbound write coalescing defaults
+MAX_FLUSH_BYTES = 64 * 1024     # Flush as soon as this many bytes are queued
+FLUSH_DEADLINE = 0.001          # Seconds a queued message may wait for others to join its flush
+
+# Slow consumer defaults
+OUTBOUND_HIGH_WATER = 1024 * 1024                   # Max queued outbound bytes per connection
+BACKPRESSURE_POLICY = BackpressurePolicy.DISCONNECT
+
+log = get_logger(__name__)
+message_log = SampledLogger(log)     # Logs on every received or sent message
+
 
 class AIOConnection:
     def __init__(self, uuid: UUID, connection_stream: trio.SocketStream,
-                 server_event_handler: trio.abc.SendChannel.send):
+                 server_event_handler: trio.abc.SendChannel.send,
+                 max_frame_size: int = DEFAULT_MAX_FRAME_SIZE,
+                 max_flush_bytes: int = MAX_FLUSH_BYTES,
+                 flush_deadline: float = FLUSH_DEADLINE,
+                 outbound_high_water: int = OUTBOUND_HIGH_WATER,
+                 backpressure_policy: BackpressurePolicy = BACKPRESSURE_POLICY,
+                 compression: bool = False,
+                 compression_threshold: int = DEFAULT_COMPRESSION_THRESHOLD,
+                 message_types: Optional[MessageTypeTable] = None,
+                 event_pool: Optional[ServiceMessageEventPool] = None,
+                 priorities: Optional[dict] = None,
+                 metrics: Optional[ConnectionMetrics] = None,
+                 tracer: Optional[Tracer] = None):
         """
         :param uuid:
         :param connection_stream:
         :param server_event_handler:
+        :param max_frame_size: Largest AIOMessage (in bytes) accepted from the client
+        :param max_flush_bytes: Queued bytes that trigger an immediate flush to the client
+        :param flush_deadline: Max seconds the _sender waits for more messages before flushing
+        :param outbound_high_water: Queued outbound bytes at which backpressure_policy applies
+        :param backpressure_policy: How send treats a client that cannot keep up
+        :param compression: Accept zlib compression if the client asks for it
+        :param compression_threshold: Smallest outbound message (in bytes) that gets compressed
+        :param message_types: Message type IDs offered to clients that negotiate them
+        :param event_pool: Pool ServiceMessageEvents are taken from (default: new events)
+        :param priorities: Priority of outbound messages by message name (default: NORMAL),
+            connection control messages (heartbeats, protocol negotiation) are always HIGH
+        :param metrics: Server-wide metrics of all connections (default: unregistered metrics)
+        :param tracer: Tracer sampling received service messages (None = no tracing)
         """
         # General information
         self._is_alive: bool = True
@@ -26,6 +75,51 @@ class AIOConnection:
         # Connection stream and server event handler
         self._connection_stream: trio.SocketStream = connection_stream
         self._server_event_handler: trio.abc.SendChannel.send = server_event_handler
+        self._max_frame_size: int = max_frame_size
+        self._frame_decoder: FrameDecoder = FrameDecoder(max_frame_size)
+        self._cancel_scope: trio.CancelScope = trio.CancelScope()
+        self._last_activity: float = trio.current_time()
+        self._heartbeats_received: int = 0
+        self._new_event: Callable[..., ServiceMessageEvent] = \
+            event_pool.acquire if event_pool is not None else ServiceMessageEvent
+
+        # Outbound queue of (message name, serialized message, correlation ID, traced response) by
+        #   priority drained by the _sender, traced responses are (trace, response timestamps)
+        self._outbound: PriorityDeque[tuple[str, bytes, int, Optional[tuple]]] = PriorityDeque()
+        self._priorities: dict[str, Priority] = priorities if priorities is not None else dict()
+        self._outbound_bytes: int = 0
+        self._outbound_lot: trio.lowlevel.ParkingLot = trio.lowlevel.ParkingLot()
+        self._max_flush_bytes: int = max_flush_bytes
+        self._flush_deadline: float = flush_deadline
+
+        # Slow consumer handling
+        self._outbound_high_water: int = outbound_high_water
+        self._backpressure_policy: BackpressurePolicy = backpressure_policy
+        self._outbound_space_lot: trio.lowlevel.ParkingLot = trio.lowlevel.ParkingLot()
+
+        # Compression, only created once negotiated with the client
+        self._compression: bool = compression
+        self._compression_threshold: int = compression_threshold
+        self._compressor: Optional[SessionCompressor] = None
+
+        # Message type IDs, sent instead of message names once the client received the table
+        self._message_types: Optional[MessageTypeTable] = message_types
+        self._message_types_negotiated: bool = False
+        self._send_message_types: bool = False
+
+        # Metrics shared by all connections, the handshake lasts until protocols are negotiated
+        self._metrics: ConnectionMetrics = metrics if metrics is not None else ConnectionMetrics()
+        self._handshake_start: Optional[float] = trio.current_time()
+        self._tracer: Optional[Tracer] = tracer
+
+        # Outbound statistics
+        self._messages_sent: int = 0
+        self._bytes_sent: int = 0
+        self._flushes: int = 0
+        self._dropped_oldest: int = 0
+        self._dropped_newest: int = 0
+        self._blocked_sends: int = 0
+        self._slow_consumer_disconnect: bool = False
 
     def __str__(self):
         return f'[AIOConnection:{self._uuid}]'
@@ -34,38 +128,308 @@ class AIOConnection:
     def is_alive(self):
         return self._is_alive
 
+    @property
+    def last_activity(self) -> float:
+        """ trio.current_time() at which data was last received from the client """
+        return self._last_activity
+
+    @property
+    def stats(self) -> dict:
+        """ Outbound statistics, send_all calls saved by coalescing are reported per message """
+        return dict(
+            messages_sent=self._messages_sent,
+            bytes_sent=self._bytes_sent,
+            flushes=self._flushes,
+            syscalls_saved_per_message=(1 - self._flushes / self._messages_sent)
+            if self._messages_sent else 0.0,
+            outbound_queued_bytes=self._outbound_bytes,
+            dropped_oldest=self._dropped_oldest,
+            dropped_newest=self._dropped_newest,
+            blocked_sends=self._blocked_sends,
+            slow_consumer_disconnect=self._slow_consumer_disconnect,
+            heartbeats_received=self._heartbeats_received)
+
+    @property
+    def compression_stats(self) -> Optional[dict]:
+        """ Compression statistics, None if compression was not negotiated """
+        return self._compressor.stats if self._compressor is not None else None
+
+    async def run(self):
+        """ Run _receiver and _sender until either one of them stops """
+        self._metrics.open.inc()
+        try:
+            with self._cancel_scope:
+                async with trio.open_nursery() as nursery:
+                    nursery.start_soon(self.receiver)
+                    nursery.start_soon(self.sender)
+        finally:
+            self._metrics.open.dec()
+            await trio.aclose_forcefully(self._connection_stream)
+
+    def close(self, reason: str):
+        """ Close the connection from outside of the _receiver and _sender """
+        log.info('%s closing: %s', self, reason)
+        self._close()
+
+    def _close(self):
+        """ Mark connection as dead and stop both _receiver and _sender """
+        self._is_alive = False
+        for _, _, _, traced_response in self._outbound:
+            if traced_response is not None:
+                traced_response[0].response_dropped(traced_response[1], RESPONSE_CLOSED)
+        self._outbound.clear()
+        self._outbound_bytes = 0
+        self._outbound_space_lot.unpark_all()
+        self._cancel_scope.cancel()
+
     async def receiver(self):
         """
         AIOConnection _receiver
         - Should only receive (potentially encrypted) AIOMessages
         """
+        metrics = self._metrics
+        tracer = self._tracer
         try:
-            async for serialized_aio_message in self._connection_stream:
-                aio_message = AIOMessage()
-                aio_message.ParseFromString(serialized_aio_message)
-                print(f'AIOConnection:{self._uuid.hex[:8]} got data: {aio_message}')
-                await self._server_event_handler(
-                    self._aio_msg_to_service_request(aio_message))
+            async for data in self._connection_stream:
+                self._last_activity = trio.current_time()
+                received_ns = monotonic_ns() if tracer is not None else 0
+                metrics.bytes_in.inc(len(data))
+                for serialized_aio_message in self._frame_decoder.feed(data):
+                    metrics.frames_in.inc()
+                    aio_message = AIOMessage()
+                    aio_message.ParseFromString(serialized_aio_message)
+                    if aio_message.communication_protocol == ZLIB:
+                        if self._compressor is None:
+                            log.warning('%s received compressed message before negotiation', self)
+                            continue
+                        aio_message.message = self._compressor.decompress(aio_message.message)
+                    if aio_message.message_name == HEARTBEAT:
+                        self._heartbeats_received += 1
+                        await self._queue(HEARTBEAT, aio_message.message, Priority.HIGH,
+                                          aio_message.correlation_id)
+                        continue
+                    message_log.debug('%s received %s (%d bytes)', self, aio_message.message_name or
+                                      aio_message.message_type, len(aio_message.message))
+                    if aio_message.message_name == PROTOCOL_NEGOTIATION:
+                        await self._negotiate_protocols(aio_message.message)
+                        continue
+                    await self._server_event_handler(
+                        self._aio_msg_to_service_request(aio_message, received_ns))
 
         except trio.BrokenResourceError as e:
-            print(f'{e}')
+            log.info('%s connection broken: %s', self, e)
+
+        except FramingError as e:
+            log.warning('%s closing connection due to framing error: %s', self, e)
+            await self._connection_stream.aclose()
+
+        finally:
+            self._close()
 
-    def _aio_msg_to_service_request(self, aio_message: AIOMessage) -> ServiceMessageEvent:
+    def _aio_msg_to_service_request(self, aio_message: AIOMessage,
+                                    received_ns: int = 0) -> ServiceMessageEvent:
         """
         Convert a received and decrypted AIOMessage into a ServiceRequestEvent
         :param aio_message: Decrypted AIOMessage received from a client
+        :param received_ns: monotonic_ns() at which the message was received, if tracing
         """
-        return ServiceMessageEvent(
+        message_type = aio_message.message_type
+        if message_type and self._message_types_negotiated:
+            service_name = self._message_types.name_of(message_type)
+            if not service_name:
+                message_type = NO_MESSAGE_TYPE
+        else:
+            message_type = NO_MESSAGE_TYPE
+            service_name = aio_message.message_name
+        trace = self._tracer.start(service_name, self._uuid.int, received_ns) \
+            if self._tracer is not None else None
+        return self._new_event(
             requester_uuid=self._uuid.int,
-            service_name=aio_message.message_name,
-            message=aio_message.message,
-            response_callback=self.send)
+            service_name=service_name,
+            payload=memoryview(aio_message.message),
+            response_callback=ResponseCallback(self.send, aio_message.correlation_id, trace)
+            if aio_message.correlation_id or trace is not None else self.send,
+            message_type=message_type,
+            trace=trace)
 
-    async def send(self, message: Message):
-        """ AIOConnection _sender """
+    async def _negotiate_protocols(self, message: bytes):
+        """ Enable the requested communication protocols this connection supports and reply """
+        requested_protocols = parse_protocol_negotiation(message)
+        enabled_protocols = list()
+        if ZLIB in requested_protocols and self._compression:
+            if self._compressor is None:
+                self._compressor = SessionCompressor(self._compression_threshold,
+                                                     max_size=self._max_frame_size)
+            enabled_protocols.append(ZLIB)
+        log.debug('%s enabled communication protocols: %s', self, enabled_protocols)
+        if parse_message_types(message) is not None and self._message_types is not None:
+            self._message_types_negotiated = True
+        await self._queue(PROTOCOL_NEGOTIATION, build_protocol_negotiation(
+            *enabled_protocols, message_types=self._message_types.message_types
+            if self._message_types_negotiated else None), Priority.HIGH)
+        if self._handshake_start is not None:
+            self._metrics.handshake_us.record_seconds(trio.current_time() - self._handshake_start)
+            self._handshake_start = None
+
+    async def send(self, message: Union[Message, SerializedMessage], correlation_id: int = 0,
+                   trace: Optional[Trace] = None):
+        """
+        Queue message (serialized here unless it already is) for the AIOConnection _sender
+        :param correlation_id: Correlation ID of the request message responds to (0 = none)
+        :param trace: Trace of the request message responds to, if sampled
+        """
+        if isinstance(message, SerializedMessage):
+            message_log.debug('%s sending %s (%d bytes)', self, message.message_name,
+                              len(message.payload))
+            await self._queue(message.message_name, message.payload, correlation_id=correlation_id,
+                              trace=trace)
+        else:
+            message_log.debug('%s sending %s', self, message.DESCRIPTOR.name)
+            await self._queue(message.DESCRIPTOR.name, message.SerializeToString(),
+                              correlation_id=correlation_id, trace=trace)
+
+    async def _queue(self, message_name: str, serialized_message: Union[bytes, memoryview],
+                     priority: Optional[Priority] = None, correlation_id: int = 0,
+                     trace: Optional[Trace] = None):
+        """
+        Queue a serialized message for the _sender, applying backpressure if necessary
+        :param priority: Outbound lane of the message (default: priority of message_name)
+        :param correlation_id: Correlation ID of the request message responds to (0 = none)
+        :param trace: Trace of the request message responds to, if sampled
+        """
+        if not self._is_alive:
+            if trace is not None:
+                trace.response_dropped(trace.response_queued(), RESPONSE_CLOSED)
+            raise trio.ClosedResourceError(f'{self} is closed')
+        if self._outbound and \
+                self._outbound_bytes + len(serialized_message) > self._outbound_high_water:
+            try:
+                queue = await self._apply_backpressure(len(serialized_message))
+            except trio.ClosedResourceError:
+                if trace is not None:
+                    trace.response_dropped(trace.response_queued(), RESPONSE_CLOSED)
+                raise
+            if not queue:
+                if trace is not None:
+                    trace.response_dropped(trace.response_queued(), RESPONSE_DROPPED)
+                return
+        self._outbound.append((message_name, serialized_message, correlation_id,
+                               (trace, trace.response_queued()) if trace is not None else None),
+                              self._priorities.get(message_name, Priority.NORMAL)
+                              if priority is None else priority)
+        self._outbound_bytes += len(serialized_message)
+        self._outbound_lot.unpark()
+        await trio.lowlevel.checkpoint()
+
+    async def _apply_backpressure(self, message_size: int) -> bool:
+        """
+        Apply the backpressure policy to a message that would exceed the high-water mark
+        :param message_size: Serialized size of the new message
+        :return: True if the new message should still be queued
+        """
+        if self._backpressure_policy == BackpressurePolicy.BLOCK:
+            self._blocked_sends += 1
+            while self._outbound and \
+                    self._outbound_bytes + message_size > self._outbound_high_water:
+                await self._outbound_space_lot.park()
+                if not self._is_alive:
+                    raise trio.ClosedResourceError(f'{self} is closed')
+            return True
+
+        elif self._backpressure_policy == BackpressurePolicy.DROP_OLDEST:
+            while self._outbound and \
+                    self._outbound_bytes + message_size > self._outbound_high_water:
+                # Bulk traffic is dropped before control traffic
+                _, evicted_message, _, traced_response = self._outbound.pop_lowest()
+                self._outbound_bytes -= len(evicted_message)
+                if traced_response is not None:
+                    traced_response[0].response_dropped(traced_response[1])
+                self._dropped_oldest += 1
+            return True
+
+        elif self._backpressure_policy == BackpressurePolicy.DROP_NEWEST:
+            self._dropped_newest += 1
+            return False
+
+        else:
+            log.warning('%s disconnecting slow consumer, %d outbound bytes queued', self,
+                        self._outbound_bytes)
+            self._slow_consumer_disconnect = True
+            self._close()
+            raise trio.ClosedResourceError(f'{self} disconnected as a slow consumer')
+
+    async def sender(self):
+        """
+        AIOConnection _sender
+        - Drains every queued message into one buffer and writes it with a single send_all
+        - A flush happens once a scheduling pass queues no new messages, max_flush_bytes are
+          queued, or flush_deadline has passed
+        """
         aio_wrapper = AIOMessage()
-        aio_wrapper.message_name = message.DESCRIPTOR.name
-        aio_wrapper.message = message.SerializeToString()
-        print(f'{self} sending message: {aio_wrapper}')
-        await self._connection_stream.send_all(
-            aio_wrapper.SerializeToString())
+        buffer = bytearray()
+        traced_responses = list()
+        metrics = self._metrics
+        try:
+            while True:
+                while not self._outbound:
+                    await self._outbound_lot.park()
+
+                # Let a burst coalesce while other tasks keep queueing messages,
+                #   for at most flush_deadline seconds
+                with trio.move_on_after(self._flush_deadline):
+                    queued_messages = 0
+                    while queued_messages != len(self._outbound) and \
+                            self._outbound_bytes < self._max_flush_bytes:
+                        queued_messages = len(self._outbound)
+                        await trio.sleep(0)
+
+                flushed_messages = self._messages_sent
+                while self._outbound and len(buffer) < self._max_flush_bytes:
+                    message_name, serialized_message, correlation_id, traced_response = \
+                        self._outbound.popleft()
+                    if traced_response is not None:
+                        traced_responses.append(traced_response)
+                    self._outbound_bytes -= len(serialized_message)
+                    aio_wrapper.Clear()
+                    if correlation_id:
+                        aio_wrapper.correlation_id = correlation_id
+                    message_type = self._message_types.id_of(message_name) \
+                        if self._send_message_types else NO_MESSAGE_TYPE
+                    if message_type:
+                        aio_wrapper.message_type = message_type
+                    else:
+                        aio_wrapper.message_name = message_name
+                    if message_name == PROTOCOL_NEGOTIATION:
+                        # Only messages written after the ID table may use IDs
+                        self._send_message_types = self._message_types_negotiated
+                    compressed_message = self._compressor.compress(serialized_message) \
+                        if self._compressor is not None else None
+                    if compressed_message is not None:
+                        aio_wrapper.communication_protocol = ZLIB
+                        aio_wrapper.message = compressed_message
+                    else:
+                        aio_wrapper.message = serialized_message
+                    append_frame(buffer, aio_wrapper.SerializeToString())
+                    self._messages_sent += 1
+                self._outbound_space_lot.unpark_all()
+
+                for trace, response in traced_responses:
+                    trace.response_flushed(response)
+                await self._connection_stream.send_all(buffer)
+                for trace, response in traced_responses:
+                    trace.response_sent(response)
+                traced_responses.clear()
+                self._flushes += 1
+                self._bytes_sent += len(buffer)
+                metrics.bytes_out.inc(len(buffer))
+                metrics.frames_out.inc(self._messages_sent - flushed_messages)
+                buffer.clear()
+
+        except (trio.BrokenResourceError, trio.ClosedResourceError) as e:
+            log.info('%s failed to send: %s', self, e)
+
+        finally:
+            # Responses of a buffer that was not (completely) written
+            for trace, response in traced_responses:
+                trace.response_dropped(response, RESPONSE_CLOSED)
+            self._close()
@@ -0,0 +1,199 @@
+"""
+Admission Control
+
+Protects a running Server from connection storms:
+- AdmissionControl caps the number of live connections globally and per source IP, rejecting any
+  connection above a cap before an AIOConnection (or uuid) is created for it
+- RateLimitedListener wraps a trio Listener and only accepts connections as fast as a token bucket
+  allows, leaving the rest of a thundering herd waiting in the kernel's listen backlog
+"""
+
+import ipaddress
+from collections import Counter
+from typing import Optional
+
+import trio
+
+from CommonLib.Framing import encode_frame
+from CommonLib.proto.AIOMessage_pb2 import AIOMessage
+from CommonLib.proto.Base_pb2 import Error, ErrorCode
+
+UNIX_SOCKET_PEER = 'unix'   # Source "IP" of every Unix domain socket connection
+REJECTION_TIMEOUT = 0.1     # Max seconds spent sending the SERVER_ERROR frame to a rejected peer
+
+
+async def close_quietly(connection_stream: trio.abc.Stream) -> None:
+    """ Close a stream whose peer may already be gone, never raising """
+    try:
+        await trio.aclose_forcefully(connection_stream)
+    except (trio.BrokenResourceError, trio.ClosedResourceError, OSError):
+        pass
+
+
+class TokenBucket:
+    """ Token bucket refilled at rate tokens per second, holding at most burst tokens """
+
+    def __init__(self, rate: float, burst: int):
+        """
+        :param rate: Tokens added per second
+        :param burst: Bucket capacity, the number of tokens that can be taken at once
+        """
+        self._rate: float = rate
+        self._burst: int = burst
+        self._tokens: float = burst
+        self._last_refill: Optional[float] = None
+
+    def _refill(self, now: float) -> None:
+        if self._last_refill is not None:
+            self._tokens = min(self._burst, self._tokens + (now - self._last_refill) * self._rate)
+        self._last_refill = now
+
+    def try_acquire(self) -> bool:
+        """ Take a token if one is available """
+        self._refill(trio.current_time())
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    async def acquire(self) -> None:
+        """ Take a token, waiting for the bucket to refill if necessary """
+        while not self.try_acquire():
+            await trio.sleep((1 - self._tokens) / self._rate)
+
+
+class RateLimitedListener(trio.abc.Listener):
+    """ Listener that accepts at most accept_rate connections per second """
+
+    def __init__(self, listener: trio.abc.Listener, token_bucket: TokenBucket):
+        """
+        :param listener: Listener to accept connections from
+        :param token_bucket: Bucket shared by every listener of a Server
+        """
+        self._listener: trio.abc.Listener = listener
+        self._token_bucket: TokenBucket = token_bucket
+
+    async def accept(self) -> trio.abc.Stream:
+        await self._token_bucket.acquire()
+        return await self._listener.accept()
+
+    async def aclose(self) -> None:
+        await self._listener.aclose()
+
+
+class AdmissionControl:
+    """ Global and per source IP connection caps and accept rate limit of a Server """
+
+    def __init__(self, max_connections: Optional[int] = None,
+                 max_connections_per_ip: Optional[int] = None,
+                 accept_rate: Optional[float] = None, accept_burst: int = 100,
+                 reject_with_error: bool = True):
+        """
+        :param max_connections: Max live connections (None = unlimited)
+        :param max_connections_per_ip: Max live connections from one source IP (None = unlimited)
+        :param accept_rate: Max connections accepted per second (None = unlimited)
+        :param accept_burst: Connections that may be accepted at once before accept_rate applies
+        :param reject_with_error: Send a SERVER_ERROR frame before closing a rejected connection,
+            otherwise just close it
+        """
+        self._max_connections: Optional[int] = max_connections
+        self._max_connections_per_ip: Optional[int] = max_connections_per_ip
+        self._accept_bucket: Optional[TokenBucket] = \
+            TokenBucket(accept_rate, accept_burst) if accept_rate is not None else None
+        self._rejection_frame: Optional[bytes] = \
+            self._build_rejection_frame() if reject_with_error else None
+
+        self._connections: int = 0
+        self._connections_per_ip: Counter = Counter()
+
+        # Statistics
+        self._rejected_max_connections: int = 0
+        self._rejected_max_connections_per_ip: int = 0
+
+    @property
+    def stats(self) -> dict:
+        return dict(
+            rejected_max_connections=self._rejected_max_connections,
+            rejected_max_connections_per_ip=self._rejected_max_connections_per_ip)
+
+    @staticmethod
+    def _build_rejection_frame() -> bytes:
+        """
+        Framed AIOMessage telling a client the Server is not accepting connections: an Error
+        message that is also set as the AIOMessage's error, which a Client takes as refusal
+        """
+        error = Error(error_code=ErrorCode.SERVER_ERROR,
+                      error_details='Server is not accepting connections, try again later')
+        aio_message = AIOMessage(message_name=Error.DESCRIPTOR.name,
+                                 message=error.SerializeToString())
+        # AIOMessage_pb2 imports its own Base_pb2 module, copy by value (like CommonLib.RSA)
+        aio_message.error.ParseFromString(error.SerializeToString())
+        return encode_frame(aio_message.SerializeToString())
+
+    def wrap_listeners(self, listeners: list) -> list:
+        """ Apply the accept rate limit (if any) to listeners """
+        if self._accept_bucket is None:
+            return listeners
+        return [RateLimitedListener(listener, self._accept_bucket) for listener in listeners]
+
+    @staticmethod
+    def peer_ip(connection_stream: trio.abc.Stream) -> Optional[str]:
+        """ Source IP of a connection stream, None if the peer is already gone (e.g. reset) """
+        connection_socket = getattr(connection_stream, 'socket', None)
+        if connection_socket is None or connection_socket.family == trio.socket.AF_UNIX:
+            return UNIX_SOCKET_PEER
+        try:
+            return connection_socket.getpeername()[0]
+        except OSError:
+            # ENOTCONN: the client reset the connection before it was handled
+            return None
+
+    @staticmethod
+    def is_local_peer(peer_ip: str) -> bool:
+        """ peer_ip is a Unix domain socket or loopback peer, i.e. runs on the Server's host """
+        if peer_ip == UNIX_SOCKET_PEER:
+            return True
+        try:
+            address = ipaddress.ip_address(peer_ip.split('%')[0])
+        except ValueError:
+            return False
+        # IPv4 clients of a dual-stack listener connect from IPv4-mapped IPv6 addresses
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        return address.is_loopback
+
+    def admit(self, peer_ip: str) -> bool:
+        """
+        Count a new connection from peer_ip if it is below every cap
+        :return: True if admitted, every admitted connection must be released once closed
+        """
+        if self._max_connections is not None and self._connections >= self._max_connections:
+            self._rejected_max_connections += 1
+            return False
+        if self._max_connections_per_ip is not None and \
+                self._connections_per_ip[peer_ip] >= self._max_connections_per_ip:
+            self._rejected_max_connections_per_ip += 1
+            return False
+        self._connections += 1
+        self._connections_per_ip[peer_ip] += 1
+        return True
+
+    def release(self, peer_ip: str) -> None:
+        """ Uncount a closed connection admitted from peer_ip """
+        self._connections -= 1
+        self._connections_per_ip[peer_ip] -= 1
+        if self._connections_per_ip[peer_ip] <= 0:
+            del self._connections_per_ip[peer_ip]
+
+    async def reject(self, connection_stream: trio.abc.Stream) -> None:
+        """
+        Close a rejected connection, telling the client why if configured to
+        - Clients that are already gone are closed without an error
+        """
+        if self._rejection_frame is not None:
+            with trio.move_on_after(REJECTION_TIMEOUT):
+                try:
+                    await connection_stream.send_all(self._rejection_frame)
+                except (trio.BrokenResourceError, trio.ClosedResourceError, OSError):
+                    pass
+        await close_quietly(connection_stream)
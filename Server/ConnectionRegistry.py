@@ -0,0 +1,73 @@
+"""
+Connection Registry
+
+Tracks every live AIOConnection of a Server, keyed by the integer uuid services see as
+ServiceMessageEvent.requester_uuid. Connections are removed as soon as they close, and the
+outbound statistics of closed connections are folded into running totals so nothing is lost.
+"""
+
+from collections import Counter
+from typing import Iterator, Optional
+
+from .AIOConnection import AIOConnection
+
+# Per-connection statistics that are ratios or states rather than summable counts
+_NON_SUMMABLE_STATS = {'syscalls_saved_per_message', 'compression_ratio'}
+
+
+def _summable_stats(connection: AIOConnection) -> dict:
+    """ Statistics of a connection that can be summed across connections """
+    stats = dict(connection.stats)
+    if connection.compression_stats is not None:
+        stats.update(connection.compression_stats)
+    return {name: value for name, value in stats.items() if name not in _NON_SUMMABLE_STATS}
+
+
+class ConnectionRegistry:
+    """ Registry of live AIOConnections """
+
+    def __init__(self):
+        self._connections: dict[int, AIOConnection] = dict()
+        self._total_connections: int = 0
+        self._closed_connection_stats: Counter = Counter()
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    def __iter__(self) -> Iterator[AIOConnection]:
+        return iter(self._connections.values())
+
+    def __contains__(self, requester_uuid: int) -> bool:
+        return requester_uuid in self._connections
+
+    @property
+    def live_connections(self) -> int:
+        """ Number of currently open connections """
+        return len(self._connections)
+
+    @property
+    def total_connections(self) -> int:
+        """ Number of connections ever added """
+        return self._total_connections
+
+    def add(self, requester_uuid: int, connection: AIOConnection) -> None:
+        """ Register a new connection """
+        self._connections[requester_uuid] = connection
+        self._total_connections += 1
+
+    def get(self, requester_uuid: int) -> Optional[AIOConnection]:
+        """ Live connection with requester_uuid, None if it does not exist (anymore) """
+        return self._connections.get(requester_uuid)
+
+    def remove(self, requester_uuid: int) -> None:
+        """ Remove a closed connection, keeping its statistics in the registry totals """
+        connection = self._connections.pop(requester_uuid, None)
+        if connection is not None:
+            self._closed_connection_stats.update(_summable_stats(connection))
+
+    def aggregate_stats(self) -> Counter:
+        """ Summed statistics of all live and closed connections """
+        totals = Counter(self._closed_connection_stats)
+        for connection in self._connections.values():
+            totals.update(_summable_stats(connection))
+        return totals
@@ -0,0 +1,299 @@
+"""
+Event Dispatcher
+
+Hands Server events to their handlers:
+- Messages of direct services (the default) are handled right away in the task that dispatches
+  them, usually the receiver of their AIOConnection, without a channel hop or task switch. Once
+  running, a direct handler is shielded from the cancellation of that task (e.g. its connection
+  closing) for DIRECT_HANDLER_TIMEOUT seconds at most, so it is not torn halfway through a
+  broadcast, while a hung handler cannot keep the task from being cancelled
+- Messages of queued services and all other events go to a fixed pool of shard worker tasks.
+  Events are sharded by requester_uuid, so all events of one connection are handled by the same
+  shard, while different connections are handled concurrently
+- Every shard has a lane per service Priority (see Server.Priority), events of one priority are
+  handled in order and higher priorities first, without starving lower ones. Priorities thus only
+  order queued services' messages (and disconnect events), direct messages never wait in a shard
+  behind other connections' events in the first place. The
+  ConnectionClosedEvent of a connection is only handled once all its queued events were
+- Every service may have a concurrency limit, the number of its handlers running at once across
+  all tasks. A shard waiting for a service's limit does not handle its other events meanwhile
+- Queue depth, send waits and queueing delay (totals over all shard channels) and per-service
+  handler latency are recorded for Server.stats
+Services are looked up by message type ID (see CommonLib.MessageTypes) in an array of routes,
+events that only carry a service name get its ID once when dispatched.
+"""
+
+from typing import Callable, Optional, Type
+
+import trio
+from google.protobuf.message import Message
+
+from .Priority import LaneScheduler, Priority
+from .util import ConnectionClosedEvent, ServiceMessageEvent, ServiceMessageEventPool
+from CommonLib.InstrumentedChannel import ChannelStats, InstrumentedReceiveChannel, \
+    InstrumentedSendChannel, open_instrumented_channel
+from CommonLib.Log import get_logger
+from CommonLib.MessageTypes import NO_MESSAGE_TYPE, MessageTypeTable
+from CommonLib.Metrics import Histogram
+
+DISPATCH_SHARDS = 16            # Shard worker tasks, the max number of connections handled at once
+SHARD_QUEUE_SIZE = 64           # Events queued per shard before dispatch() waits for the shard
+UNKNOWN_SERVICE = 'unknown'     # Handler stats name of events for services that do not exist
+DIRECT_HANDLER_TIMEOUT = 10.0   # Seconds a direct handler runs shielded before it is cancelled
+
+log = get_logger(__name__)
+
+
+class HandlerStats:
+    """ Call count and latency of one service's handler """
+    __slots__ = ('calls', 'errors', 'total_seconds', 'max_seconds', 'latency_us')
+
+    def __init__(self):
+        self.calls: int = 0
+        self.errors: int = 0
+        self.total_seconds: float = 0.0
+        self.max_seconds: float = 0.0
+        self.latency_us: Histogram = Histogram()
+
+    def record(self, seconds: float) -> None:
+        self.calls += 1
+        self.total_seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+        self.latency_us.record_seconds(seconds)
+
+    def as_dict(self) -> dict:
+        return dict(calls=self.calls,
+                    errors=self.errors,
+                    mean_ms=self.total_seconds / self.calls * 1000 if self.calls else 0.0,
+                    p99_ms=self.latency_us.percentile(99) / 1000,
+                    max_ms=self.max_seconds * 1000)
+
+
+class Route:
+    """ How events of one message type are dispatched """
+    __slots__ = ('name', 'queued', 'limiter', 'message_class', 'priority', 'handler_stats')
+
+    def __init__(self, name: str, queued: bool = True,
+                 limiter: Optional[trio.CapacityLimiter] = None,
+                 message_class: Optional[Type[Message]] = None,
+                 priority: Priority = Priority.NORMAL):
+        self.name: str = name
+        self.queued: bool = queued
+        self.limiter: Optional[trio.CapacityLimiter] = limiter
+        self.message_class: Optional[Type[Message]] = message_class
+        self.priority: Priority = priority
+        self.handler_stats: HandlerStats = HandlerStats()
+
+
+class Shard:
+    """ Priority lanes of one shard worker """
+    __slots__ = ('lanes', 'receivers', 'ready_lot')
+
+    def __init__(self, queue_size: int, channel_stats: ChannelStats):
+        lanes = [open_instrumented_channel(queue_size, channel_stats) for _ in Priority]
+        self.lanes: list[InstrumentedSendChannel] = [tx for tx, _ in lanes]
+        self.receivers: list[InstrumentedReceiveChannel] = [rx for _, rx in lanes]
+        # Parked shard worker waiting for events in any lane
+        self.ready_lot: trio.lowlevel.ParkingLot = trio.lowlevel.ParkingLot()
+
+
+class EventDispatcher:
+    """ Sharded pool of event handling tasks """
+
+    def __init__(self, event_handler: Callable, message_types: MessageTypeTable,
+                 shards: int = DISPATCH_SHARDS, shard_queue_size: int = SHARD_QUEUE_SIZE,
+                 event_pool: Optional[ServiceMessageEventPool] = None,
+                 error_responder: Optional[Callable] = None):
+        """
+        :param event_handler: Awaitable handling one event, exceptions it raises are printed and
+            counted as handler errors
+        :param error_responder: Awaitable answering the requester of a ServiceMessageEvent whose
+            direct handler was cancelled after DIRECT_HANDLER_TIMEOUT, given the event and a
+            trio.TooSlowError
+        :param message_types: Message type IDs of all services, shared with the Server
+        :param shards: Number of shard worker tasks
+        :param shard_queue_size: Events buffered per shard and priority
+        :param event_pool: Pool ServiceMessageEvents are released to once handled
+        """
+        self._event_handler: Callable = event_handler
+        self._error_responder: Optional[Callable] = error_responder
+        self._event_pool: Optional[ServiceMessageEventPool] = event_pool
+        self._channel_stats: ChannelStats = ChannelStats()
+        self._shards: list[Shard] = [Shard(shard_queue_size, self._channel_stats)
+                                     for _ in range(shards)]
+        # Queued events not handled yet and held back ConnectionClosedEvents by requester uuid
+        self._queued_events: dict[int, int] = dict()
+        self._deferred_closes: dict[int, ConnectionClosedEvent] = dict()
+        self._message_types: MessageTypeTable = message_types
+
+        # Routes by message type ID, NO_MESSAGE_TYPE routes messages of unknown services
+        self._routes: list[Route] = [Route(UNKNOWN_SERVICE, queued=False)]
+        self._connection_closed_route: Route = Route(ConnectionClosedEvent.__name__)
+
+        # Statistics
+        self._direct_events: int = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """ Events dispatched but not picked up by their shard yet """
+        return self._channel_stats.occupancy
+
+    @property
+    def stats(self) -> dict:
+        channel_stats = self._channel_stats.as_dict()
+        return dict(direct_events=self._direct_events,
+                    dispatched_events=channel_stats['sent'],
+                    dispatch_queue_depth=channel_stats['occupancy'],
+                    dispatch_max_queue_depth=channel_stats['high_water'],
+                    dispatch_blocked_sends=channel_stats['blocked_sends'],
+                    dispatch_send_wait_seconds=channel_stats['send_wait_seconds'],
+                    dispatch_mean_queueing_delay_ms=channel_stats['mean_queueing_delay_ms'],
+                    dispatch_max_queueing_delay_ms=channel_stats['max_queueing_delay_ms'])
+
+    @property
+    def handler_stats(self) -> dict:
+        """ Handler call count and latency by service name """
+        return {route.name: route.handler_stats.as_dict()
+                for route in self._routes + [self._connection_closed_route]}
+
+    def handler_latency_us(self, message_type: int) -> Histogram:
+        """ Handler latency histogram (in microseconds) of the service with ID message_type """
+        return self._routes[message_type].handler_stats.latency_us
+
+    def add_service(self, message_type: int, service_name: str,
+                    concurrency_limit: Optional[int] = None, queued: bool = False,
+                    message_class: Optional[Type[Message]] = None,
+                    priority: Priority = Priority.NORMAL) -> None:
+        """
+        Route messages with ID message_type, IDs must be added in order
+        :param concurrency_limit: Max handlers of service_name running at once (None = unlimited)
+        :param queued: Handle messages of service_name in the shard workers instead of directly
+        :param message_class: Message class the payloads of service_name decode into
+        :param priority: Shard lane of queued messages of service_name, direct messages are
+            handled in the order their connection received them and ignore it
+        """
+        if message_type != len(self._routes):
+            raise ValueError(f'Message type {message_type} of "{service_name}" added out of order')
+        self._routes.append(Route(service_name, queued,
+                                  trio.CapacityLimiter(concurrency_limit)
+                                  if concurrency_limit is not None else None,
+                                  message_class, priority))
+
+    async def dispatch(self, event) -> None:
+        """ Handle a direct service message now, queue any other event on its shard """
+        if isinstance(event, ServiceMessageEvent):
+            # Messages sent by name (older clients, other workers) are routed by name only once
+            if event.message_type == NO_MESSAGE_TYPE:
+                event.message_type = self._message_types.id_of(event.service_name)
+            route = self._routes[event.message_type]
+            if event.message_class is None:
+                event.message_class = route.message_class
+            if event.trace is not None:
+                event.trace.dispatched()
+            if not route.queued:
+                self._direct_events += 1
+                await self._handle(event, route, shielded=True)
+                if self._event_pool is not None:
+                    self._event_pool.release(event)
+                return
+            priority = route.priority
+            self._queued_events[event.requester_uuid] = \
+                self._queued_events.get(event.requester_uuid, 0) + 1
+        elif event.requester_uuid in self._queued_events:
+            # Handled by the shard once the connection's last queued event was
+            self._deferred_closes[event.requester_uuid] = event
+            return
+        else:
+            priority = Priority.NORMAL
+        shard = self._shards[event.requester_uuid % len(self._shards)]
+        try:
+            await shard.lanes[priority].send(event)
+        except BaseException:
+            if isinstance(event, ServiceMessageEvent):
+                self._dequeued(event.requester_uuid)
+            raise
+        shard.ready_lot.unpark()
+
+    async def run(self) -> None:
+        """ Run all shard workers """
+        async with trio.open_nursery() as nursery:
+            for shard in self._shards:
+                nursery.start_soon(self._shard_worker, shard)
+
+    def _dequeued(self, requester_uuid: int) -> Optional[ConnectionClosedEvent]:
+        """ Count a queued event as handled, returning the held back close of its connection """
+        queued_events = self._queued_events[requester_uuid] - 1
+        if queued_events:
+            self._queued_events[requester_uuid] = queued_events
+            return None
+        del self._queued_events[requester_uuid]
+        return self._deferred_closes.pop(requester_uuid, None)
+
+    async def _shard_worker(self, shard: Shard) -> None:
+        """ Handle the events of one shard, by priority """
+        scheduler = LaneScheduler()
+        receivers = shard.receivers
+        while True:
+            for lane in scheduler.order():
+                try:
+                    event = receivers[lane].receive_nowait()
+                except trio.WouldBlock:
+                    continue
+                scheduler.served(lane)
+                break
+            else:
+                await shard.ready_lot.park()
+                continue
+
+            if isinstance(event, ServiceMessageEvent):
+                await self._handle(event, self._routes[event.message_type])
+                closed_event = self._dequeued(event.requester_uuid)
+                if self._event_pool is not None:
+                    self._event_pool.release(event)
+                if closed_event is not None:
+                    await self._handle(closed_event, self._connection_closed_route)
+            else:
+                await self._handle(event, self._connection_closed_route)
+            # Let other tasks run between events, like receiving from a channel would
+            await trio.lowlevel.checkpoint()
+
+    async def _handle(self, event, route: Route, shielded: bool = False) -> None:
+        """
+        Run the event handler within the concurrency limit of the event's route
+        :param shielded: Shield the handler (not the wait for the limit) from cancellation of the
+            calling task, for DIRECT_HANDLER_TIMEOUT seconds at most
+        """
+        handler_stats = route.handler_stats
+        limiter = route.limiter
+        trace = event.trace
+        if limiter is not None:
+            await limiter.acquire()
+        if trace is not None:
+            trace.handler_started()
+        start = trio.current_time()
+        try:
+            if shielded:
+                # The dispatching connection may be closed meanwhile, which must not abort a
+                # handler halfway through (e.g. a broadcast to all other connections)
+                with trio.CancelScope(shield=True,
+                                      deadline=start + DIRECT_HANDLER_TIMEOUT) as cancel_scope:
+                    await self._event_handler(event)
+                if cancel_scope.cancelled_caught:
+                    handler_stats.errors += 1
+                    log.error('%s handler cancelled after %.1f seconds', route.name,
+                              DIRECT_HANDLER_TIMEOUT)
+                    if self._error_responder is not None:
+                        await self._error_responder(event, trio.TooSlowError(
+                            f'handler cancelled after {DIRECT_HANDLER_TIMEOUT:g} seconds'))
+            else:
+                await self._event_handler(event)
+        except Exception as e:
+            handler_stats.errors += 1
+            log.error('%s handler failed: %r', route.name, e)
+        finally:
+            handler_stats.record(trio.current_time() - start)
+            if trace is not None:
+                trace.handler_ended()
+            if limiter is not None:
+                limiter.release()
@@ -0,0 +1,183 @@
+"""
+Offload
+
+Runs CPU-heavy service handlers off the trio event loop, so they do not stall I/O of every other
+connection. A service chooses how its handler runs when it registers (see Server.register_service):
+- Offload.THREAD: in a worker thread through trio.to_thread.run_sync, the handler receives the
+  decoded message (GIL-releasing work like zlib or hashlib scales, pure Python work does not)
+- Offload.PROCESS: in a process pool, the handler receives the message decoded in the pool process
+  from its serialized protobuf bytes, so it must be a module level function of a module that
+  imports the message class
+Offloaded handlers are plain functions returning a response message (or None), which is serialized
+off the event loop and sent through the event's response_callback.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from enum import IntEnum
+from time import perf_counter
+from typing import Callable, Optional, Tuple, Type
+
+import trio
+from google.protobuf import symbol_database
+from google.protobuf.message import Message
+
+from .util import SerializedMessage, ServiceMessageEvent
+
+THREAD_POOL_SIZE = 8        # Offloaded handlers running in threads at once
+PROCESS_POOL_SIZE = None    # Pool processes, None = one per CPU core
+
+
+class Offload(IntEnum):
+    """ Where a service handler runs """
+    NONE = 0        # Awaited on the event loop
+    THREAD = 1      # Called in a worker thread
+    PROCESS = 2     # Called in a process pool
+
+
+class OffloadStats:
+    """ Usage statistics of one offload pool """
+    __slots__ = ('jobs', 'in_flight', 'saturated', 'wait_seconds', 'max_wait_seconds',
+                 'run_seconds')
+
+    def __init__(self):
+        self.jobs: int = 0
+        self.in_flight: int = 0
+        self.saturated: int = 0
+        self.wait_seconds: float = 0.0
+        self.max_wait_seconds: float = 0.0
+        self.run_seconds: float = 0.0
+
+    def record_wait(self, wait_seconds: float) -> None:
+        self.wait_seconds += wait_seconds
+        if wait_seconds > self.max_wait_seconds:
+            self.max_wait_seconds = wait_seconds
+
+    def as_dict(self, pool_name: str) -> dict:
+        return {f'offload_{pool_name}_jobs': self.jobs,
+                f'offload_{pool_name}_in_flight': self.in_flight,
+                f'offload_{pool_name}_saturated': self.saturated,
+                f'offload_{pool_name}_mean_wait_ms':
+                    self.wait_seconds / self.jobs * 1000 if self.jobs else 0.0,
+                f'offload_{pool_name}_max_wait_ms': self.max_wait_seconds * 1000,
+                f'offload_{pool_name}_mean_run_ms':
+                    self.run_seconds / self.jobs * 1000 if self.jobs else 0.0}
+
+
+def _run_in_process(handler: Callable, message_full_name: Optional[str],
+                    payload: bytes) -> Optional[Tuple[str, bytes]]:
+    """
+    Pool process side of Offload.PROCESS: decode, handle and serialize the response
+    - Generated message classes cannot be pickled (their __module__ is not the module they are
+      imported from), they are looked up by name once unpickling handler imported them
+    """
+    message = symbol_database.Default().GetSymbol(message_full_name).FromString(payload) \
+        if message_full_name is not None else payload
+    response = handler(message)
+    return (response.DESCRIPTOR.name, response.SerializeToString()) \
+        if response is not None else None
+
+
+class OffloadPools:
+    """ Thread and process pools offloaded service handlers run in """
+
+    def __init__(self, thread_pool_size: int = THREAD_POOL_SIZE,
+                 process_pool_size: Optional[int] = PROCESS_POOL_SIZE):
+        """
+        :param thread_pool_size: Offload.THREAD handlers running at once
+        :param process_pool_size: Processes of the Offload.PROCESS pool (None = one per CPU core),
+            the pool is only started once a handler is offloaded to it
+        """
+        self._thread_limiter: trio.CapacityLimiter = trio.CapacityLimiter(thread_pool_size)
+        self._process_pool_size: int = process_pool_size or multiprocessing.cpu_count()
+        # Threads waiting on process pool results, one per pool process keeps the pool busy
+        self._process_limiter: trio.CapacityLimiter = \
+            trio.CapacityLimiter(self._process_pool_size)
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._thread_stats: OffloadStats = OffloadStats()
+        self._process_stats: OffloadStats = OffloadStats()
+
+    @property
+    def stats(self) -> dict:
+        return dict(**self._thread_stats.as_dict('thread'),
+                    **self._process_stats.as_dict('process'))
+
+    def wrap(self, handler: Callable, offload: Offload,
+             message_class: Optional[Type[Message]] = None) -> Callable:
+        """
+        Awaitable service handler running handler as offload requires
+        :param handler: Function receiving the message (decoded into message_class if given) and
+            returning the response message, or None to not respond
+        :param message_class: Message class messages are decoded into before calling handler
+        """
+        if offload == Offload.THREAD:
+            async def handle_in_thread(event: ServiceMessageEvent):
+                await self._respond(event, await self._run(
+                    self._thread_limiter, self._thread_stats,
+                    lambda: self._call(handler, event)))
+            return handle_in_thread
+        elif offload == Offload.PROCESS:
+            message_full_name = message_class.DESCRIPTOR.full_name \
+                if message_class is not None else None
+
+            async def handle_in_process(event: ServiceMessageEvent):
+                # Pickled to the pool process as bytes, a memoryview cannot be pickled
+                payload = bytes(event.payload)
+                process_pool = self._start_process_pool()
+                response = await self._run(
+                    self._process_limiter, self._process_stats,
+                    lambda: process_pool.submit(_run_in_process, handler, message_full_name,
+                                                payload).result())
+                await self._respond(event, SerializedMessage(*response)
+                                    if response is not None else None)
+            return handle_in_process
+        raise ValueError(f'Handlers offloaded with {offload!r} cannot be wrapped')
+
+    def shutdown(self) -> None:
+        """ Stop the process pool, if started """
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+
+    def _start_process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            # Forking a process with running trio threads is unsafe, start clean interpreters
+            self._process_pool = ProcessPoolExecutor(
+                self._process_pool_size, mp_context=multiprocessing.get_context('spawn'))
+        return self._process_pool
+
+    @staticmethod
+    def _call(handler: Callable, event: ServiceMessageEvent) -> Optional[SerializedMessage]:
+        """ Thread side of Offload.THREAD: decode, handle and serialize the response """
+        response = handler(event.message)
+        return SerializedMessage.from_message(response) if response is not None else None
+
+    @staticmethod
+    async def _run(limiter: trio.CapacityLimiter, stats: OffloadStats, job: Callable):
+        """ Run job in a thread of limiter, recording how long it waited for one """
+        if limiter.available_tokens == 0:
+            stats.saturated += 1
+        submitted = perf_counter()
+        started = None
+
+        def timed_job():
+            nonlocal started
+            started = perf_counter()
+            return job()
+
+        stats.jobs += 1
+        stats.in_flight += 1
+        try:
+            return await trio.to_thread.run_sync(timed_job, limiter=limiter)
+        finally:
+            stats.in_flight -= 1
+            finished = perf_counter()
+            if started is not None:
+                stats.record_wait(started - submitted)
+                stats.run_seconds += finished - started
+
+    @staticmethod
+    async def _respond(event: ServiceMessageEvent, response: Optional[SerializedMessage]):
+        """ Send response back to the requester, relayed events have nobody to respond to """
+        if response is not None and event.response_callback is not None:
+            await event.response_callback(response)
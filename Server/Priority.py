@@ -0,0 +1,105 @@
+"""
+Priority
+
+Priority lanes let control traffic (authentication, heartbeats, protocol negotiation) overtake bulk
+traffic (chat floods) both in the EventDispatcher shards and in every AIOConnection's outbound
+queue. Lanes are served in priority order, except that every lane only gets PRIORITY_WEIGHTS of
+its items served in a row while lower lanes are waiting: once the busy higher lanes used up their
+share, the lower lanes get theirs, so bulk traffic is slowed down but never starved.
+"""
+
+from collections import deque
+from enum import IntEnum
+from typing import Generic, Iterator, Sequence, Tuple, TypeVar
+
+T = TypeVar('T')
+
+
+class Priority(IntEnum):
+    """ Priority class of a service's messages, lower values are served first """
+    HIGH = 0        # Control traffic, e.g. authentication
+    NORMAL = 1      # Default for every service
+    LOW = 2         # Bulk traffic that may wait
+
+
+# Items of each priority served per round while lower priorities are waiting
+PRIORITY_WEIGHTS = {Priority.HIGH: 16, Priority.NORMAL: 4, Priority.LOW: 1}
+
+
+class LaneScheduler:
+    """ Weighted round robin over priority lanes, in strict priority order within a round """
+    __slots__ = ('_weights', '_credits')
+
+    def __init__(self, weights: Sequence[int] = tuple(PRIORITY_WEIGHTS.values())):
+        """
+        :param weights: Items served per round of every lane, by priority
+        """
+        self._weights: Tuple[int, ...] = tuple(weights)
+        self._credits: list[int] = list(weights)
+
+    def order(self) -> Iterator[int]:
+        """ Lanes in the order they should be tried, lanes with credits left first """
+        credits = self._credits
+        for lane, lane_credits in enumerate(credits):
+            if lane_credits:
+                yield lane
+        for lane, lane_credits in enumerate(credits):
+            if not lane_credits:
+                yield lane
+
+    def served(self, lane: int) -> None:
+        """ Record that an item of lane was served """
+        if not self._credits[lane]:
+            # Every waiting lane used its share, start the next round
+            self._credits = list(self._weights)
+        self._credits[lane] -= 1
+
+
+class PriorityDeque(Generic[T]):
+    """ Deques by priority, popped in LaneScheduler order """
+    __slots__ = ('_lanes', '_scheduler', '_length')
+
+    def __init__(self):
+        self._lanes: Tuple[deque, ...] = tuple(deque() for _ in Priority)
+        self._scheduler: LaneScheduler = LaneScheduler()
+        self._length: int = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[T]:
+        """ Every queued item, by priority (not in serving order) """
+        for lane in self._lanes:
+            yield from lane
+
+    @property
+    def lane_lengths(self) -> dict:
+        """ Queued items by priority name """
+        return {priority.name.lower(): len(lane) for priority, lane in zip(Priority, self._lanes)}
+
+    def clear(self) -> None:
+        for lane in self._lanes:
+            lane.clear()
+        self._length = 0
+
+    def append(self, item: T, priority: Priority = Priority.NORMAL) -> None:
+        self._lanes[priority].append(item)
+        self._length += 1
+
+    def popleft(self) -> T:
+        """ Next item to serve """
+        lanes = self._lanes
+        for lane in self._scheduler.order():
+            if lanes[lane]:
+                self._scheduler.served(lane)
+                self._length -= 1
+                return lanes[lane].popleft()
+        raise IndexError('pop from an empty PriorityDeque')
+
+    def pop_lowest(self) -> T:
+        """ Oldest item of the lowest priority, the first to go when dropping items """
+        for lane in reversed(self._lanes):
+            if lane:
+                self._length -= 1
+                return lane.popleft()
+        raise IndexError('pop from an empty PriorityDeque')
@@ -0,0 +1,137 @@
+"""
+Profiler
+
+Statistical sampling profiler of a running Server, started and stopped at runtime through the
+ProfilerService (admin connections only, see Server.register_service). While a profile runs, a
+sampler thread takes the stack of every other thread of the process (the trio event loop thread
+running the service handlers, Offload.THREAD pool threads, the logging sink, ...) sample_rate times
+per second through sys._current_frames() and counts identical stacks. Once stopped, it writes the
+counts as collapsed stacks, one "thread;outermost;...;innermost count" line per distinct stack,
+which flamegraph.pl, inferno and speedscope read as is.
+Nothing is hooked into the interpreter or the event loop: a stopped profiler costs nothing, a
+running one only takes the GIL away from the event loop for one stack walk per sample.
+The sampler needs the GIL to take a sample, so a thread is sampled where it releases the GIL (a
+blocking call, or every sys.getswitchinterval(), 5 ms by default, while computing): stacks that hold
+the GIL for less than the switch interval are attributed to the thread's next release point.
+Offload.PROCESS handlers run in other processes and are not sampled.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from time import perf_counter
+from typing import Optional
+
+from CommonLib.Log import get_logger
+
+PROFILE_SAMPLE_RATE = 100       # Stack samples per second
+MAX_PROFILE_SAMPLE_RATE = 1000
+PROFILE_DURATION = 60           # Seconds a profile runs unless stopped earlier
+MAX_PROFILE_DURATION = 3600
+PROFILE_DIRECTORY = '.'         # Directory collapsed stacks files are written to
+
+log = get_logger(__name__)
+
+
+class Profiler:
+    """ Sampling profiler of every thread of this process, one profile at a time """
+
+    def __init__(self, directory: str = PROFILE_DIRECTORY):
+        """
+        :param directory: Directory collapsed stacks files are written to, one per profile
+        """
+        self._directory: str = directory
+        self._sampler: Optional[threading.Thread] = None
+        self._stopped: threading.Event = threading.Event()
+        self._stacks: Counter = Counter()
+        # Frame labels by code object, so every function is formatted once per profile
+        self._labels: dict = dict()
+        self.samples: int = 0
+        self.path: str = ''
+
+    @property
+    def running(self) -> bool:
+        return self._sampler is not None and self._sampler.is_alive()
+
+    def start(self, sample_rate: int = PROFILE_SAMPLE_RATE,
+              duration: float = PROFILE_DURATION) -> str:
+        """
+        Start sampling every thread sample_rate times per second, for duration seconds at most
+        :return: Collapsed stacks file written once the profile stops
+        """
+        if self.running:
+            raise RuntimeError(f'Profile to {self.path} already running')
+        if not 0 < sample_rate <= MAX_PROFILE_SAMPLE_RATE:
+            raise ValueError(f'Sample rate must be 1 to {MAX_PROFILE_SAMPLE_RATE} per second')
+        if not 0 < duration <= MAX_PROFILE_DURATION:
+            raise ValueError(f'Duration must be 1 to {MAX_PROFILE_DURATION} seconds')
+        self._stopped.clear()
+        self._stacks = Counter()
+        self._labels = dict()
+        self.samples = 0
+        self.path = os.path.join(
+            os.path.abspath(self._directory),
+            f'aioserver-profile-{os.getpid()}-{time.strftime("%Y%m%d-%H%M%S")}.collapsed')
+        self._sampler = threading.Thread(target=self._sample, args=(sample_rate, duration),
+                                         name='Profiler', daemon=True)
+        self._sampler.start()
+        log.info('Profiling at %d samples per second for up to %g seconds to %s', sample_rate,
+                 duration, self.path)
+        return self.path
+
+    def stop(self) -> None:
+        """ Stop sampling and wait until the collapsed stacks are written (blocking) """
+        if self._sampler is not None:
+            self._stopped.set()
+            self._sampler.join()
+
+    def _sample(self, sample_rate: int, duration: float) -> None:
+        """ Sampler thread: sample until stopped or duration is over, then write the profile """
+        own_thread_id = threading.get_ident()
+        interval = 1 / sample_rate
+        next_sample = perf_counter()
+        end = next_sample + duration
+        while not self._stopped.wait(max(0.0, next_sample - perf_counter())):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            frames = sys._current_frames()
+            for thread_id, frame in frames.items():
+                if thread_id != own_thread_id:
+                    self._stacks[self._collapse(thread_names.get(thread_id, thread_id), frame)] += 1
+            # Sampled frames (and their locals) are not kept alive until the next sample
+            frames = frame = None
+            self.samples += 1
+            now = perf_counter()
+            if now >= end:
+                break
+            # Skip samples missed while this thread was not scheduled instead of catching up
+            next_sample = max(next_sample + interval, now)
+        self._write()
+
+    def _collapse(self, thread_name: str, frame) -> str:
+        """ thread_name;outermost;...;innermost frame label of the stack ending with frame """
+        labels = list()
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = f'{code.co_name} ({os.path.basename(code.co_filename)}:' \
+                        f'{code.co_firstlineno})'
+                # ';' separates the frames of a collapsed stack
+                label = self._labels[code] = label.replace(';', ':')
+            labels.append(label)
+            frame = frame.f_back
+        labels.append(str(thread_name).replace(';', ':'))
+        return ';'.join(reversed(labels))
+
+    def _write(self) -> None:
+        try:
+            with open(self.path, 'w') as profile_file:
+                profile_file.writelines(f'{stack} {count}\n'
+                                        for stack, count in self._stacks.most_common())
+        except OSError as e:
+            log.error('Could not write profile to %s: %s', self.path, e)
+            return
+        log.info('Profile of %d samples (%d distinct stacks) written to %s', self.samples,
+                 len(self._stacks), self.path)
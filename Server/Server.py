@@ -10,51 +10,281 @@ Responsibilities:
     - Routing point for client connections and services
 """
 
-from uuid import uuid1, UUID
+import errno
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import stat
+import sys
+import tempfile
+from argparse import ArgumentParser
+from typing import Optional, Type
+from uuid import uuid1
 
 import trio
+from google.protobuf.message import Message
 
-from .AIOConnection import AIOConnection
-from .util import ServiceMessageEvent
+from .AIOConnection import AIOConnection, OUTBOUND_HIGH_WATER, BACKPRESSURE_POLICY
+from .AdmissionControl import AdmissionControl, UNIX_SOCKET_PEER, close_quietly
+from .ConnectionRegistry import ConnectionRegistry
+from .Dispatcher import DISPATCH_SHARDS, SHARD_QUEUE_SIZE, EventDispatcher
+from .TimerWheel import TimerWheel
+from .Tracing import TRACE_PATH, TRACE_SAMPLE_RATE, Tracer
+from .WorkerBus import WorkerBusClient, WorkerBusHub
+from .Offload import Offload, OffloadPools, PROCESS_POOL_SIZE, THREAD_POOL_SIZE
+from .Priority import Priority
+from .util import BackpressurePolicy, ConnectionClosedEvent, EVENT_POOL_SIZE, ResponseCallback, \
+    ServiceMessageEvent, ServiceMessageEventPool
+from CommonLib.Compression import DEFAULT_COMPRESSION_THRESHOLD
+from CommonLib.Framing import DEFAULT_MAX_FRAME_SIZE
+from CommonLib.Heartbeat import DEFAULT_IDLE_TIMEOUT
+from CommonLib.Log import DEFAULT_LOG_LEVEL, LOG_LEVELS, configure_logging, get_logger
+from CommonLib.LoopMonitor import LoopMonitor
+from CommonLib.MessageTypes import MessageTypeTable
+from CommonLib.Metrics import METRICS_HOST, ConnectionMetrics, MetricsRegistry, serve_metrics
+from CommonLib.SocketTuning import SocketTuning
+from CommonLib.proto.Base_pb2 import Error, ErrorCode
 
 HOST = '0.0.0.0'
 PORT = 8888
+IDLE_TIMER_TICK = 1.0   # Resolution (in seconds) of the idle timeout timer wheel
+WORKER_STOP_TIMEOUT = 5.0   # Seconds stopped workers get to exit before they are killed
 
+log = get_logger(__name__)
 
-class Server:
-    """ Define member variables """
-    tx_event_channel: trio.abc.SendChannel
-    rx_event_channel: trio.abc.ReceiveChannel
 
-    def __init__(self):
-        """ Server initializer """
+class Server:
+    def __init__(self, host: str = HOST, port: int = PORT,
+                 socket_tuning: Optional[SocketTuning] = None,
+                 max_frame_size: int = DEFAULT_MAX_FRAME_SIZE,
+                 outbound_high_water: int = OUTBOUND_HIGH_WATER,
+                 backpressure_policy: BackpressurePolicy = BACKPRESSURE_POLICY,
+                 compression: bool = False,
+                 compression_threshold: int = DEFAULT_COMPRESSION_THRESHOLD,
+                 reuse_port: bool = False,
+                 worker_bus_path: Optional[str] = None,
+                 unix_socket_path: Optional[str] = None,
+                 idle_timeout: Optional[float] = DEFAULT_IDLE_TIMEOUT,
+                 admission_control: Optional[AdmissionControl] = None,
+                 dispatch_shards: int = DISPATCH_SHARDS,
+                 dispatch_queue_size: int = SHARD_QUEUE_SIZE,
+                 event_pool_size: int = EVENT_POOL_SIZE,
+                 thread_pool_size: int = THREAD_POOL_SIZE,
+                 process_pool_size: Optional[int] = PROCESS_POOL_SIZE,
+                 metrics_port: Optional[int] = None,
+                 trace_sample_rate: int = TRACE_SAMPLE_RATE,
+                 trace_path: str = TRACE_PATH,
+                 long_step_threshold: Optional[float] = None):
+        """
+        Server initializer
+        :param host: Address the TCP listeners bind to
+        :param port: Port the TCP listeners bind to
+        :param socket_tuning: TCP socket options of the listeners and accepted connections
+        :param max_frame_size: Largest AIOMessage (in bytes) accepted from any connection
+        :param outbound_high_water: Queued outbound bytes per connection before backpressure
+        :param backpressure_policy: How connections treat clients that cannot keep up
+        :param compression: Allow clients to negotiate zlib compression
+        :param compression_threshold: Smallest outbound message (in bytes) that gets compressed
+        :param reuse_port: Bind listener with SO_REUSEPORT so several worker processes share PORT
+        :param worker_bus_path: WorkerBusHub socket to relay messages of relayed services through
+        :param unix_socket_path: Also accept co-located clients on this Unix domain socket
+        :param idle_timeout: Seconds without received data before a connection is reaped
+            (None disables reaping)
+        :param admission_control: Connection caps and accept rate limit (default: unlimited)
+        :param dispatch_shards: Event handling tasks, events are sharded by connection
+        :param dispatch_queue_size: Events buffered per dispatch shard before connections wait
+        :param event_pool_size: Handled ServiceMessageEvents kept for reuse (0 = no pooling)
+        :param thread_pool_size: Handlers offloaded with Offload.THREAD running at once
+        :param process_pool_size: Processes running handlers offloaded with Offload.PROCESS
+            (None = one per CPU core)
+        :param metrics_port: Serve text snapshots of metrics on this localhost port (None = off)
+        :param trace_sample_rate: Trace 1 in every trace_sample_rate received service messages
+            through the Server (0 = tracing off, see Server.Tracing)
+        :param trace_path: Rotating Chrome trace file traces are written to
+        :param long_step_threshold: Monitor the event loop, reporting task steps that run for this
+            many seconds or longer (None = off, see CommonLib.LoopMonitor)
+        """
         self._is_alive = False
-        self._connections: dict[UUID.hex, AIOConnection] = dict()
-        self._service_map: dict[str, trio.lowlevel.wait_writable] = dict()
+        self._host: str = host
+        self._port: int = port
+        self._socket_tuning: SocketTuning = \
+            socket_tuning if socket_tuning is not None else SocketTuning()
+        self._max_frame_size: int = max_frame_size
+        self._outbound_high_water: int = outbound_high_water
+        self._backpressure_policy: BackpressurePolicy = backpressure_policy
+        self._compression: bool = compression
+        self._compression_threshold: int = compression_threshold
+        self._reuse_port: bool = reuse_port
+        self._unix_socket_path: Optional[str] = unix_socket_path
+        # The socket file at unix_socket_path was created by this Server (and is removed by it)
+        self._unix_socket_bound: bool = False
+        self._worker_bus: Optional[WorkerBusClient] = \
+            WorkerBusClient(worker_bus_path) if worker_bus_path is not None else None
+        self._connections: ConnectionRegistry = ConnectionRegistry()
+        self._admission_control: AdmissionControl = \
+            admission_control if admission_control is not None else AdmissionControl()
+        # Service handlers by message type ID, index 0 (no message type) has no handler
+        self._message_types: MessageTypeTable = MessageTypeTable()
+        self._service_handlers: list[Optional[trio.lowlevel.wait_writable]] = [None]
+        self._event_pool: ServiceMessageEventPool = ServiceMessageEventPool(event_pool_size)
+        self._dispatcher: EventDispatcher = EventDispatcher(
+            self._handle_event, self._message_types, dispatch_shards, dispatch_queue_size,
+            self._event_pool, self._respond_error)
+        self._offload_pools: OffloadPools = OffloadPools(thread_pool_size, process_pool_size)
+        # Outbound priority of service messages by message name
+        self._message_priorities: dict[str, Priority] = dict()
+        self._relayed_services: set[str] = set()
+        # Connections from the Server's own host (loopback or Unix domain socket) admin services
+        #   accept messages from
+        self._admin_connections: set[int] = set()
+        self._disconnect_handlers: list[trio.lowlevel.wait_writable] = list()
+
+        # Metrics, Server.stats and per service call counts are included in every snapshot
+        self._metrics: MetricsRegistry = MetricsRegistry()
+        self._metrics.add_collector(lambda: self.stats)
+        self._metrics.add_collector(self._service_call_counts)
+        self._connection_metrics: ConnectionMetrics = ConnectionMetrics(self._metrics)
+        self._metrics_port: Optional[int] = metrics_port
+        self._tracer: Optional[Tracer] = Tracer(trace_sample_rate, trace_path) \
+            if trace_sample_rate > 0 else None
+        self._loop_monitor: Optional[LoopMonitor] = \
+            LoopMonitor(long_step_threshold, self._metrics) if long_step_threshold is not None \
+            else None
+
+        # Idle connection reaping, one timer wheel entry per connection
+        self._idle_timeout: Optional[float] = idle_timeout
+        self._idle_timers: Optional[TimerWheel] = None
+        self._idle_timer_expirations: int = 0
+        self._idle_connections_reaped: int = 0
         self.services: list[object] = list()
 
     @property
     def is_alive(self):
         return self._is_alive
 
+    @property
+    def stats(self) -> dict:
+        """ Connection counts and aggregated outbound statistics of all connections """
+        totals = self._connections.aggregate_stats()
+        return dict(
+            live_connections=self._connections.live_connections,
+            total_connections=self._connections.total_connections,
+            messages_sent=totals['messages_sent'],
+            bytes_sent=totals['bytes_sent'],
+            flushes=totals['flushes'],
+            syscalls_saved_per_message=(1 - totals['flushes'] / totals['messages_sent'])
+            if totals['messages_sent'] else 0.0,
+            dropped_messages=totals['dropped_oldest'] + totals['dropped_newest'],
+            slow_consumer_disconnects=totals['slow_consumer_disconnect'],
+            compression_ratio=(totals['uncompressed_bytes'] / totals['compressed_bytes'])
+            if totals['compressed_bytes'] else 0.0,
+            compression_cpu_seconds=totals['compress_cpu_seconds'] +
+            totals['decompress_cpu_seconds'],
+            heartbeats_received=totals['heartbeats_received'],
+            idle_timer_expirations=self._idle_timer_expirations,
+            idle_connections_reaped=self._idle_connections_reaped,
+            **self._admission_control.stats,
+            **self._dispatcher.stats,
+            **self._event_pool.stats,
+            **self._offload_pools.stats)
+
+    @property
+    def handler_stats(self) -> dict:
+        """ Handler call count and latency by service name """
+        return self._dispatcher.handler_stats
+
+    @property
+    def metrics(self) -> MetricsRegistry:
+        """ Registry of all metrics, snapshot() returns their current values """
+        return self._metrics
+
+    def _service_call_counts(self) -> dict:
+        counts = dict()
+        for service_name, handler_stats in self._dispatcher.handler_stats.items():
+            counts[f'service_{service_name}_calls'] = handler_stats['calls']
+            counts[f'service_{service_name}_errors'] = handler_stats['errors']
+        return counts
+
     def register_service(self, service_name: str,
-                         service_callable: trio.lowlevel.wait_writable) -> None:
+                         service_callable: trio.lowlevel.wait_writable,
+                         relay: bool = False,
+                         on_disconnect: Optional[trio.lowlevel.wait_writable] = None,
+                         concurrency_limit: Optional[int] = None,
+                         queued: bool = False,
+                         message_class: Optional[Type[Message]] = None,
+                         offload: Offload = Offload.NONE,
+                         priority: Priority = Priority.NORMAL,
+                         admin: bool = False) -> None:
         """
         Register a service in Server
         :param service_name:
         :param service_callable:
+        :param relay: Also deliver this service's messages to the service in all other workers
+            (relayed events are flagged with ServiceMessageEvent.relayed, no response_callback)
+        :param on_disconnect: Awaitable callback receiving the ConnectionClosedEvent of every
+            closed connection, used to drop subscribers
+        :param concurrency_limit: Max handlers of this service running at once (None = unlimited),
+            messages of one connection are always handled one at a time and in order
+        :param queued: Hand messages to the dispatcher's shard workers instead of handling them
+            directly in the receiving connection's task, so a slow handler does not hold up
+            reading from that connection. Direct handlers are cancelled after
+            Dispatcher.DIRECT_HANDLER_TIMEOUT seconds, queue services with longer handlers
+        :param message_class: Message class ServiceMessageEvent.message is lazily decoded into
+            (None = handlers get the raw payload)
+        :param offload: Run service_callable, a plain function taking the message and returning
+            the response message (or None), in a thread or process pool instead of on the event
+            loop, see Server.Offload
+        :param priority: Priority of messages named service_name in every connection's outbound
+            queue, e.g. HIGH for control traffic that must not wait behind bulk traffic. In the
+            dispatcher shards it only orders the messages of queued services, direct services
+            (the default) are handled by their own connection's task and ignore it
+        :param admin: Only handle messages of connections from the Server's own host (loopback or
+            Unix domain socket), others are answered with a SECURITY_ERROR Error, e.g. for
+            services that control the Server itself (never relay admin services)
         """
-        if service_name in self._service_map.keys():
+        if self._message_types.id_of(service_name):
             raise (NameError, f'Conflicting service "{service_name}" already registered!')
         else:
-            self._service_map[service_name] = service_callable
+            message_type = self._message_types.register(service_name)
+            if offload != Offload.NONE:
+                service_callable = self._offload_pools.wrap(service_callable, offload,
+                                                            message_class)
+            if admin:
+                service_callable = self._admin_only(service_name, service_callable)
+            self._service_handlers.append(service_callable)
+            self._message_priorities[service_name] = priority
+            if relay:
+                self._relayed_services.add(service_name)
+            if on_disconnect is not None:
+                self._disconnect_handlers.append(on_disconnect)
+            self._dispatcher.add_service(message_type, service_name, concurrency_limit, queued,
+                                         message_class, priority)
+            self._metrics.histogram(f'service_{service_name}_latency_us',
+                                    self._dispatcher.handler_latency_us(message_type))
+
+    def _admin_only(self, service_name: str,
+                    service_callable: trio.lowlevel.wait_writable) -> trio.lowlevel.wait_writable:
+        """ Handler calling service_callable for events of admin connections only """
+        async def admin_service(event: ServiceMessageEvent):
+            if event.requester_uuid in self._admin_connections:
+                await service_callable(event)
+                return
+            log.warning('Refused %s message of non-admin connection %032x', service_name,
+                        event.requester_uuid)
+            if event.response_callback is not None:
+                await event.response_callback(
+                    Error(error_code=ErrorCode.SECURITY_ERROR,
+                          error_details=f'{service_name} only accepts local connections'))
+        return admin_service
 
     def _start_all_services(self):
         """ Start all Services in the services folder """
-        print(f'Starting all services...')
+        log.info('Starting all services...')
         server_module = __import__('Server.services')
         all_service_files = server_module.__dict__['services'].__dict__['__all__']
-        print(f'All service files: {all_service_files}')
+        log.debug('All service files: %s', all_service_files)
         for service_file in all_service_files:
             service_module = __import__(f'Server.services.{service_file}')
             # All service objects must be named identically to the file that they are saved under
@@ -63,35 +293,143 @@ class Server:
             # All service classes must be initialize themselves with register callback
             #   in order to map Message object names to Service object handlers
             self.services.append(service_class(self.register_service))
-        [print(f'Added {_} to server services list') for _ in self.services]
+        log.info('Started services: %s',
+                 ', '.join(type(service).__name__ for service in self.services))
 
     async def _handle_new_connection(self, connection_stream):
         """ Handle new connection """
-        print('Server received new connection!')
+        # Reject connections above the admission caps before allocating anything for them
+        peer_ip = self._admission_control.peer_ip(connection_stream)
+        if peer_ip is None:
+            # Reset before it was handled, an error here would stop serve_listeners (the Server)
+            log.debug('Server dropped connection reset before it was handled')
+            await close_quietly(connection_stream)
+            return
+        if not self._admission_control.admit(peer_ip):
+            await self._admission_control.reject(connection_stream)
+            return
+        try:
+            if peer_ip != UNIX_SOCKET_PEER:
+                self._socket_tuning.tune_accepted_stream(connection_stream)
+        except OSError as e:
+            log.debug('Server dropped connection from %s gone before it was tuned: %s', peer_ip, e)
+            self._admission_control.release(peer_ip)
+            await close_quietly(connection_stream)
+            return
+        try:
+            await self._serve_connection(connection_stream,
+                                         self._admission_control.is_local_peer(peer_ip))
+        finally:
+            self._admission_control.release(peer_ip)
+
+    async def _serve_connection(self, connection_stream, admin: bool = False):
+        """
+        Run an admitted connection until it closes
+        :param admin: Connection may use admin services
+        """
+        log.debug('Server received new connection')
 
         # Create unique uuid for new AIOConnection
         uuid = uuid1()
-        self._connections[uuid.hex] = \
-            AIOConnection(uuid, connection_stream, self.tx_event_channel.send)
+        connection = \
+            AIOConnection(uuid, connection_stream, self._dispatcher.dispatch,
+                          max_frame_size=self._max_frame_size,
+                          outbound_high_water=self._outbound_high_water,
+                          backpressure_policy=self._backpressure_policy,
+                          compression=self._compression,
+                          compression_threshold=self._compression_threshold,
+                          message_types=self._message_types,
+                          event_pool=self._event_pool,
+                          priorities=self._message_priorities,
+                          metrics=self._connection_metrics,
+                          tracer=self._tracer)
 
-        # Add AIOConnection main runner to nursery
-        async with trio.open_nursery() as nursery:
-            nursery.start_soon(self._connections[uuid.hex].receiver)
+        self._connections.add(uuid.int, connection)
+        if admin:
+            self._admin_connections.add(uuid.int)
+        if self._idle_timers is not None:
+            self._idle_timers.schedule(uuid.int, trio.current_time() + self._idle_timeout)
+
+        # Run AIOConnection _receiver and _sender until the connection closes
+        try:
+            await connection.run()
+        finally:
+            self._connections.remove(uuid.int)
+            self._admin_connections.discard(uuid.int)
+            if self._idle_timers is not None:
+                self._idle_timers.cancel(uuid.int)
+            await self._dispatcher.dispatch(ConnectionClosedEvent(uuid.int))
+
+    async def _worker_bus_receiver(self, cancel_scope: trio.CancelScope):
+        """ Receive relayed messages, a worker whose launcher (and WorkerBusHub) is gone stops """
+        await self._worker_bus.receiver(self._dispatcher.dispatch, self._event_pool)
+        log.warning('Worker bus closed, stopping worker Server')
+        cancel_scope.cancel()
 
-    async def _event_processor(self):
-        """ Server event processor """
-        async for event in self.rx_event_channel:
-            if isinstance(event, ServiceMessageEvent):
-                print(f'Server got ServiceMessageEvent!\n{event}')
+    async def _idle_connection_reaper(self):
+        """
+        Close connections that have not received any data for idle_timeout seconds
+        - Timers are not moved on every received frame, an expired timer is rescheduled instead
+          if its connection was active since the timer was set
+        """
+        while True:
+            await trio.sleep(IDLE_TIMER_TICK)
+            now = trio.current_time()
+            for requester_uuid in self._idle_timers.advance(now):
+                self._idle_timer_expirations += 1
+                connection = self._connections.get(requester_uuid)
+                if connection is None:
+                    continue
+                idle_deadline = connection.last_activity + self._idle_timeout
+                if idle_deadline > now:
+                    self._idle_timers.schedule(requester_uuid, idle_deadline)
+                else:
+                    self._idle_connections_reaped += 1
+                    connection.close(f'idle for {now - connection.last_activity:.1f} seconds')
+
+    async def _handle_event(self, event):
+        """ Handle one Server event, called by the EventDispatcher """
+        if isinstance(event, ServiceMessageEvent):
+            try:
+                service_handler = self._service_handlers[event.message_type]
+                if service_handler is None:
+                    raise KeyError(f'No service registered for "{event.service_name}"')
+                await service_handler(event)
+            except Exception as e:
+                await self._respond_error(event, e)
+                raise
+            finally:
+                if self._worker_bus is not None and not event.relayed and \
+                        event.service_name in self._relayed_services:
+                    await self._worker_bus.publish(event.service_name, event.payload)
+        elif isinstance(event, ConnectionClosedEvent):
+            for disconnect_handler in self._disconnect_handlers:
                 try:
-                    await self._service_map[event.service_name](event)
+                    await disconnect_handler(event)
                 except Exception as e:
-                    print(f'CRITICAL ERROR: {e}')
-            else:
-                print(f'Server got unsupported event: {event}')
-            # TODO: 1. Create ticket for event
-            # TODO: 2. Process event
-            # TODO: 3. Close ticket for event
+                    log.error('Disconnect handler failed: %r', e)
+        else:
+            log.error('Server got unsupported event: %s', event)
+        # TODO: 1. Create ticket for event
+        # TODO: 2. Process event
+        # TODO: 3. Close ticket for event
+
+    @staticmethod
+    async def _respond_error(event: ServiceMessageEvent, error: Exception):
+        """
+        Answer a request with a correlation ID whose handler failed (or was cancelled, see
+        Dispatcher.DIRECT_HANDLER_TIMEOUT) before responding with a SERVICE_ERROR Error, so the
+        requester (e.g. Client.call) does not wait for it forever
+        """
+        response_callback = event.response_callback
+        if not isinstance(response_callback, ResponseCallback) or \
+                not response_callback.correlation_id or response_callback.responded:
+            return
+        try:
+            await response_callback(Error(error_code=ErrorCode.SERVICE_ERROR,
+                                          error_details=f'{event.service_name} failed: {error!r}'))
+        except (trio.BrokenResourceError, trio.ClosedResourceError):
+            pass
 
     async def run(self):
         """ Main Server run method """
@@ -99,43 +437,320 @@ class Server:
             raise (RuntimeError, 'Server already running!')
         else:
             self._is_alive = True
-        print('Starting Server...')
+        log.info('Starting Server...')
 
         # Open nursery
         async with trio.open_nursery() as nursery:
-            # Create server event _sender/_receiver channel
-            self.tx_event_channel, self.rx_event_channel = trio.open_memory_channel(0)
+            # Start event loop monitor first, to also time the startup of everything else
+            if self._loop_monitor is not None:
+                nursery.start_soon(self._loop_monitor.run)
 
-            # Start Server event processor
-            nursery.start_soon(self._event_processor)
+            # Start Server event dispatcher
+            nursery.start_soon(self._dispatcher.run)
+
+            # Start idle connection reaper
+            if self._idle_timeout is not None:
+                self._idle_timers = TimerWheel(IDLE_TIMER_TICK, start=trio.current_time())
+                nursery.start_soon(self._idle_connection_reaper)
 
             # Start all services
             self._start_all_services()
 
+            # Serve metrics snapshots
+            if self._metrics_port is not None:
+                await nursery.start(serve_metrics, self._metrics, self._metrics_port)
+                log.info('Server serving metrics on %s:%d', METRICS_HOST, self._metrics_port)
+
+            # Connect to other workers
+            if self._worker_bus is not None:
+                await self._worker_bus.connect()
+                nursery.start_soon(self._worker_bus_receiver, nursery.cancel_scope)
+
             # Create TCP listener(s)
-            tcp_listeners = await trio.open_tcp_listeners(port=PORT, host=HOST)
-            print(f'Server listening or connections on {HOST}:{PORT}')
+            tcp_listeners = await self._socket_tuning.open_listeners(
+                self._host, self._port, reuse_port=self._reuse_port)
+            log.info('Server listening for connections on %s:%d (%s)', self._host, self._port,
+                     self._socket_tuning)
+
+            # Create Unix domain socket listener for co-located clients
+            unix_listeners = list()
+            if self._unix_socket_path is not None:
+                unix_listeners.append(await self._open_unix_listener(self._unix_socket_path))
+                self._unix_socket_bound = True
+                log.info('Server listening for connections on %s', self._unix_socket_path)
 
             # Add Server handler for new connections
             await trio.serve_listeners(
                 handler=self._handle_new_connection,
-                listeners=tcp_listeners,
+                listeners=self._admission_control.wrap_listeners(tcp_listeners + unix_listeners),
                 handler_nursery=nursery)
 
+    @staticmethod
+    async def _open_unix_listener(unix_socket_path: str) -> trio.SocketListener:
+        """
+        Unix domain socket listener, replacing a stale socket file left over by a previous run
+        - Raises FileExistsError if unix_socket_path is not a socket, or OSError(EADDRINUSE) if
+          another server is still listening on it, instead of deleting it
+        """
+        try:
+            mode = os.lstat(unix_socket_path).st_mode
+        except FileNotFoundError:
+            pass
+        else:
+            if not stat.S_ISSOCK(mode):
+                raise FileExistsError(errno.EEXIST, 'Not a Unix domain socket', unix_socket_path)
+            probe_socket = trio.socket.socket(trio.socket.AF_UNIX, trio.socket.SOCK_STREAM)
+            try:
+                await probe_socket.connect(unix_socket_path)
+            except ConnectionRefusedError:
+                # Nobody listens on it anymore
+                os.unlink(unix_socket_path)
+            else:
+                raise OSError(errno.EADDRINUSE, 'Another server is listening on this socket',
+                              unix_socket_path)
+            finally:
+                probe_socket.close()
+        listener_socket = trio.socket.socket(trio.socket.AF_UNIX, trio.socket.SOCK_STREAM)
+        await listener_socket.bind(unix_socket_path)
+        listener_socket.listen()
+        return trio.SocketListener(listener_socket)
+
     def cleanup(self):
         """ Server graceful cleanup and terminate """
-        # TODO: this...
+        self._offload_pools.shutdown()
+        if self._tracer is not None:
+            self._tracer.close()
+        if self._unix_socket_bound and os.path.exists(self._unix_socket_path):
+            os.unlink(self._unix_socket_path)
+            self._unix_socket_bound = False
+
+
+def _run_worker(worker_number: int, worker_bus_path: str, server_kwargs: dict):
+    """ Worker process entry point """
+    unix_socket_path = server_kwargs.get('unix_socket_path')
+    if unix_socket_path is not None:
+        # Unix domain sockets cannot be shared, every worker listens on its own numbered path
+        server_kwargs = dict(server_kwargs, unix_socket_path=f'{unix_socket_path}.{worker_number}')
+    metrics_port = server_kwargs.get('metrics_port')
+    if metrics_port is not None:
+        # Every worker serves its own metrics, on consecutive ports
+        server_kwargs = dict(server_kwargs, metrics_port=metrics_port + worker_number)
+    if server_kwargs.get('trace_sample_rate'):
+        # Every worker writes its own trace file
+        trace_path = server_kwargs.get('trace_path', TRACE_PATH)
+        server_kwargs = dict(server_kwargs, trace_path=f'{trace_path}.{worker_number}')
+    # Outside of the trio run SIGTERM is only noted: it neither kills a worker whose Server is still
+    #   starting nor interrupts the cleanup of one that is stopping already
+    stop_signals = list()
+    signal.signal(signal.SIGTERM, lambda signal_number, frame: stop_signals.append(signal_number))
+    worker_server = Server(reuse_port=True, worker_bus_path=worker_bus_path, **server_kwargs)
+    try:
+        trio.run(_run_worker_server, worker_server, stop_signals)
+    except KeyboardInterrupt:
         pass
+    finally:
+        worker_server.cleanup()
+        # Worker processes exit without running atexit handlers, write all queued log records
+        logging.shutdown()
 
 
-if __name__ == '__main__':
-    my_server = Server()
+async def _run_worker_server(worker_server: Server, stop_signals: list) -> None:
+    """
+    Run a worker Server until it stops or the launcher stops it with SIGTERM
+    :param stop_signals: SIGTERMs received before the trio run handled them
+    """
+    async def watch_signals(cancel_scope: trio.CancelScope):
+        with trio.open_signal_receiver(signal.SIGTERM) as signals:
+            if stop_signals:
+                log.info('Received SIGTERM while starting, stopping')
+                cancel_scope.cancel()
+            async for signal_number in signals:
+                log.info('Received %s, stopping', signal.Signals(signal_number).name)
+                cancel_scope.cancel()
 
-    try:
-        trio.run(my_server.run)
+    async with trio.open_nursery() as nursery:
+        nursery.start_soon(watch_signals, nursery.cancel_scope)
+        await worker_server.run()
+        nursery.cancel_scope.cancel()
 
-    except KeyboardInterrupt:
-        print('\n--- Keyboard Interrupt Detected ---\n')
 
+def run_workers(worker_count: int, **server_kwargs) -> int:
+    """
+    Run worker_count Server processes sharing PORT through SO_REUSEPORT
+    - Launcher process runs the WorkerBusHub that relays messages of relayed services
+    - A worker exiting (e.g. failing to bind PORT) stops all workers, as does SIGTERM
+    :param worker_count: Number of worker processes, usually the number of CPU cores
+    :param server_kwargs: Keyword arguments passed to every worker Server
+    :return: Exit status of the launcher, non-zero if a worker exited on its own
+    """
+    bus_directory = tempfile.mkdtemp(prefix='AIOServer-')
+    worker_bus_path = os.path.join(bus_directory, 'worker_bus.sock')
+    workers = [multiprocessing.Process(target=_run_worker,
+                                       args=(worker_number, worker_bus_path, server_kwargs),
+                                       name=f'AIOServer-worker-{worker_number}', daemon=True)
+               for worker_number in range(worker_count)]
+
+    try:
+        # Workers must be forked outside of trio.run, they retry until the hub is listening
+        for worker in workers:
+            worker.start()
+        # The launcher handles SIGTERM by stopping its workers (installed after forking, every
+        #   worker handles it by stopping its Server, see _run_worker)
+        signal.signal(signal.SIGTERM, _exit_on_signal)
+        log.info('Started %d Server workers', worker_count)
+        return trio.run(_supervise_workers, workers, worker_bus_path)
     finally:
-        my_server.cleanup()
+        # Stopping already, a second SIGTERM must not interrupt waiting for the workers
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        _stop_workers(workers)
+        shutil.rmtree(bus_directory, ignore_errors=True)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def _exit_on_signal(signal_number: int, frame) -> None:
+    """ SIGTERM outside of trio.run: exit through run_workers' cleanup """
+    raise SystemExit(128 + signal_number)
+
+
+async def _supervise_workers(workers: list, worker_bus_path: str) -> int:
+    """
+    Relay messages between workers until a worker exits or the launcher receives SIGTERM
+    :return: Exit status of the launcher
+    """
+    exit_status = 0
+
+    async def watch_worker(worker: multiprocessing.Process, cancel_scope: trio.CancelScope):
+        nonlocal exit_status
+        # The sentinel becomes readable once the worker process has exited
+        await trio.lowlevel.wait_readable(worker.sentinel)
+        worker.join()
+        log.error('Server worker %s exited with code %s, stopping all workers', worker.name,
+                  worker.exitcode)
+        exit_status = 1
+        cancel_scope.cancel()
+
+    async def watch_signals(cancel_scope: trio.CancelScope):
+        with trio.open_signal_receiver(signal.SIGTERM) as signals:
+            async for signal_number in signals:
+                log.info('Received %s, stopping all workers', signal.Signals(signal_number).name)
+                cancel_scope.cancel()
+
+    async with trio.open_nursery() as nursery:
+        nursery.start_soon(watch_signals, nursery.cancel_scope)
+        for worker in workers:
+            nursery.start_soon(watch_worker, worker, nursery.cancel_scope)
+        nursery.start_soon(WorkerBusHub(worker_bus_path).run)
+    return exit_status
+
+
+def _stop_workers(workers: list) -> None:
+    """
+    Terminate every worker and wait until all of them exited (and released PORT), SIGTERM lets a
+    worker stop its Server and run its cleanup
+    """
+    for worker in workers:
+        if worker.is_alive():
+            worker.terminate()
+    for worker in workers:
+        worker.join(WORKER_STOP_TIMEOUT)
+        if worker.is_alive():
+            log.warning('Server worker %s did not stop, killing it', worker.name)
+            worker.kill()
+            worker.join()
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='AIOServer')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of worker processes (0 = one per CPU core)')
+    parser.add_argument('--host', default=HOST, help='Address to listen on')
+    parser.add_argument('--port', type=int, default=PORT, help='Port to listen on')
+    parser.add_argument('--listeners', type=int, default=1,
+                        help='SO_REUSEPORT listeners per worker')
+    parser.add_argument('--backlog', type=int, default=None, help='Listen backlog')
+    parser.add_argument('--send-buffer', type=int, default=None, help='SO_SNDBUF in bytes')
+    parser.add_argument('--receive-buffer', type=int, default=None, help='SO_RCVBUF in bytes')
+    parser.add_argument('--no-nodelay', action='store_true',
+                        help='Keep Nagle\'s algorithm enabled (no TCP_NODELAY)')
+    parser.add_argument('--keepalive', type=int, default=None, metavar='IDLE',
+                        help='Enable TCP keepalive after IDLE seconds without traffic')
+    parser.add_argument('--unix-socket', default=None,
+                        help='Also listen on this Unix domain socket path')
+    parser.add_argument('--max-connections', type=int, default=None,
+                        help='Max live connections per worker')
+    parser.add_argument('--max-connections-per-ip', type=int, default=None,
+                        help='Max live connections from one source IP per worker')
+    parser.add_argument('--accept-rate', type=float, default=None,
+                        help='Max connections accepted per second per worker')
+    parser.add_argument('--compression', action='store_true',
+                        help='Allow clients to negotiate zlib compression')
+    parser.add_argument('--compression-threshold', type=int,
+                        default=DEFAULT_COMPRESSION_THRESHOLD,
+                        help='Smallest outbound message in bytes that gets compressed')
+    parser.add_argument('--thread-pool-size', type=int, default=THREAD_POOL_SIZE,
+                        help='Max thread-offloaded service handlers running at once per worker')
+    parser.add_argument('--process-pool-size', type=int, default=PROCESS_POOL_SIZE,
+                        help='Processes running process-offloaded service handlers per worker '
+                             '(default: one per CPU core)')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='Serve text snapshots of all metrics on this localhost port '
+                             '(worker N uses port + N)')
+    parser.add_argument('--trace-sample-rate', type=int, default=TRACE_SAMPLE_RATE,
+                        help='Trace 1 in every N received service messages (0 = off)')
+    parser.add_argument('--trace-file', default=TRACE_PATH,
+                        help='Rotating Chrome trace file (worker N appends .N)')
+    parser.add_argument('--long-step-ms', type=float, default=None,
+                        help='Monitor the event loop, reporting task steps that run this many '
+                             'milliseconds or longer (default: off)')
+    parser.add_argument('--log-level', choices=LOG_LEVELS,
+                        default=logging.getLevelName(DEFAULT_LOG_LEVEL),
+                        help='Log messages of this level and above, DEBUG logs sampled messages')
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+    worker_count = args.workers or os.cpu_count()
+    socket_tuning = SocketTuning(nodelay=not args.no_nodelay,
+                                 send_buffer=args.send_buffer,
+                                 receive_buffer=args.receive_buffer,
+                                 backlog=args.backlog,
+                                 keepalive=args.keepalive is not None,
+                                 keepalive_idle=args.keepalive,
+                                 listeners=args.listeners)
+    long_step_threshold = args.long_step_ms / 1000 if args.long_step_ms is not None else None
+    admission_control = AdmissionControl(max_connections=args.max_connections,
+                                         max_connections_per_ip=args.max_connections_per_ip,
+                                         accept_rate=args.accept_rate)
+
+    if worker_count > 1:
+        try:
+            sys.exit(run_workers(worker_count, host=args.host, port=args.port,
+                        socket_tuning=socket_tuning, unix_socket_path=args.unix_socket,
+                        admission_control=admission_control,
+                        compression=args.compression,
+                        compression_threshold=args.compression_threshold,
+                        thread_pool_size=args.thread_pool_size,
+                        process_pool_size=args.process_pool_size,
+                        metrics_port=args.metrics_port,
+                        trace_sample_rate=args.trace_sample_rate, trace_path=args.trace_file,
+                        long_step_threshold=long_step_threshold))
+        except KeyboardInterrupt:
+            print('\n--- Keyboard Interrupt Detected ---\n')
+
+    else:
+        my_server = Server(host=args.host, port=args.port, socket_tuning=socket_tuning,
+                           unix_socket_path=args.unix_socket, admission_control=admission_control,
+                           compression=args.compression,
+                           compression_threshold=args.compression_threshold,
+                           thread_pool_size=args.thread_pool_size,
+                           process_pool_size=args.process_pool_size,
+                           metrics_port=args.metrics_port,
+                           trace_sample_rate=args.trace_sample_rate, trace_path=args.trace_file,
+                           long_step_threshold=long_step_threshold)
+
+        try:
+            trio.run(my_server.run)
+
+        except KeyboardInterrupt:
+            print('\n--- Keyboard Interrupt Detected ---\n')
+
+        finally:
+            my_server.cleanup()
@@ -0,0 +1,98 @@
+"""
+Timer Wheel
+
+Hierarchical hashed timer wheel: tracks a deadline per key with O(1) schedule/cancel and an
+advance cost that depends on the number of elapsed ticks and expiring timers, not on the number of
+pending timers. Used by the Server to track idle timeouts of every connection with a single task.
+
+Level 0 has one slot per tick, every level above covers slots_per_level times the span of the level
+below it. Timers are placed in the lowest level that can hold their deadline and cascade down a
+level each time the wheel reaches the start of the slot they are in.
+"""
+
+from math import ceil
+from typing import Hashable
+
+
+class TimerWheel:
+    """ Hierarchical timer wheel keyed by hashable timer keys """
+
+    def __init__(self, tick: float, start: float = 0.0,
+                 slots_per_level: int = 64, levels: int = 4):
+        """
+        :param tick: Resolution of the wheel in seconds
+        :param start: Current time (in seconds, same clock as every later deadline)
+        :param slots_per_level: Number of slots in each level of the wheel
+        :param levels: Number of levels, the wheel spans tick * slots_per_level ** levels seconds
+        """
+        self._tick: float = tick
+        self._slots_per_level: int = slots_per_level
+        self._level_spans: list[int] = [slots_per_level ** level for level in range(levels)]
+        self._max_ticks: int = slots_per_level ** levels - 1
+        self._current_tick: int = int(start / tick)
+
+        # Every slot maps timer key -> expiry tick
+        self._wheel: list[list[dict]] = \
+            [[dict() for _ in range(slots_per_level)] for _ in range(levels)]
+        self._timer_slots: dict[Hashable, dict] = dict()
+
+    def __len__(self) -> int:
+        return len(self._timer_slots)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._timer_slots
+
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        """ Schedule (or reschedule) key to expire once the wheel advances past deadline """
+        self.cancel(key)
+        self._place(key, max(ceil(deadline / self._tick), self._current_tick + 1))
+
+    def cancel(self, key: Hashable) -> None:
+        """ Cancel the timer of key if it is scheduled """
+        slot = self._timer_slots.pop(key, None)
+        if slot is not None:
+            del slot[key]
+
+    def advance(self, now: float) -> list:
+        """
+        Advance the wheel to now
+        :return: Keys of all timers that expired, they are no longer scheduled
+        """
+        expired_keys = list()
+        target_tick = int(now / self._tick)
+        while self._current_tick < target_tick:
+            self._current_tick += 1
+
+            # Cascade every level whose slot boundary was reached down to the levels below
+            for level in range(1, len(self._wheel)):
+                span = self._level_spans[level]
+                if self._current_tick % span:
+                    break
+                slot = self._wheel[level][(self._current_tick // span) % self._slots_per_level]
+                cascading_timers = list(slot.items())
+                slot.clear()
+                for key, expiry_tick in cascading_timers:
+                    self._place(key, expiry_tick)
+
+            # Expire level 0 slot of the current tick
+            slot = self._wheel[0][self._current_tick % self._slots_per_level]
+            for key, expiry_tick in list(slot.items()):
+                if expiry_tick <= self._current_tick:
+                    del slot[key]
+                    del self._timer_slots[key]
+                    expired_keys.append(key)
+        return expired_keys
+
+    def _place(self, key: Hashable, expiry_tick: int) -> None:
+        """ Put a timer into the lowest level slot that can hold its expiry tick """
+        # Timers beyond the span of the wheel wait in the top level and are re-placed on cascade
+        placement_tick = min(expiry_tick, self._current_tick + self._max_ticks)
+        delta = placement_tick - self._current_tick
+        level = 0
+        while level < len(self._wheel) - 1 and \
+                delta >= self._level_spans[level] * self._slots_per_level:
+            level += 1
+        slot = self._wheel[level][
+            (placement_tick // self._level_spans[level]) % self._slots_per_level]
+        slot[key] = expiry_tick
+        self._timer_slots[key] = slot
@@ -0,0 +1,193 @@
+"""
+Tracing
+
+Head-sampled traces of single requests through the Server, to tell where the time of a slow request
+went. Every trace_sample_rate-th service message an AIOConnection receives gets a Trace, carried on
+its ServiceMessageEvent (and the response_callback) through every stage, each stamped with
+time.monotonic_ns():
+    received       data holding the message was read from the connection
+    parsed         AIOMessage parsed (and decompressed), ServiceMessageEvent created
+    dispatched     EventDispatcher routed the event, queued events then wait for their shard
+    handler start  service handler called
+    handler end    service handler returned
+and for every response sent through the event's response_callback:
+    queued         response queued for the AIOConnection _sender
+    flush start    _sender started writing the buffer holding the response
+    sent           send_all of that buffer returned
+A response may also end unsent: dropped by the backpressure policy (DROP_OLDEST, DROP_NEWEST), or
+discarded as the connection closed before or while writing it. Its last span is then marked
+"(dropped)" or "(closed)".
+A trace is written once its handler returned and all of its responses ended, as Chrome trace
+events (one line each) to a JSON file that chrome://tracing, Perfetto or speedscope load directly.
+The file is rotated once it grows past max_bytes.
+"""
+
+import json
+import os
+from time import monotonic_ns
+from typing import Optional, TextIO
+
+TRACE_SAMPLE_RATE = 0           # Trace 1 in every TRACE_SAMPLE_RATE service messages, 0 = off
+TRACE_PATH = 'aioserver-trace.json'
+TRACE_MAX_BYTES = 16 * 1024 * 1024
+TRACE_BACKUPS = 3               # Rotated trace files kept, as TRACE_PATH.1 (newest) and up
+
+# How a traced response ended
+RESPONSE_SENT = 'sent'
+RESPONSE_DROPPED = 'dropped'    # By the connection's backpressure policy
+RESPONSE_CLOSED = 'closed'      # Discarded as the connection closed
+
+
+class Trace:
+    """ Stage timestamps (monotonic ns) of one sampled request """
+    __slots__ = ('tracer', 'trace_id', 'service_name', 'connection_id', 'received_ns',
+                 'parsed_ns', 'dispatched_ns', 'handler_start_ns', 'handler_end_ns', 'responses',
+                 'pending_responses')
+
+    def __init__(self, tracer: 'Tracer', trace_id: int, service_name: str, connection_id: int,
+                 received_ns: int):
+        self.tracer: Tracer = tracer
+        self.trace_id: int = trace_id
+        self.service_name: str = service_name
+        self.connection_id: int = connection_id
+        self.received_ns: int = received_ns
+        self.parsed_ns: int = monotonic_ns()
+        self.dispatched_ns: int = 0
+        self.handler_start_ns: int = 0
+        self.handler_end_ns: int = 0
+        # [queued, flush start, sent (or dropped), outcome] of every response
+        self.responses: list[list] = list()
+        self.pending_responses: int = 0
+
+    def dispatched(self) -> None:
+        self.dispatched_ns = monotonic_ns()
+
+    def handler_started(self) -> None:
+        self.handler_start_ns = monotonic_ns()
+
+    def handler_ended(self) -> None:
+        self.handler_end_ns = monotonic_ns()
+        if not self.pending_responses:
+            self.tracer.write(self)
+
+    def response_queued(self) -> list:
+        """
+        Timestamps of a new response, passed to response_flushed and then response_sent or
+        response_dropped
+        """
+        response = [monotonic_ns(), 0, 0, RESPONSE_SENT]
+        self.responses.append(response)
+        self.pending_responses += 1
+        return response
+
+    @staticmethod
+    def response_flushed(response: list) -> None:
+        response[1] = monotonic_ns()
+
+    def response_sent(self, response: list) -> None:
+        self._response_ended(response, RESPONSE_SENT)
+
+    def response_dropped(self, response: list, outcome: str = RESPONSE_DROPPED) -> None:
+        """ End a response that will never be sent, outcome is RESPONSE_DROPPED or _CLOSED """
+        self._response_ended(response, outcome)
+
+    def _response_ended(self, response: list, outcome: str) -> None:
+        response[2] = monotonic_ns()
+        response[3] = outcome
+        self.pending_responses -= 1
+        # Responses sent while the handler still runs are written along with the handler
+        if not self.pending_responses and self.handler_end_ns:
+            self.tracer.write(self)
+
+    def chrome_events(self, pid: int) -> list[dict]:
+        """ Complete ("X") events of every stage, timestamps in microseconds """
+        # One viewer thread per connection, by the time field that differs between uuid1s
+        tid = self.connection_id >> 96
+        args = dict(trace_id=self.trace_id, connection=f'{self.connection_id:032x}')
+        end_ns = max([self.handler_end_ns] + [sent for _, _, sent, _ in self.responses])
+        spans = [(self.service_name, self.received_ns, end_ns),
+                 ('parse', self.received_ns, self.parsed_ns),
+                 ('dispatch', self.parsed_ns, self.dispatched_ns),
+                 ('queue', self.dispatched_ns, self.handler_start_ns),
+                 ('handler', self.handler_start_ns, self.handler_end_ns)]
+        for queued_ns, flush_start_ns, sent_ns, outcome in self.responses:
+            marker = '' if outcome == RESPONSE_SENT else f' ({outcome})'
+            if flush_start_ns:
+                spans.append(('outbound queue', queued_ns, flush_start_ns))
+                spans.append(('send_all' + marker, flush_start_ns, sent_ns))
+            else:
+                # Never written
+                spans.append(('outbound queue' + marker, queued_ns, sent_ns))
+        return [dict(name=name, cat='request', ph='X', ts=start_ns / 1000,
+                     dur=(end_ns - start_ns) / 1000, pid=pid, tid=tid, args=args)
+                for name, start_ns, end_ns in spans]
+
+
+class Tracer:
+    """ Head sampling of requests and the rotating file traces are written to """
+
+    def __init__(self, sample_rate: int = TRACE_SAMPLE_RATE, path: str = TRACE_PATH,
+                 max_bytes: int = TRACE_MAX_BYTES, backups: int = TRACE_BACKUPS):
+        """
+        :param sample_rate: Trace 1 in every sample_rate service messages (0 = tracing off)
+        :param path: Trace file, opened once the first trace is written
+        :param max_bytes: Size at which the trace file is rotated
+        :param backups: Rotated trace files kept
+        """
+        self.sample_rate: int = sample_rate
+        self._path: str = path
+        self._max_bytes: int = max_bytes
+        self._backups: int = backups
+        self._until_sample: int = 0
+        self._next_trace_id: int = 1
+        self._file: Optional[TextIO] = None
+        self._file_bytes: int = 0
+        self._pid: int = os.getpid()
+        self.traces_written: int = 0
+
+    def start(self, service_name: str, connection_id: int, received_ns: int) -> Optional[Trace]:
+        """ A Trace for the first and then every sample_rate-th message, otherwise None """
+        if self._until_sample:
+            self._until_sample -= 1
+            return None
+        self._until_sample = self.sample_rate - 1
+        trace_id = self._next_trace_id
+        self._next_trace_id += 1
+        return Trace(self, trace_id, service_name, connection_id, received_ns)
+
+    def write(self, trace: Trace) -> None:
+        """ Append the events of a finished trace to the trace file """
+        if self._file is None:
+            self._open()
+        events = ''.join(f',\n{json.dumps(event)}' for event in trace.chrome_events(self._pid))
+        self._file.write(events)
+        self._file_bytes += len(events)
+        self.traces_written += 1
+        if self._file_bytes >= self._max_bytes:
+            self._rotate()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.write('\n]\n')
+            self._file.close()
+            self._file = None
+
+    def _open(self) -> None:
+        """
+        Start a JSON array trace file, the viewers also load a file still being written (without
+        its closing bracket)
+        """
+        self._file = open(self._path, 'w')
+        # Process metadata event first, so every other event can be written with a leading comma
+        header = '[\n' + json.dumps(dict(name='process_name', ph='M', pid=self._pid,
+                                         args=dict(name=f'AIOServer {self._pid}')))
+        self._file.write(header)
+        self._file_bytes = len(header)
+
+    def _rotate(self) -> None:
+        self.close()
+        for backup in range(self._backups - 1, 0, -1):
+            if os.path.exists(f'{self._path}.{backup}'):
+                os.replace(f'{self._path}.{backup}', f'{self._path}.{backup + 1}')
+        if self._backups:
+            os.replace(self._path, f'{self._path}.1')
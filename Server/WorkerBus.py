@@ -0,0 +1,127 @@
+"""
+Worker Bus
+
+Local Unix domain socket bus used when the Server runs as multiple worker processes.
+- WorkerBusHub runs in the launcher process and relays every frame it receives from one worker
+  to all other workers
+- WorkerBusClient runs in each worker, publishing messages of relayed services and turning
+  messages published by other workers into ServiceMessageEvents
+
+Every frame on the bus is a length-prefixed (see CommonLib.Framing) AIOMessage carrying the
+message_name and serialized message of the original client request.
+"""
+
+from typing import Optional, Union
+
+import trio
+
+from .util import ServiceMessageEvent, ServiceMessageEventPool
+from CommonLib.Framing import FrameDecoder, encode_frame
+from CommonLib.Log import get_logger
+from CommonLib.proto.AIOMessage_pb2 import AIOMessage
+
+WORKER_BUS_CAPACITY = 1024      # Frames buffered per worker before the hub applies backpressure
+CONNECT_RETRIES = 50
+CONNECT_RETRY_DELAY = 0.1       # Seconds between attempts to reach a WorkerBusHub
+
+log = get_logger(__name__)
+
+
+class WorkerBusHub:
+    """ Relays frames between all connected workers """
+
+    def __init__(self, socket_path: str):
+        """
+        :param socket_path: Filesystem path of the hub's Unix domain socket
+        """
+        self._socket_path: str = socket_path
+        self._workers: dict[int, trio.abc.SendChannel] = dict()
+
+    async def run(self, task_status=trio.TASK_STATUS_IGNORED):
+        """ Listen for workers and relay their frames until cancelled """
+        listener_socket = trio.socket.socket(trio.socket.AF_UNIX, trio.socket.SOCK_STREAM)
+        await listener_socket.bind(self._socket_path)
+        listener_socket.listen()
+        log.info('WorkerBusHub listening on %s', self._socket_path)
+        task_status.started()
+        await trio.serve_listeners(self._handle_worker, [trio.SocketListener(listener_socket)])
+
+    async def _handle_worker(self, worker_stream: trio.SocketStream):
+        """ Forward every frame from one worker to all other workers """
+        worker_id = id(worker_stream)
+        tx_frames, rx_frames = trio.open_memory_channel(WORKER_BUS_CAPACITY)
+        self._workers[worker_id] = tx_frames
+        try:
+            async with worker_stream, trio.open_nursery() as nursery:
+                nursery.start_soon(self._worker_sender, worker_stream, rx_frames)
+                frame_decoder = FrameDecoder()
+                async for data in worker_stream:
+                    for frame in frame_decoder.feed(data):
+                        encoded_frame = encode_frame(frame)
+                        for other_worker_id, other_tx_frames in list(self._workers.items()):
+                            if other_worker_id != worker_id:
+                                await other_tx_frames.send(encoded_frame)
+                nursery.cancel_scope.cancel()
+        except trio.BrokenResourceError as e:
+            log.warning('WorkerBusHub lost worker: %s', e)
+        finally:
+            del self._workers[worker_id]
+
+    @staticmethod
+    async def _worker_sender(worker_stream: trio.SocketStream,
+                             rx_frames: trio.abc.ReceiveChannel):
+        """ Write frames queued for a worker """
+        async for encoded_frame in rx_frames:
+            await worker_stream.send_all(encoded_frame)
+
+
+class WorkerBusClient:
+    """ A worker's connection to the WorkerBusHub """
+
+    def __init__(self, socket_path: str):
+        """
+        :param socket_path: Filesystem path of the hub's Unix domain socket
+        """
+        self._socket_path: str = socket_path
+        self._bus_stream: trio.SocketStream = None
+        self._send_lock: trio.StrictFIFOLock = trio.StrictFIFOLock()
+        self._aio_wrapper: AIOMessage = AIOMessage()
+
+    async def connect(self):
+        """ Connect to the WorkerBusHub, retrying while the hub starts up """
+        for _ in range(CONNECT_RETRIES):
+            try:
+                self._bus_stream = await trio.open_unix_socket(self._socket_path)
+                return
+            except OSError:
+                await trio.sleep(CONNECT_RETRY_DELAY)
+        raise ConnectionError(f'Could not reach WorkerBusHub at {self._socket_path}')
+
+    async def publish(self, service_name: str, message: Union[bytes, memoryview]):
+        """ Publish a serialized service message to all other workers """
+        async with self._send_lock:
+            self._aio_wrapper.Clear()
+            self._aio_wrapper.message_name = service_name
+            self._aio_wrapper.message = bytes(message)
+            await self._bus_stream.send_all(encode_frame(self._aio_wrapper.SerializeToString()))
+
+    async def receiver(self, server_event_handler: trio.abc.SendChannel.send,
+                       event_pool: Optional[ServiceMessageEventPool] = None):
+        """
+        Hand every message published by other workers to the Server as a relayed event
+        :param event_pool: Pool relayed events are taken from (default: new events)
+        """
+        new_event = event_pool.acquire if event_pool is not None else ServiceMessageEvent
+        frame_decoder = FrameDecoder()
+        async with self._bus_stream:
+            async for data in self._bus_stream:
+                for frame in frame_decoder.feed(data):
+                    aio_message = AIOMessage()
+                    aio_message.ParseFromString(frame)
+                    await server_event_handler(new_event(
+                        requester_uuid=0,
+                        service_name=aio_message.message_name,
+                        payload=memoryview(aio_message.message),
+                        response_callback=None,
+                        relayed=True))
+        log.warning('WorkerBusClient lost connection to WorkerBusHub')
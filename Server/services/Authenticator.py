@@ -41,9 +41,8 @@ All new connections to AIOServer must go through the following steps:
         )
 """
 
-import trio.lowlevel
-
 from CommonLib.proto.Authenticator_pb2 import AuthenticatorMessage
+from Server.util import ServiceMessageEvent
 
 
 class Authenticator:
@@ -53,10 +52,12 @@ class Authenticator:
         """
         pass
 
-    def _handle_authenticator_message(self, message: bytes,
-                                      response_callback: trio.lowlevel.wait_writable):
-        """ Callback for every client Authenticator message """
-        auth_message = AuthenticatorMessage()
-        auth_message.ParseFromString(message)
+    async def _handle_authenticator_message(self, event: ServiceMessageEvent):
+        """
+        Callback for every client Authenticator message, to be registered (directly, not queued)
+        with message_class=AuthenticatorMessage and priority=Priority.HIGH, so its responses do
+        not wait behind chat traffic in the outbound queue
+        """
+        auth_message: AuthenticatorMessage = event.message
         # TODO: Finish this...
         raise NotImplementedError
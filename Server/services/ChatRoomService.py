@@ -6,64 +6,77 @@ from datetime import datetime
 
 import trio.lowlevel
 
+from CommonLib.Log import SampledLogger, get_logger
 from CommonLib.proto.ChatRoomMessage_pb2 import ChatRoomMessage
-from Server.util import ServiceMessageEvent
+from Server.util import ConnectionClosedEvent, SerializedMessage, ServiceMessageEvent, \
+    uncorrelated
 
 MAX_HISTORY_LENGTH = 10
 
+log = get_logger(__name__)
+message_log = SampledLogger(log)     # Logs on every chat message
+
 
 class ChatRoomService:
     def __init__(self, register_service: classmethod):
         """
         Register all message -> handler relations to service registerer callback
         """
-        self._callbacks: list[trio.lowlevel.wait_writable] = list()
-        register_service('ChatRoomMessage', self._handle_chat_bot_message_event)
+        # Subscriber callbacks by requester uuid
+        self._callbacks: dict[int, trio.lowlevel.wait_writable] = dict()
+        register_service('ChatRoomMessage', self._handle_chat_bot_message_event, relay=True,
+                         on_disconnect=self._handle_connection_closed,
+                         message_class=ChatRoomMessage)
 
     async def _broadcast_latest_message(self, message: ChatRoomMessage):
-        """ Try to send message to all callbacks """
-        print(f'ChatBotService broadcasting message: {message}')
+        """ Try to send message to all callbacks, serializing it only once """
+        message_log.debug('ChatRoomService broadcasting message of %s to %d users', message.author,
+                          len(self._callbacks))
+        message = SerializedMessage.from_message(message)
         inactive_callbacks = list()
-        for callback in self._callbacks:
+        for requester_uuid, callback in list(self._callbacks.items()):
             try:
                 await callback(message)
             except Exception as e:
-                print(f'ChatBotService failed to send message due to error: {e}')
-                inactive_callbacks.append(callback)
-        for callback in inactive_callbacks:
-            self._callbacks.remove(callback)
+                log.info('ChatRoomService dropping user that failed to receive: %r', e)
+                inactive_callbacks.append(requester_uuid)
+        for requester_uuid in inactive_callbacks:
+            self._callbacks.pop(requester_uuid, None)
 
     async def _broadcast_new_user(self, new_user: str):
         """ Broadcast new user to everyone connected """
-        print(f'Broadcasting new user: {new_user}')
+        log.info('Broadcasting new user: %s', new_user)
         new_user_msg = ChatRoomMessage()
         new_user_msg.author = new_user
         new_user_msg.message = f'{new_user} has connected!'
         setattr(new_user_msg, 'timestamp', datetime.timestamp(datetime.now()))
         await self._broadcast_latest_message(new_user_msg)
 
-    def _save_new_callback(self, callback: trio.lowlevel.wait_writable):
+    def _save_new_callback(self, requester_uuid: int, callback: trio.lowlevel.wait_writable):
         """ Try to send entire history to new connection """
-        print('Saving new callback, sending notification to all users')
-        self._callbacks.append(callback)
+        self._callbacks[requester_uuid] = callback
+
+    async def _handle_connection_closed(self, event: ConnectionClosedEvent):
+        """ Drop the subscriber callback of a closed connection """
+        self._callbacks.pop(event.requester_uuid, None)
 
     async def _handle_chat_bot_message_event(self, event: ServiceMessageEvent):
         """ Callback for every client message """
-        chat_bot_message = ChatRoomMessage()
-        chat_bot_message.ParseFromString(event.message)
+        chat_bot_message: ChatRoomMessage = event.message
         setattr(chat_bot_message, 'timestamp', datetime.timestamp(datetime.now()))
-        print('Entering chat bot message event handler')
-        print(f'Is callback known? {event.response_callback in self._callbacks}')
-        print(f'Chat bot message received: {event.message}')
         if chat_bot_message.message == '---Start---':
             # print('Entering START')
-            if event.response_callback not in self._callbacks:
-                self._save_new_callback(event.response_callback)
+            # Users connected to other workers are only announced, their callbacks live there
+            if not event.relayed and event.requester_uuid not in self._callbacks:
+                # Broadcasts are not responses to the Start request
+                self._save_new_callback(event.requester_uuid,
+                                        uncorrelated(event.response_callback))
             await self._broadcast_new_user(chat_bot_message.author)
         elif chat_bot_message.message == '---Stop---':
-            print('>>> Entering STOP')
+            log.info('Stopping chat for %s', chat_bot_message.author)
             # Remove from callback
-            self._callbacks.remove(event.response_callback)
+            if not event.relayed:
+                self._callbacks.pop(event.requester_uuid, None)
         else:
             # print('Entering NOMINAL')
             await self._broadcast_latest_message(chat_bot_message)
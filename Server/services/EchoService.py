@@ -0,0 +1,21 @@
+"""
+Echo Service - answers every EchoMessage with itself, for health checks and benchmarks
+"""
+
+from CommonLib.proto.Base_pb2 import EchoMessage
+from Server.util import SerializedMessage, ServiceMessageEvent
+
+
+class EchoService:
+
+    def __init__(self, register_service: classmethod):
+        """
+        Register all message -> handler relations to service registerer callback
+        """
+        register_service(EchoMessage.DESCRIPTOR.name, self._handle_echo_message)
+
+    @staticmethod
+    async def _handle_echo_message(event: ServiceMessageEvent):
+        """ Send the EchoMessage back as is (never decoded), with the request's correlation ID """
+        await event.response_callback(
+            SerializedMessage(EchoMessage.DESCRIPTOR.name, bytes(event.payload)))
@@ -0,0 +1,47 @@
+"""
+Profiler Service - starts and stops the sampling profiler of the Server (see Server.Profiler)
+
+Admin only: accepts ProfilerMessages from connections on the Server's own host (loopback or the
+Unix domain socket) and answers every one with the profiler's state. With --workers, every worker
+process has its own profiler, reach a specific worker through its --unix-socket path.
+"""
+
+import trio
+
+from CommonLib.proto.Base_pb2 import ErrorCode
+from CommonLib.proto.ProfilerMessage_pb2 import ProfilerMessage, ProfilerCommand
+from Server.Priority import Priority
+from Server.Profiler import PROFILE_DURATION, PROFILE_SAMPLE_RATE, Profiler
+from Server.util import ServiceMessageEvent
+
+
+class ProfilerService:
+
+    def __init__(self, register_service: classmethod):
+        """
+        Register all message -> handler relations to service registerer callback
+        """
+        self._profiler = Profiler()
+        register_service(ProfilerMessage.DESCRIPTOR.name, self._handle_profiler_message,
+                         message_class=ProfilerMessage, priority=Priority.HIGH, admin=True)
+
+    async def _handle_profiler_message(self, event: ServiceMessageEvent):
+        """ Run the requested command, then answer with the profiler's state """
+        request: ProfilerMessage = event.message
+        response = ProfilerMessage(command=request.command)
+        try:
+            if request.command == ProfilerCommand.PROFILER_START:
+                self._profiler.start(request.sample_rate or PROFILE_SAMPLE_RATE,
+                                     request.duration or PROFILE_DURATION)
+            elif request.command == ProfilerCommand.PROFILER_STOP:
+                if not self._profiler.running:
+                    raise RuntimeError('No profile running')
+                # Waits for the collapsed stacks to be written
+                await trio.to_thread.run_sync(self._profiler.stop)
+        except (RuntimeError, ValueError) as e:
+            response.error.error_code = ErrorCode.INVALID_REQUEST_ERROR
+            response.error.error_details = str(e)
+        response.running = self._profiler.running
+        response.samples = self._profiler.samples
+        response.path = self._profiler.path
+        await event.response_callback(response)
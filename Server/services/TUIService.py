@@ -2,9 +2,12 @@
 TUI Service - default Text User Interface endpoint
 """
 
+from CommonLib.Log import SampledLogger, get_logger
 from CommonLib.proto.TUIMessage_pb2 import TUIMessage
 from Server.util import ServiceMessageEvent
 
+message_log = SampledLogger(get_logger(__name__))
+
 
 class TUIService:
 
@@ -12,11 +15,9 @@ class TUIService:
         """
         Register all message -> handler relations to service registerer callback
         """
-        register_service('TUIMessage', self._handle_tui_message)
+        register_service('TUIMessage', self._handle_tui_message, message_class=TUIMessage)
 
     @staticmethod
     async def _handle_tui_message(event: ServiceMessageEvent):
         """ Main entry-way for all TUIMessages """
-        tui_message = TUIMessage()
-        tui_message.ParseFromString(event.message)
-        print(f'TUIService received TUIMessage: {tui_message}')
+        message_log.debug('TUIService received TUIMessage (%d bytes)', len(event.payload))
@@ -2,27 +2,193 @@
 Server Util
 """
 
+from enum import IntEnum
+from typing import Optional, Type, Union
+
 import trio.lowlevel
 from google.protobuf.message import Message
 
+from CommonLib.MessageTypes import NO_MESSAGE_TYPE
+from .Tracing import Trace
+
+EVENT_POOL_SIZE = 1024      # Released ServiceMessageEvents kept for reuse
+
+
+class BackpressurePolicy(IntEnum):
+    """ What an AIOConnection does with new outbound messages once past its high-water mark """
+    BLOCK = 0           # Wait until the _sender has drained below the high-water mark
+    DROP_OLDEST = 1     # Evict the oldest queued messages to make room
+    DROP_NEWEST = 2     # Discard the new message
+    DISCONNECT = 3      # Close the connection to the slow consumer
+
+
+class SerializedMessage:
+    """ Message serialized once, e.g. to be sent to many connections """
+    __slots__ = ('message_name', 'payload')
+
+    def __init__(self, message_name: str, payload: bytes):
+        """
+        :param message_name: Name of the serialized message
+        :param payload: Serialized message
+        """
+        self.message_name: str = message_name
+        self.payload: bytes = payload
+
+    @classmethod
+    def from_message(cls, message: Message) -> 'SerializedMessage':
+        return cls(message.DESCRIPTOR.name, message.SerializeToString())
+
+    def __str__(self):
+        return f'{self.message_name} ({len(self.payload)} bytes)'
+
+
+class ResponseCallback:
+    """
+    response_callback of a request with a correlation ID or a trace, copies them onto every
+    response
+    """
+    __slots__ = ('send', 'correlation_id', 'trace', 'responded')
+
+    def __init__(self, send: trio.lowlevel.wait_writable, correlation_id: int,
+                 trace: Optional[Trace] = None):
+        """
+        :param send: Awaitable sending a message with a correlation ID and trace, e.g.
+            AIOConnection.send
+        :param correlation_id: Correlation ID of the request (0 = none)
+        :param trace: Trace of the request, if sampled
+        """
+        self.send: trio.lowlevel.wait_writable = send
+        self.correlation_id: int = correlation_id
+        self.trace: Optional[Trace] = trace
+        # At least one response was sent
+        self.responded: bool = False
+
+    async def __call__(self, message: Union[Message, SerializedMessage]):
+        self.responded = True
+        await self.send(message, self.correlation_id, self.trace)
+
+
+def uncorrelated(response_callback: trio.lowlevel.wait_writable) -> trio.lowlevel.wait_writable:
+    """
+    Callback sending to the requester without the request's correlation ID (or trace), e.g.
+    broadcasts
+    """
+    return response_callback.send if isinstance(response_callback, ResponseCallback) \
+        else response_callback
+
 
 class ServiceMessageEvent:
-    def __init__(self, requester_uuid: int, service_name: str, message: Message,
-                 response_callback: trio.lowlevel.wait_writable):
+    __slots__ = ('requester_uuid', 'service_name', 'payload', 'response_callback', 'relayed',
+                 'message_type', 'message_class', 'trace', '_message')
+
+    def __init__(self, requester_uuid: int, service_name: str,
+                 payload: Union[bytes, memoryview],
+                 response_callback: trio.lowlevel.wait_writable, relayed: bool = False,
+                 message_type: int = NO_MESSAGE_TYPE,
+                 message_class: Optional[Type[Message]] = None,
+                 trace: Optional[Trace] = None):
         """
         Service Request Events are events AIOConnections send to ServerEventProcessor
         :param requester_uuid: Int of originator
         :param service_name: Name of ServiceMessage
-        :param message: ServiceMessage used to communicate to specific service
-        :param response_callback: Awaitable callback for sending a response
+        :param payload: Serialized ServiceMessage used to communicate to specific service
+        :param response_callback: Awaitable callback for sending a response (a Message or a
+            SerializedMessage), copies the request's correlation ID onto it
+        :param relayed: Event was received by another worker process (no response_callback)
+        :param message_type: Numeric ID of service_name, if known
+        :param message_class: Message class payload decodes into, set by the dispatcher from the
+            service registration if not given
+        :param trace: Trace of the message through the Server, if sampled (see Server.Tracing)
         """
         self.requester_uuid: int = requester_uuid
         self.service_name: str = service_name
-        self.message: Message = message
+        self.payload: Union[bytes, memoryview] = payload
         self.response_callback: trio.lowlevel.wait_writable = response_callback
+        self.relayed: bool = relayed
+        self.message_type: int = message_type
+        self.message_class: Optional[Type[Message]] = message_class
+        self.trace: Optional[Trace] = trace
+        self._message: Optional[Message] = None
+
+    @property
+    def message(self) -> Union[Message, bytes, memoryview]:
+        """
+        ServiceMessage decoded from payload on first access, handlers that only forward the
+        payload never pay for decoding it
+        - The raw payload if the service registered no message class
+        """
+        if self._message is None:
+            if self.message_class is None:
+                return self.payload
+            self._message = self.message_class.FromString(self.payload)
+        return self._message
 
     def __str__(self):
         return f'--- ServiceMessageEvent ---\n' \
                f'Originator: {self.requester_uuid}\n' \
                f'Service Name: {self.service_name}\n' \
-               f'Service Message: {self.message}'
+               f'Relayed: {self.relayed}\n' \
+               f'Service Message: {len(self.payload)} bytes'
+
+
+class ServiceMessageEventPool:
+    """
+    Free list of ServiceMessageEvents, one is needed for every message received
+    - The EventDispatcher releases events once handled, handlers must not keep events (or their
+      payload memoryview) after returning
+    """
+    __slots__ = ('max_size', '_free', '_allocated', '_reused')
+
+    def __init__(self, max_size: int = EVENT_POOL_SIZE):
+        """
+        :param max_size: Released events kept for reuse (0 = no pooling)
+        """
+        self.max_size: int = max_size
+        self._free: list[ServiceMessageEvent] = list()
+        self._allocated: int = 0
+        self._reused: int = 0
+
+    @property
+    def stats(self) -> dict:
+        return dict(event_pool_allocated=self._allocated,
+                    event_pool_reused=self._reused,
+                    event_pool_free=len(self._free))
+
+    def acquire(self, requester_uuid: int, service_name: str, payload: Union[bytes, memoryview],
+                response_callback: trio.lowlevel.wait_writable, relayed: bool = False,
+                message_type: int = NO_MESSAGE_TYPE,
+                message_class: Optional[Type[Message]] = None,
+                trace: Optional[Trace] = None) -> ServiceMessageEvent:
+        """ A released event reinitialized with the given fields, or a new one """
+        if self._free:
+            self._reused += 1
+            event = self._free.pop()
+            event.__init__(requester_uuid, service_name, payload, response_callback, relayed,
+                           message_type, message_class, trace)
+            return event
+        self._allocated += 1
+        return ServiceMessageEvent(requester_uuid, service_name, payload, response_callback,
+                                   relayed, message_type, message_class, trace)
+
+    def release(self, event: ServiceMessageEvent) -> None:
+        """ Return a handled event to the pool, dropping its references to connection state """
+        if len(self._free) < self.max_size:
+            event.payload = event.response_callback = event.trace = event._message = None
+            self._free.append(event)
+
+
+class ConnectionClosedEvent:
+    __slots__ = ('requester_uuid',)
+    trace = None    # Never traced, handled like ServiceMessageEvents
+
+    def __init__(self, requester_uuid: int):
+        """
+        Connection Closed Events are sent to ServerEventProcessor after an AIOConnection closed,
+        queued behind every ServiceMessageEvent the connection sent before closing
+        :param requester_uuid: Int of the closed connection
+        """
+        self.requester_uuid: int = requester_uuid
+
+    def __str__(self):
+        return f'--- ConnectionClosedEvent ---\n' \
+               f'Originator: {self.requester_uuid}'